@@ -1,6 +1,7 @@
 # 开发板端程序
 import os
 import json
+import argparse
 import socket
 import numpy as np
 import cv2
@@ -9,7 +10,7 @@ from ais_bench.infer.interface import InferSession
 
 
 class EdgeDetectionServer:
-    def __init__(self, host='0.0.0.0', port=12345):
+    def __init__(self, host='0.0.0.0', port=12345, operating_point=None):
         self.host = host
         self.port = port
         # 加载OM模型，使用InferSession替代onnxruntime
@@ -19,6 +20,20 @@ class EdgeDetectionServer:
         self.CONFIDENCE_THRESHOLD = 0.5
         self.IOU_THRESHOLD = 0.45
         self.input_shape = [640, 640]
+        if operating_point:
+            self.load_operating_point(operating_point)
+
+    def load_operating_point(self, path):
+        """加载验证集上优化的告警阈值，path 为 yolo val target_recall=0.99 在运行目录（如 runs/detect/val）下生成的
+        operating_point.json，需显式指定；不指定时保留默认阈值"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"告警阈值文件 {path} 不存在，请指定 yolo val 运行目录下的 operating_point.json")
+        with open(path, encoding='utf-8') as f:
+            point = json.load(f)['classes'].get(str(self.DEFECT_CLASS_ID))
+        if point:
+            self.CONFIDENCE_THRESHOLD = point['conf']
+            print(f"已加载告警阈值 conf={point['conf']:.4f}（验证集图片级召回率 {point['recall']:.3f}，"
+                  f"误报率 {point['false_alarm_rate']:.3f}）")
 
     def preprocess_image(self, img_path, target_size=640):
         # 读取图像
@@ -38,8 +53,8 @@ class EdgeDetectionServer:
         if isinstance(prediction, torch.Tensor):
             prediction = prediction.numpy()
 
-        # 获取置信度大于阈值的索引
-        mask = prediction[..., 4] > conf_thres
+        # 获取置信度不低于阈值的索引（与告警阈值的定义一致）
+        mask = prediction[..., 4] >= conf_thres
         if not np.any(mask):
             return [None]
 
@@ -192,6 +207,9 @@ class EdgeDetectionServer:
 
 
 if __name__ == '__main__':
-    server = EdgeDetectionServer()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--operating-point', default=None,
+                        help='yolo val 生成的告警阈值文件，如 runs/detect/val/operating_point.json')
+    server = EdgeDetectionServer(operating_point=parser.parse_args().operating_point)
     server.start_server()
 
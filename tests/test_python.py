@@ -1,7 +1,7 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
 import contextlib
-from copy import copy
+from copy import copy, deepcopy
 from pathlib import Path
 
 import cv2
@@ -205,6 +205,14 @@ def test_train_pretrained():
     model(SOURCE)
 
 
+def test_train_val_async():
+    """Test training with validation of EMA snapshots in a background process."""
+    model = YOLO(CFG)
+    model.train(data="coco8.yaml", epochs=3, imgsz=32, val_async=True, device="cpu", name="val_async", exist_ok=True)
+    assert len(model.trainer.csv.read_text().splitlines()) == 4  # header and one row per epoch, in order
+    assert model.trainer.best.exists()
+
+
 def test_export_torchscript():
     """Test exporting the YOLO model to TorchScript format."""
     f = YOLO(MODEL).export(format="torchscript", optimize=False)
@@ -217,6 +225,70 @@ def test_export_onnx():
     YOLO(f)(SOURCE)  # exported model inference
 
 
+def test_export_onnx_int8(monkeypatch):
+    """Test that INT8 ONNX export writes a QDQ model while formats exported through ONNX keep the float graph."""
+    pytest.importorskip("onnxruntime")
+    import onnx
+
+    from ultralytics.engine.exporter import Exporter
+
+    for d in "images", "labels":
+        (TMP / "int8" / d).mkdir(parents=True, exist_ok=True)
+    for f in "bus.jpg", "zidane.jpg":
+        cv2.imwrite(str(TMP / "int8/images" / f), cv2.imread(str(ASSETS / f)))
+        (TMP / "int8/labels" / f).with_suffix(".txt").write_text("0 0.5 0.5 0.2 0.4\n")
+    data = TMP / "int8/data.yaml"
+    data.write_text(yaml.safe_dump(dict(path=str(TMP / "int8"), train="images", val="images", names={0: "person"})))
+    monkeypatch.chdir(TMP / "int8")  # exports are saved next to 'yolov8n.yaml'
+    args = dict(imgsz=32, int8=True, data=str(data))
+
+    f = YOLO(CFG).export(format="onnx", **args)
+    assert f.endswith("_int8.onnx") and any(n.op_type == "QuantizeLinear" for n in onnx.load(f).graph.node)
+
+    monkeypatch.setattr(Exporter, "export_saved_model", lambda self: self.export_onnx())  # TF formats start from ONNX
+    f = YOLO(CFG).export(format="saved_model", **args)
+    assert not any(n.op_type == "QuantizeLinear" for n in onnx.load(f).graph.node)
+
+
+def test_val_onnx_batch():
+    """Test validating a static batch=3 ONNX model pads the last batch of the 4 coco8 val images."""
+    f = YOLO(MODEL).export(format="onnx", imgsz=32, batch=3)
+    metrics = YOLO(f).val(data="coco8.yaml", imgsz=32, batch=16)
+    assert metrics.confusion_matrix.matrix.sum() > 0
+
+
+def test_val_shards():
+    """Test that validating 2 coco8 shards in a process pool reproduces the metrics of a single validation run."""
+    args = dict(data="coco8.yaml", imgsz=32, batch=2, device="cpu")
+    assert YOLO(MODEL).val(**args).results_dict == YOLO(MODEL).val(**args, shards=2).results_dict
+
+
+def test_val_shards_in_memory():
+    """Test that sharded validation validates an in-memory model and rejects tasks without mergeable metrics."""
+    for d in "images", "labels":
+        (TMP / "val_shards" / d).mkdir(parents=True, exist_ok=True)
+    for i, f in enumerate(["bus.jpg", "zidane.jpg"] * 2):
+        cv2.imwrite(str(TMP / "val_shards/images" / f"{i}.jpg"), cv2.imread(str(ASSETS / f)))
+        (TMP / "val_shards/labels" / f"{i}.txt").write_text("0 0.5 0.5 0.2 0.4\n")
+    data = TMP / "val_shards/data.yaml"
+    data.write_text(yaml.safe_dump(dict(path=str(TMP / "val_shards"), train="images", val="images", names={0: "a"})))
+    args = dict(data=str(data), imgsz=32, batch=2, device="cpu", plots=False)
+
+    model = YOLO(CFG)  # random weights, not the ones a shard would build from 'yolov8n.yaml'
+    matrix = model.val(**args).confusion_matrix.matrix
+    assert (model.val(**args, shards=2).confusion_matrix.matrix == matrix).all()
+    with pytest.raises(NotImplementedError):
+        YOLO("yolov8n-seg.yaml").val(**args, shards=2)
+
+
+def test_val_cache():
+    """Test that re-scoring cached raw predictions with other conf and iou matches a full validation."""
+    args = dict(data="coco8.yaml", imgsz=32, iou=0.6)
+    YOLO(MODEL).val(**args, val_cache=True)  # record at default conf=0.001
+    metrics = YOLO(MODEL).val(**args, conf=0.01).results_dict
+    assert YOLO(MODEL).val(**args, conf=0.01, val_cache=True).results_dict == metrics
+
+
 @pytest.mark.skipif(checks.IS_PYTHON_3_12, reason="OpenVINO not supported in Python 3.12")
 @pytest.mark.skipif(not TORCH_1_13, reason="OpenVINO requires torch>=1.13")
 def test_export_openvino():
@@ -376,6 +448,248 @@ def test_data_utils():
     zip_directory(TMP / "coco8/images/val")  # zip
 
 
+def test_data_cache_mmap():
+    """Test that the packed memory-mapped image cache loads the same images as reading them."""
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data.build import build_yolo_dataset
+
+    (TMP / "mmap/images").mkdir(parents=True, exist_ok=True)
+    for f in ASSETS.glob("*.jpg"):
+        cv2.imwrite(str(TMP / "mmap/images" / f.name), cv2.imread(str(f)))
+    data, cfg = {"names": {0: "person"}, "nc": 1}, get_cfg(overrides={"imgsz": 64})
+    ims = build_yolo_dataset(cfg, TMP / "mmap/images", 2, data, mode="val")
+    cfg.cache = "mmap"
+    for _ in range(2):  # create, then reuse the cache
+        cached = build_yolo_dataset(cfg, TMP / "mmap/images", 2, data, mode="val")
+        assert cached.ims_file.exists() and cached.ims_index is not None
+        for i in range(ims.ni):
+            (a, *hw), (b, *hw_cached) = ims.load_image(i), cached.load_image(i)
+            assert (a == b).all() and hw == hw_cached
+
+
+def test_data_shared_batches():
+    """Test that batches collated into shared-memory buffers by dataloader workers equal regular batches."""
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data.build import SharedBatches, build_dataloader, build_yolo_dataset
+
+    (TMP / "shared/images").mkdir(parents=True, exist_ok=True)
+    for f in ASSETS.glob("*.jpg"):
+        cv2.imwrite(str(TMP / "shared/images" / f.name), cv2.imread(str(f)))
+    data = {"names": {0: "person"}, "nc": 1}
+    dataset = build_yolo_dataset(
+        get_cfg(overrides={"imgsz": 64}), TMP / "shared/images", 1, data, mode="val", rect=True
+    )
+    loader, shared = (build_dataloader(dataset, 1, 2, shuffle=False, shared=x) for x in (False, True))
+    assert isinstance(shared.collate_fn, SharedBatches)
+    for _ in range(3):  # reuse the ring
+        for a, b in zip(loader, shared):
+            assert a["img"].shape == b["img"].shape and (a["img"] == b["img"]).all()
+            assert torch.equal(a["bboxes"], b["bboxes"]) and torch.equal(a["batch_idx"], b["batch_idx"])
+
+
+def test_data_shards():
+    """Test that datasets read from tar shards match the source dataset and stream all images every epoch."""
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import YOLODataset, YOLOShardDataset, YOLOStreamDataset
+    from ultralytics.data.build import build_dataloader, build_yolo_dataset
+    from ultralytics.data.converter import convert_to_shards
+    from ultralytics.data.utils import check_det_dataset
+    from ultralytics.utils import yaml_save
+
+    for d in "images", "labels":
+        (TMP / "src" / d).mkdir(parents=True, exist_ok=True)
+    for f in ASSETS.glob("*.jpg"):
+        cv2.imwrite(str(TMP / "src/images" / f.name), cv2.imread(str(f)))
+        (TMP / "src/labels" / f.with_suffix(".txt").name).write_text("0 0.5 0.5 0.2 0.4\n")
+    yaml_save(TMP / "src/data.yaml", {"path": str(TMP / "src"), "train": "images", "val": "images", "names": ["a"]})
+    data = check_det_dataset(str(convert_to_shards(TMP / "src/data.yaml", TMP / "shards", shard_size=1)))
+    cfg = get_cfg(overrides={"imgsz": 64})
+    shards = build_yolo_dataset(cfg, data["val"], 1, data, mode="val")
+    images = YOLODataset(TMP / "src/images", imgsz=64, augment=False, data=data, hyp=cfg)
+    assert isinstance(shards, YOLOShardDataset) and len(shards) == len(images)
+    for a, b in zip(shards, images):
+        assert Path(a["im_file"]).name == Path(b["im_file"]).name and (a["img"] == b["img"]).all()
+    stream = build_yolo_dataset(cfg, data["train"], 1, data, mode="train")
+    assert isinstance(stream, YOLOStreamDataset)
+    stream.shuffle_buffer = 1
+    loader = build_dataloader(stream, 1, 0)
+    assert sorted(Path(b["im_file"][0]).name for b in loader) == sorted(Path(f).name for f in images.im_files)
+    nw = len(stream) + 1  # workers without images of their own must still yield
+    loader = torch.utils.data.DataLoader(stream, 1, num_workers=nw, collate_fn=stream.collate_fn, timeout=60)
+    assert len([b for b, _ in zip(loader, range(2 * nw))]) == 2 * nw
+
+
+def test_data_reduced_decode():
+    """Test that JPEGs decoded downscaled load with the shapes and close to the pixels of fully decoded JPEGs."""
+    from ultralytics.data import YOLODataset
+
+    (TMP / "large/images").mkdir(parents=True, exist_ok=True)
+    im = cv2.imread(str(ASSETS / "bus.jpg"))
+    cv2.imwrite(str(TMP / "large/images/bus.jpg"), cv2.resize(im, (im.shape[1] * 3, im.shape[0] * 3)))
+    full = cv2.imread(str(TMP / "large/images/bus.jpg"))
+    dataset = YOLODataset(TMP / "large/images", imgsz=320, augment=False, data={"names": {0: "person"}})
+    for rect_mode in True, False:
+        assert dataset.decode_scale(0, rect_mode)[0] > 1
+        im, hw0, hw = dataset.load_image(0, rect_mode)
+        assert hw0 == full.shape[:2] and hw == (320, 240 if rect_mode else 320)
+        ref = cv2.resize(full, hw[::-1], interpolation=cv2.INTER_AREA)  # antialiased full decode
+        assert np.abs(im.astype(int) - ref).mean() < 5
+
+
+def test_data_split_dataset():
+    """Test that stratified dataset splits keep groups together and link images with their own labels."""
+    from ultralytics.data.utils import split_dataset
+
+    for d in "images", "labels":
+        (TMP / "split" / d).mkdir(parents=True, exist_ok=True)
+    for i in range(40):
+        (TMP / "split/images" / f"g{i // 4}_{i}.jpg").write_bytes(bytes([i]))
+        if i % 8:  # backgrounds without label file
+            (TMP / "split/labels" / f"g{i // 4}_{i}.txt").write_text(f"{i % 2} 0.5 0.5 0.1 0.1\n")
+    splits = split_dataset(TMP / "split/images", TMP / "split", weights=(0.5, 0.5, 0), group=r"^g\d+", mode="link")
+    assert len(splits["train"]) + len(splits["val"]) == 40 and not splits["test"]
+    groups = [{Path(f).stem.split("_")[0] for f in splits[k]} for k in ("train", "val")]
+    assert groups[0] and groups[1] and not groups[0] & groups[1]
+    for f in (TMP / "split/val/images").iterdir():
+        lb = TMP / "split/val/labels" / f"{f.stem}.txt"
+        assert lb.exists() == (f.read_bytes()[0] % 8 > 0)
+
+    for i in range(40):  # 8 rare classes of 5 images each
+        (TMP / "split/images" / f"r{i}.jpg").write_bytes(bytes([i]))
+        (TMP / "split/labels" / f"r{i}.txt").write_text(f"{2 + i // 5} 0.5 0.5 0.1 0.1\n")
+    splits = split_dataset(TMP / "split/images", TMP / "split", weights=(0.8, 0.1, 0.1), group=r"^g\d+")
+    assert [len(x) for x in splits.values()] == [64, 8, 8]
+    assert all(any(Path(f).stem.startswith("r") for f in x) for x in splits.values())  # rare classes in every split
+    with pytest.raises(ValueError):
+        split_dataset(TMP / "split/images", mode="hardlink")
+
+
+def test_data_dedup_dataset():
+    """Test that near-duplicate images are clustered by perceptual hash and left out of the saved image list."""
+    from ultralytics.data.utils import dedup_dataset
+
+    (TMP / "dedup/images").mkdir(parents=True, exist_ok=True)
+    for f in "bus.jpg", "zidane.jpg":
+        im = cv2.imread(str(ASSETS / f))
+        cv2.imwrite(str(TMP / "dedup/images" / f), im)
+        cv2.imwrite(str(TMP / "dedup/images" / f"{f[:-4]}_small.jpg"), cv2.resize(im, None, fx=0.5, fy=0.5))
+        cv2.imwrite(str(TMP / "dedup/images" / f"{f[:-4]}_q.jpg"), im, [cv2.IMWRITE_JPEG_QUALITY, 30])
+    cv2.imwrite(str(TMP / "dedup/images/flip.jpg"), cv2.flip(im, 1))
+    clusters = dedup_dataset(TMP / "dedup/images", threshold=8)
+    assert [[Path(f).stem for f in c] for c in clusters] == [
+        ["bus", "bus_q", "bus_small"],
+        ["zidane", "zidane_q", "zidane_small"],
+    ]
+    kept = {Path(f).stem for f in (TMP / "dedup/dedup.txt").read_text().splitlines()}
+    assert kept == {"bus", "zidane", "flip"}
+
+
+def test_data_columnar_labels():
+    """Test that memory-mapped columnar labels return the per-image label dicts they were built from."""
+    import pickle
+
+    from ultralytics.data.utils import ColumnarLabels
+
+    seg = [np.random.rand(5, 2).astype(np.float32), np.random.rand(7, 2).astype(np.float32)]
+    labels = [
+        dict(im_file=f"{i}.jpg", shape=(480, 640), cls=np.array([[0], [1]], np.float32)[: i % 3], segments=seg[: i % 3])
+        for i in range(5)
+    ]
+    for lb in labels:
+        lb.update(bboxes=np.random.rand(len(lb["cls"]), 4).astype(np.float32), keypoints=None)
+    columns = ColumnarLabels.from_labels(labels)
+    TMP.mkdir(parents=True, exist_ok=True)
+    columns.save(TMP / "columnar.labels")
+    columns = pickle.loads(pickle.dumps(columns))  # maps the columns again
+    for a, b in zip(labels, columns):
+        assert a["im_file"] == b["im_file"] and a["shape"] == b["shape"]
+        assert (a["cls"] == b["cls"]).all() and (a["bboxes"] == b["bboxes"]).all()
+        assert len(a["segments"]) == len(b["segments"]) and all(
+            (x == y).all() for x, y in zip(a["segments"], b["segments"])
+        )
+    assert columns[[4, 1]].im_files == ["4.jpg", "1.jpg"]
+    columns.update(include_class=[1], single_cls=True)
+    assert [len(lb["cls"]) for lb in columns] == [0, 0, 1, 0, 0] and not columns[2]["cls"].any()
+    assert (columns[2]["segments"][0] == seg[1]).all()
+
+
+def test_data_fused_mosaic():
+    """Test that fused mosaic and perspective match assembling the full mosaic canvas before the warp."""
+    import random
+
+    from ultralytics.data.augment import Compose, Mosaic, RandomPerspective
+    from ultralytics.utils.instance import Instances
+
+    class Dataset:
+        buffer = [0, 1, 2, 3]
+
+        def get_image_and_label(self, i):
+            """Returns a random 64x48 image with one box."""
+            img = np.random.RandomState(i).randint(0, 255, (48, 64, 3), dtype=np.uint8)
+            bboxes = np.array([[0.5, 0.5, 0.4, 0.6]], dtype=np.float32)
+            return dict(
+                im_file=f"{i}.jpg",
+                ori_shape=(48, 64),
+                resized_shape=(48, 64),
+                img=img,
+                cls=np.zeros((1, 1)),
+                instances=Instances(bboxes, np.zeros((0, 1000, 2), dtype=np.float32), normalized=True),
+            )
+
+    outputs = []
+    for fused in False, True:
+        random.seed(0)
+        transforms = Compose([Mosaic(Dataset(), imgsz=64, fused=fused), RandomPerspective(degrees=10, shear=5)])
+        outputs.append([transforms(Dataset().get_image_and_label(i % 4)) for i in range(20)])
+    for a, b in zip(*outputs):
+        assert "mosaic_tiles" not in b and a["img"].shape == b["img"].shape == (64, 64, 3)
+        assert np.abs(a["img"].astype(int) - b["img"]).mean() < 0.1
+        assert (a["cls"] == b["cls"]).all() and np.allclose(a["instances"].bboxes, b["instances"].bboxes)
+
+
+def test_data_batch_augment():
+    """Test that batched augmentations keep images and boxes unchanged when disabled and boxes valid when enabled."""
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data.augment import BatchAugment
+
+    off = ("mosaic", "mixup", "degrees", "translate", "scale", "shear", "hsv_h", "hsv_s", "hsv_v", "flipud", "fliplr")
+    hyp = get_cfg(overrides={k: 0.0 for k in off})
+    batch = dict(
+        img=torch.rand(4, 3, 64, 64),
+        bboxes=torch.tensor([[0.5, 0.5, 0.5, 0.5], [0.3, 0.4, 0.2, 0.3], [0.6, 0.5, 0.4, 0.4]]),
+        cls=torch.tensor([[0.0], [1.0], [0.0]]),
+        batch_idx=torch.tensor([0.0, 0.0, 2.0]),
+    )
+    out = BatchAugment(64, hyp)({k: v.clone() for k, v in batch.items()})
+    assert all(torch.allclose(out[k], v, atol=1e-5) for k, v in batch.items())
+
+    out = BatchAugment(64, get_cfg(overrides={"mixup": 0.5, "degrees": 10.0, "shear": 2.0}))(batch)
+    assert out["img"].shape == (4, 3, 64, 64) and 0 <= out["img"].min() and out["img"].max() <= 1
+    assert len(out["bboxes"]) == len(out["cls"]) == len(out["batch_idx"])
+    assert (out["bboxes"] >= 0).all() and (out["bboxes"] <= 1).all()
+
+
+def test_data_cache_incremental():
+    """Test that the labels cache is updated with only the new or modified images of a dataset."""
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data.build import build_yolo_dataset
+
+    for d in "images", "labels":
+        (TMP / f"incremental/{d}").mkdir(parents=True, exist_ok=True)
+    for f in TMP.glob("incremental/labels.cache*"):
+        f.unlink()
+    for f in ASSETS.glob("*.jpg"):
+        cv2.imwrite(str(TMP / "incremental/images" / f.name), cv2.imread(str(f)))
+        (TMP / "incremental/labels" / f"{f.stem}.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+    data, cfg = {"names": {0: "person"}, "nc": 1}, get_cfg(overrides={"imgsz": 64})
+    build_yolo_dataset(cfg, TMP / "incremental/images", 2, data, mode="val")
+    (TMP / "incremental/labels/bus.txt").write_text("0 0.5 0.5 0.2 0.2\n0 0.3 0.3 0.1 0.1\n")  # modified label
+    cv2.imwrite(str(TMP / "incremental/images/new.jpg"), cv2.imread(str(SOURCE)))  # new unlabeled image
+    dataset = build_yolo_dataset(cfg, TMP / "incremental/images", 2, data, mode="val")
+    labels = {Path(lb["im_file"]).name: len(lb["cls"]) for lb in dataset.labels}
+    assert labels == {"bus.jpg": 2, "zidane.jpg": 1, "new.jpg": 0}
+
+
 @pytest.mark.skipif(not ONLINE, reason="environment is offline")
 def test_data_converter():
     """Test dataset converters."""
@@ -501,6 +815,137 @@ def test_utils_ops():
     torch.allclose(boxes, xyxyxyxy2xywhr(xywhr2xyxyxyxy(boxes)), rtol=1e-3)
 
 
+def test_utils_ops_v10postprocess():
+    """Test the packed v10 postprocess matches thresholded fixed-size v10postprocess outputs."""
+    from ultralytics.utils.ops import v10postprocess, v10postprocess_packed, xywh2xyxy
+
+    preds = torch.rand(2, 100, 4 + 3)
+    boxes, scores, labels = v10postprocess(preds, 20, 3)
+    det, offsets = v10postprocess_packed(preds, 20, 3, conf=0.5)
+    for i in range(2):
+        keep, d = scores[i] > 0.5, det[offsets[i] : offsets[i + 1]]
+        assert torch.allclose(d[:, :4], xywh2xyxy(boxes[i][keep]))
+        assert torch.allclose(d[:, 4], scores[i][keep])
+        assert torch.equal(d[:, 5].long(), labels[i][keep])
+
+
+def test_utils_metrics_ap_per_class():
+    """Test the vectorized ap_per_class matches per-class compute_ap and batched matching matches per-image."""
+    from ultralytics.models.yolo.detect import DetectionValidator
+    from ultralytics.utils.metrics import ap_per_class, box_iou, compute_ap
+
+    rng = np.random.default_rng(0)
+    tp, conf, pred_cls = rng.random((500, 10)) < 0.3, rng.random(500).round(2), rng.integers(0, 4, 500)
+    target_cls = rng.integers(0, 3, 200)
+    for c in range(4):
+        tp[pred_cls == c] &= tp[pred_cls == c].cumsum(0) <= (target_cls == c).sum()  # no more TPs than labels
+    ap = ap_per_class(tp, conf, pred_cls, target_cls, names={})[5]
+    i = np.argsort(-conf)
+    for c in range(3):
+        t = tp[i][pred_cls[i] == c].cumsum(0)
+        r, p = t / (target_cls == c).sum(), t / np.arange(1, len(t) + 1)[:, None]
+        assert np.allclose(ap[c], [compute_ap(r[:, j], p[:, j])[0] for j in range(10)])
+
+    validator = DetectionValidator()
+    xy = torch.rand(2, 8, 2) * 64
+    gt = torch.cat((xy, xy + 16), -1)
+    det = torch.cat((gt[:, torch.randint(0, 8, (20,))] + torch.randn(2, 20, 4), torch.rand(2, 20, 1)), -1)
+    det = torch.cat((det, torch.randint(0, 2, (2, 20, 1)).float()), -1)
+    gt_cls = torch.randint(0, 2, (2, 8)).float()
+    batched = validator._process_batches(list(det), list(gt), list(gt_cls))
+    single = [validator.match_predictions(d[:, 5], c, box_iou(g, d[:, :4])) for d, g, c in zip(det, gt, gt_cls)]
+    assert torch.equal(batched, torch.cat(single))
+
+
+def test_utils_metrics_operating_points():
+    """Test image-level alarm thresholds reach the target recall at the highest confidence, with fewest false alarms."""
+    from ultralytics.utils.metrics import operating_points
+
+    conf = np.array([[0.875], [0.625], [0.25], [0.0], [0.5], [0.125]])  # 4 images with labels, 2 without
+    target = np.array([[1], [1], [1], [1], [0], [0]])
+    point = operating_points(conf, target, target_recall=0.75)[0]
+    assert point["conf"] == 0.25 and point["recall"] == 0.75 and point["false_alarm_rate"] == 0.5
+    assert operating_points(conf, target, target_recall=0.5)[0]["false_alarm_rate"] == 0.0
+
+
+def test_utils_metrics_coco_eval():
+    """Test native COCO evaluation counts duplicates as FPs, ignores crowd matches and splits metrics by area."""
+    import json
+
+    from ultralytics.utils.metrics import COCOEval
+
+    coco = COCOEval()
+    coco.add(1, np.array([[0, 0, 100, 100, 0.9, 1], [0, 0, 100, 100, 0.8, 1]]), np.zeros((0, 4)), np.zeros(0))
+    coco.add(2, np.array([[0, 0, 20, 20, 0.7, 1], [210, 210, 260, 260, 0.95, 1]]), np.zeros((0, 4)), np.zeros(0))
+    anns = [
+        dict(image_id=1, category_id=1, bbox=[0, 0, 100, 100], area=10000, iscrowd=0),  # large
+        dict(image_id=2, category_id=1, bbox=[0, 0, 20, 20], area=400, iscrowd=0),  # small
+        dict(image_id=2, category_id=1, bbox=[200, 200, 100, 100], area=10000, iscrowd=1),  # crowd
+    ]
+    with open(TMP / "instances.json", "w") as f:
+        json.dump(dict(annotations=anns), f)
+    coco.load_annotations(TMP / "instances.json")
+    stats = coco.evaluate()  # TP 0.9, FP 0.8, TP 0.7, crowd match ignored
+    assert np.allclose(stats[:3], (51 + 50 * 2 / 3) / 101)  # exact boxes, same AP at all IoU thresholds
+    assert np.allclose(stats[[3, 5, 7, 8]], 1.0) and stats[4] == -1.0  # small, large, AR@10, AR@100, no medium
+    assert np.isclose(stats[6], 0.5)  # AR@1, the crowd match is the top detection of image 2
+
+
+def test_utils_metrics_confusion_matrix():
+    """Test batched confusion matrix counts of matches, duplicates, misses and merged matrices."""
+    from ultralytics.utils.metrics import ConfusionMatrix
+
+    det = torch.tensor([[0, 0, 10, 10, 0.9, 1], [0, 0, 10, 9, 0.8, 0], [50, 50, 60, 60, 0.9, 1], [0, 0, 9, 9, 0.1, 1]])
+    gt, cls = torch.tensor([[0, 0, 10, 10], [20, 20, 30, 30]]), torch.tensor([0.0, 1.0])
+    cm = ConfusionMatrix(nc=2, conf=0.25)
+    cm.process_batches([det, det[:0]], [gt, gt[:1]], [cls, cls[:1]])
+    # label 0 matched as class 1, duplicate and far detections background FPs, label 1 and image 2 label missed
+    assert cm.matrix.tolist() == [[0, 0, 1], [1, 0, 1], [1, 1, 0]]
+    single = ConfusionMatrix(nc=2, conf=0.25)
+    single.process_batch(det, gt, cls)
+    single.process_batch(None, gt[:1], cls[:1])
+    assert (single.matrix == cm.matrix).all() and (cm.merge(single).matrix == 2 * single.matrix).all()
+
+
+@pytest.mark.skipif(not IS_TMP_WRITEABLE, reason="directory is not writeable")
+def test_utils_metrics_error_index():
+    """Test per-image error index counts, filters and worst-image queries after a save and load round trip."""
+    from ultralytics.utils.metrics import ErrorIndex
+
+    det = [
+        torch.tensor([[0, 0, 100, 100, 0.9, 0], [0, 0, 10, 10, 0.8, 1], [200, 200, 220, 220, 0.1, 1]]),
+        torch.zeros(0, 6),
+    ]
+    gt = [torch.tensor([[0, 0, 100, 90], [0, 0, 10, 10]]), torch.tensor([[0, 0, 5, 5]])]
+    cls = [torch.tensor([0, 0]), torch.tensor([1])]
+    tp = torch.tensor([[True] * 4 + [False] * 6, [False] * 10, [False] * 10])  # first detection matched up to IoU 0.65
+    index = ErrorIndex()
+    index.update(["a.jpg", "b.jpg"], det, gt, cls, tp)
+    index.save(TMP / "error_index.npz")
+    index = ErrorIndex.load(TMP / "error_index.npz")
+    x = index.images(conf=0.05)
+    assert x["tp"].tolist() == [1, 0] and x["fp"].tolist() == [2, 0] and x["fn"].tolist() == [1, 1]
+    assert np.isclose(x["iou"][0], 0.9) and np.isclose(x["fp_conf"][0], 0.8)
+    assert index.images(conf=0.05, iou=0.75)["fn"].tolist() == [2, 1]  # no TP above IoU 0.65
+    assert index.images(conf=0.05, cls=1, size="small")["fn"].tolist() == [0, 1]
+    assert index.worst(1, by="fp_conf", conf=0.5)["file"].tolist() == ["a.jpg"]
+
+
+def test_utils_metrics_conf_histogram():
+    """Test streamed ConfHistogram AP equals exact AP when no two predictions of a class share a confidence bin."""
+    from ultralytics.utils.metrics import ConfHistogram, ap_per_class
+
+    rng = np.random.default_rng(0)
+    conf = (rng.permutation(1000)[:400] + 0.5) / 1000  # one prediction per bin
+    tp, pred_cls, target_cls = rng.random((400, 10)) < 0.3, rng.integers(0, 4, 400), rng.integers(0, 3, 150)
+    for c in range(4):
+        tp[pred_cls == c] &= tp[pred_cls == c].cumsum(0) <= (target_cls == c).sum()  # no more TPs than labels
+    hist = ConfHistogram(nc=4, bins=1000)
+    for i, j in zip(np.array_split(np.arange(400), 4), np.array_split(np.arange(150), 4)):  # streamed in batches
+        hist.update(*(torch.from_numpy(x[i]) for x in (tp, conf, pred_cls)), torch.from_numpy(target_cls[j]))
+    assert np.allclose(hist.ap_per_class(names={})[5], ap_per_class(tp, conf, pred_cls, target_cls, names={})[5])
+
+
 def test_utils_files():
     """Test file handling utilities."""
     from ultralytics.utils.files import file_age, file_date, get_latest_run, spaces_in_path
@@ -564,6 +1009,85 @@ def test_nn_modules_block():
     BottleneckCSP(c1, c2)(x)
 
 
+def test_yolov10_prune():
+    """Test YOLOv10 structured channel pruning keeps the model consistent."""
+    from ultralytics.models.yolov10.prune import channel_groups, prune_channels
+    from ultralytics.nn.tasks import YOLOv10DetectionModel
+
+    model = YOLOv10DetectionModel("yolov10n.yaml", verbose=False)
+    sizes = [n for n, _ in channel_groups(model)]
+    prune_channels(model, ratio=0.1)
+    assert [n for n, _ in channel_groups(model)] == [round(n * 0.9 / 16) * 16 for n in sizes]  # 16, 32, 64 kept
+    model = YOLOv10DetectionModel("yolov10n.yaml", verbose=False)
+    n = sum(x.numel() for x in model.parameters())
+    prune_channels(model, ratio=0.5)
+    assert sum(x.numel() for x in model.parameters()) < n
+    model.eval()(torch.zeros(1, 3, 64, 64))
+    model.fuse()(torch.zeros(1, 3, 64, 64))
+
+
+def test_yolov10_distill():
+    """Test YOLOv10 distillation loss terms vanish for an identical teacher and that checkpoints exclude the teacher."""
+    from ultralytics import YOLOv10
+    from ultralytics.nn.tasks import YOLOv10DetectionModel
+    from ultralytics.utils.loss import v10DistillLoss
+    from ultralytics.utils.torch_utils import de_parallel
+
+    student = YOLOv10DetectionModel("yolov10n.yaml", nc=2, verbose=False).eval()
+    student.args = DEFAULT_CFG
+    student.model[-1].training = True  # raw head outputs with eval-mode BatchNorm, as for the teacher
+    criterion = v10DistillLoss(student, deepcopy(student))
+    batch = dict(
+        img=torch.rand(2, 3, 64, 64),
+        batch_idx=torch.tensor([0.0, 1.0]),
+        cls=torch.tensor([[0.0], [1.0]]),
+        bboxes=torch.tensor([[0.5, 0.5, 0.4, 0.4], [0.3, 0.3, 0.2, 0.2]]),
+    )
+    preds = student(batch["img"])
+    s_feats = list(student.model[-1].kd_feats)
+    t_preds = criterion.teacher(batch["img"])
+    assert criterion.feature_loss(s_feats, criterion.teacher.model[-1].kd_feats) < 1e-6
+    assert all(criterion.head_loss(preds[k], t_preds[k]) < 1e-5 for k in ("one2many", "one2one"))
+    _, items = criterion(preds, batch)
+    assert len(items) == 7 and items[-1] < 1e-5  # 'kd' appended to the 6 v10DetectLoss items
+
+    for d in "images", "labels":
+        (TMP / "distill" / d).mkdir(parents=True, exist_ok=True)
+    for i, f in enumerate(["bus.jpg", "zidane.jpg"] * 2):
+        cv2.imwrite(str(TMP / "distill/images" / f"{i}.jpg"), cv2.imread(str(ASSETS / f)))
+        (TMP / "distill/labels" / f"{i}.txt").write_text(f"{i % 2} 0.5 0.5 0.2 0.4\n")
+    data = TMP / "distill/data.yaml"
+    data.write_text(yaml.safe_dump(dict(path=str(TMP / "distill"), train="images", val="images", names=["a", "b"])))
+    args = dict(data=str(data), epochs=1, imgsz=32, batch=2, workers=0, plots=False, project=TMP / "distill")
+    teacher = YOLOv10("yolov10n.yaml")
+    teacher.train(**args, name="teacher")
+
+    def on_model_save(trainer):
+        """Checks the student gets its distillation criterion and hooks back after saving."""
+        criterion = de_parallel(trainer.model).criterion
+        assert criterion.teacher is not None and len(criterion.hooks) == 2
+
+    model = YOLOv10("yolov10n.yaml")
+    model.add_callback("on_model_save", on_model_save)
+    model.train(**args, name="student", teacher=str(teacher.trainer.last))
+    assert model.trainer.loss_names[-1] == "kd"
+    ema = torch.load(model.trainer.last)["model"]  # stripped, EMA weights
+    assert getattr(ema.__dict__.get("criterion"), "teacher", None) is None and not ema.model[-1]._forward_pre_hooks
+
+
+def test_yolov10_fuse():
+    """Test YOLOv10 fusion is exact and leaves no unfused ops."""
+    from ultralytics.nn.tasks import YOLOv10DetectionModel
+
+    model = YOLOv10DetectionModel("yolov10n.yaml", verbose=False).eval()
+    im = torch.rand(1, 3, 64, 64)
+    assert model.fusion_report(im, n=1, verbose=False)
+    y = model(im)["one2one"][0]
+    assert not model.fuse().fusion_report(im, n=1)
+    assert torch.allclose(y, model(im)["one2one"][0], atol=1e-3)
+    assert "one2many" in model.train()(im)  # fusion keeps the one2many head for saving and training
+
+
 @pytest.mark.skipif(not ONLINE, reason="environment is offline")
 def test_hub():
     """Test Ultralytics HUB functionalities."""
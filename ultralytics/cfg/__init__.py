@@ -95,10 +95,11 @@ CLI_HELP_MSG = f"""
     """
 
 # Define keys for arg type checks
-CFG_FLOAT_KEYS = {"warmup_epochs", "box", "cls", "dfl", "degrees", "shear", "time"}
+CFG_FLOAT_KEYS = {"warmup_epochs", "box", "cls", "dfl", "distill", "degrees", "shear", "time"}
 CFG_FRACTION_KEYS = {
     "dropout",
     "iou",
+    "target_recall",
     "lr0",
     "lrf",
     "momentum",
@@ -131,6 +132,9 @@ CFG_INT_KEYS = {
     "close_mosaic",
     "mask_ratio",
     "max_det",
+    "conf_bins",
+    "shards",
+    "shard",
     "vid_stride",
     "line_width",
     "workspace",
@@ -149,6 +153,8 @@ CFG_BOOL_KEYS = {
     "val",
     "save_json",
     "save_hybrid",
+    "val_cache",
+    "error_index",
     "half",
     "dnn",
     "plots",
@@ -172,6 +178,8 @@ CFG_BOOL_KEYS = {
     "nms",
     "profile",
     "multi_scale",
+    "gpu_augment",
+    "shared_batches",
 }
 
 
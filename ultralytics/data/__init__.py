@@ -2,13 +2,15 @@
 
 from .base import BaseDataset
 from .build import build_dataloader, build_yolo_dataset, load_inference_source
-from .dataset import ClassificationDataset, SemanticDataset, YOLODataset
+from .dataset import ClassificationDataset, SemanticDataset, YOLODataset, YOLOShardDataset, YOLOStreamDataset
 
 __all__ = (
     "BaseDataset",
     "ClassificationDataset",
     "SemanticDataset",
     "YOLODataset",
+    "YOLOShardDataset",
+    "YOLOStreamDataset",
     "build_yolo_dataset",
     "build_dataloader",
     "load_inference_source",
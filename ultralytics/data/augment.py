@@ -7,13 +7,14 @@ from copy import deepcopy
 import cv2
 import numpy as np
 import torch
+import torch.nn.functional as F
 import torchvision.transforms as T
 
 from ultralytics.utils import LOGGER, colorstr
 from ultralytics.utils.checks import check_version
 from ultralytics.utils.instance import Instances
 from ultralytics.utils.metrics import bbox_ioa
-from ultralytics.utils.ops import segment2box, xyxyxyxy2xywhr
+from ultralytics.utils.ops import segment2box, xywh2xyxy, xyxy2xywh, xyxyxyxy2xywhr
 from ultralytics.utils.torch_utils import TORCHVISION_0_10, TORCHVISION_0_11, TORCHVISION_0_13
 from .utils import polygons2masks, polygons2masks_overlap
 
@@ -144,9 +145,12 @@ class Mosaic(BaseMixTransform):
         imgsz (int, optional): Image size (height and width) after mosaic pipeline of a single image. Default to 640.
         p (float, optional): Probability of applying the mosaic augmentation. Must be in the range 0-1. Default to 1.0.
         n (int, optional): The grid size, either 4 (for 2x2) or 9 (for 3x3).
+        fused (bool, optional): For 2x2 mosaics, return the tiles in 'mosaic_tiles' and a read-only placeholder image
+            instead of assembling the (2 * imgsz, 2 * imgsz) canvas. The following RandomPerspective then composes
+            only the part of the canvas its warp samples. Default to False.
     """
 
-    def __init__(self, dataset, imgsz=640, p=1.0, n=4):
+    def __init__(self, dataset, imgsz=640, p=1.0, n=4, fused=False):
         """Initializes the object with a dataset, image size, probability, and border."""
         assert 0 <= p <= 1.0, f"The probability should be in range [0, 1], but got {p}."
         assert n in (4, 9), "grid must be equal to 4 or 9."
@@ -155,6 +159,7 @@ class Mosaic(BaseMixTransform):
         self.imgsz = imgsz
         self.border = (-imgsz // 2, -imgsz // 2)  # width, height
         self.n = n
+        self.fused = fused
 
     def get_indexes(self, buffer=True):
         """Return a list of random indexes from the dataset."""
@@ -210,6 +215,7 @@ class Mosaic(BaseMixTransform):
         mosaic_labels = []
         s = self.imgsz
         yc, xc = (int(random.uniform(-x, 2 * s + x)) for x in self.border)  # mosaic center x, y
+        tiles = []  # (img, xmin, ymin) on the large image, for fused mosaic
         for i in range(4):
             labels_patch = labels if i == 0 else labels["mix_labels"][i - 1]
             # Load image
@@ -218,7 +224,10 @@ class Mosaic(BaseMixTransform):
 
             # Place img in img4
             if i == 0:  # top left
-                img4 = np.full((s * 2, s * 2, img.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
+                if self.fused:  # placeholder, RandomPerspective composes the canvas from tiles
+                    img4 = np.broadcast_to(np.uint8(114), (s * 2, s * 2, img.shape[2]))
+                else:
+                    img4 = np.full((s * 2, s * 2, img.shape[2]), 114, dtype=np.uint8)  # base image with 4 tiles
                 x1a, y1a, x2a, y2a = max(xc - w, 0), max(yc - h, 0), xc, yc  # xmin, ymin, xmax, ymax (large image)
                 x1b, y1b, x2b, y2b = w - (x2a - x1a), h - (y2a - y1a), w, h  # xmin, ymin, xmax, ymax (small image)
             elif i == 1:  # top right
@@ -231,7 +240,10 @@ class Mosaic(BaseMixTransform):
                 x1a, y1a, x2a, y2a = xc, yc, min(xc + w, s * 2), min(s * 2, yc + h)
                 x1b, y1b, x2b, y2b = 0, 0, min(w, x2a - x1a), min(y2a - y1a, h)
 
-            img4[y1a:y2a, x1a:x2a] = img[y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
+            if self.fused:
+                tiles.append((img[y1b:y2b, x1b:x2b], x1a, y1a))
+            else:
+                img4[y1a:y2a, x1a:x2a] = img[y1b:y2b, x1b:x2b]  # img4[ymin:ymax, xmin:xmax]
             padw = x1a - x1b
             padh = y1a - y1b
 
@@ -239,6 +251,8 @@ class Mosaic(BaseMixTransform):
             mosaic_labels.append(labels_patch)
         final_labels = self._cat_labels(mosaic_labels)
         final_labels["img"] = img4
+        if self.fused:
+            final_labels["mosaic_tiles"] = tiles
         return final_labels
 
     def _mosaic9(self, labels):
@@ -360,7 +374,8 @@ class RandomPerspective:
         pre_transform (callable): A function/transform to apply to the image before starting the random transformation.
 
     Methods:
-        affine_transform(img, border): Applies a series of affine transformations to the image.
+        affine_transform(img, border, tiles): Applies a series of affine transformations to the image.
+        compose_window(tiles, M, shape): Composes the part of a fused mosaic canvas that the warp samples.
         apply_bboxes(bboxes, M): Transforms bounding boxes using the calculated affine matrix.
         apply_segments(segments, M): Transforms segments and generates new bounding boxes.
         apply_keypoints(keypoints, M): Transforms keypoints.
@@ -381,13 +396,14 @@ class RandomPerspective:
         self.border = border  # mosaic border
         self.pre_transform = pre_transform
 
-    def affine_transform(self, img, border):
+    def affine_transform(self, img, border, tiles=None):
         """
         Applies a sequence of affine transformations centered around the image center.
 
         Args:
             img (ndarray): Input image.
             border (tuple): Border dimensions.
+            tiles (list, optional): Tiles of a fused mosaic, in which case 'img' is only a placeholder of canvas shape.
 
         Returns:
             img (ndarray): Transformed image.
@@ -428,12 +444,49 @@ class RandomPerspective:
         M = T @ S @ R @ P @ C  # order of operations (right to left) is IMPORTANT
         # Affine image
         if (border[0] != 0) or (border[1] != 0) or (M != np.eye(3)).any():  # image changed
+            Mw = M
+            if tiles is not None:  # warp from the sampled window of the mosaic canvas
+                img, x0, y0 = self.compose_window(tiles, M, img.shape)
+                Mw = M @ np.array([[1, 0, x0], [0, 1, y0], [0, 0, 1]], dtype=np.float32)
             if self.perspective:
-                img = cv2.warpPerspective(img, M, dsize=self.size, borderValue=(114, 114, 114))
+                img = cv2.warpPerspective(img, Mw, dsize=self.size, borderValue=(114, 114, 114))
             else:  # affine
-                img = cv2.warpAffine(img, M[:2], dsize=self.size, borderValue=(114, 114, 114))
+                img = cv2.warpAffine(img, Mw[:2], dsize=self.size, borderValue=(114, 114, 114))
         return img, M, s
 
+    def compose_window(self, tiles, M, shape):
+        """
+        Composes only the window of a fused mosaic canvas that the warp 'M' samples into the output image.
+
+        Pixels outside the window are never read by the interpolation, so warping the window with 'M' shifted to its
+        corner gives the same output as warping the full canvas, while touching a fraction of its memory for scales >
+        0.5.
+
+        Args:
+            tiles (list): Tuples (img, x, y) of tile images and their top-left corners on the canvas.
+            M (ndarray): Transformation matrix from canvas to output pixels.
+            shape (tuple): Shape (h, w, c) of the full canvas.
+
+        Returns:
+            img (ndarray): Canvas window, filled with 114 where there are no tiles.
+            x0 (int): Left edge of the window on the canvas.
+            y0 (int): Top edge of the window on the canvas.
+        """
+        h, w, c = shape
+        xy = np.array([[0, 0, 1], [self.size[0], 0, 1], [0, self.size[1], 1], [*self.size, 1]]) @ np.linalg.inv(M).T
+        if (xy[:, 2] > 0).all():  # output corners map to finite canvas points
+            xy = xy[:, :2] / xy[:, 2:3]
+            x0, y0 = np.clip(np.floor(xy.min(0)).astype(int) - 2, 0, (w - 1, h - 1))
+            x1, y1 = np.clip(np.ceil(xy.max(0)).astype(int) + 3, (x0 + 1, y0 + 1), (w, h))
+        else:  # extreme perspective, compose the full canvas
+            x0, y0, x1, y1 = 0, 0, w, h
+        img = np.full((y1 - y0, x1 - x0, c), 114, dtype=np.uint8)
+        for tile, x, y in tiles:
+            xa, ya, xb, yb = max(x, x0), max(y, y0), min(x + tile.shape[1], x1), min(y + tile.shape[0], y1)
+            if xa < xb and ya < yb:
+                img[ya - y0 : yb - y0, xa - x0 : xb - x0] = tile[ya - y : yb - y, xa - x : xb - x]
+        return img, int(x0), int(y0)
+
     def apply_bboxes(self, bboxes, M):
         """
         Apply affine to bboxes only.
@@ -531,7 +584,7 @@ class RandomPerspective:
         self.size = img.shape[1] + border[1] * 2, img.shape[0] + border[0] * 2  # w, h
         # M is affine matrix
         # Scale for func:`box_candidates`
-        img, M, scale = self.affine_transform(img, border)
+        img, M, scale = self.affine_transform(img, border, labels.pop("mosaic_tiles", None))
 
         bboxes = self.apply_bboxes(instances.bboxes, M)
 
@@ -974,7 +1027,7 @@ def v8_transforms(dataset, imgsz, hyp, stretch=False):
     """Convert images to a size suitable for YOLOv8 training."""
     pre_transform = Compose(
         [
-            Mosaic(dataset, imgsz=imgsz, p=hyp.mosaic),
+            Mosaic(dataset, imgsz=imgsz, p=hyp.mosaic, fused=not hyp.copy_paste),  # CopyPaste needs the canvas
             CopyPaste(p=hyp.copy_paste),
             RandomPerspective(
                 degrees=hyp.degrees,
@@ -1007,6 +1060,136 @@ def v8_transforms(dataset, imgsz, hyp, stretch=False):
     )  # transforms
 
 
+class BatchAugment:
+    """
+    Mosaic, random perspective, MixUp, HSV and flip augmentations applied to whole batches on their device.
+
+    With 'gpu_augment' the dataloader workers only load and letterbox images (see YOLODataset.build_transforms()), and
+    the trainer passes every collated batch through this class in preprocess_batch(). Mosaic tiles are other images of
+    the same batch instead of the dataset buffer, and the output images are sampled with the perspective warp directly
+    from the tiles, without a mosaic canvas. Boxes are transformed with the same matrices, segments and keypoints are
+    not supported.
+
+    Attributes:
+        imgsz (int): Size of the square letterboxed input and augmented output images.
+        hyp (dict): Augmentation hyperparameters, read on every call so that e.g. close_mosaic() applies.
+    """
+
+    def __init__(self, imgsz, hyp):
+        """Initializes BatchAugment for images of size 'imgsz' with augmentation hyperparameters 'hyp'."""
+        self.imgsz = imgsz
+        self.hyp = hyp
+
+    def __call__(self, batch):
+        """Augments the float images in range 0-1 of 'batch' and their 'bboxes', 'cls' and 'batch_idx' in place."""
+        img, hyp, s = batch["img"], self.hyp, self.imgsz
+        n, device, fill = len(img), img.device, 114 / 255
+        boxes = xywh2xyxy(batch["bboxes"].to(device)) * s  # pixels
+        cls = batch["cls"].to(device).view(-1, 1)
+        idx = batch["batch_idx"].to(device).long()
+
+        # Mosaic, the image and 3 random images of the batch as 2x2 tiles around a random center of a 2s canvas
+        mosaic = torch.rand(n, device=device) < hyp.mosaic
+        tiles = torch.cat((torch.arange(n, device=device)[:, None], torch.randint(n, (n, 3), device=device)), 1)
+        size = torch.where(mosaic, 2 * s, s).float()  # canvas size
+        offset = torch.where(mosaic[:, None], (torch.rand(n, 2, device=device) * s + s / 2).int() - s, 0).float()
+        src, dst, tile = [torch.arange(len(idx), device=device)], [idx], [torch.zeros_like(idx)]
+        for t in 1, 2, 3:
+            i, j = ((idx[:, None] == tiles[:, t]) & mosaic).nonzero(as_tuple=True)  # boxes i of tile t of image j
+            src.append(i), dst.append(j), tile.append(torch.full_like(i, t))
+        src, dst, tile = torch.cat(src), torch.cat(dst), torch.cat(tile)
+        xy = torch.stack((tile % 2, tile // 2), 1) * s + offset[dst]  # canvas xy of the tiles
+        boxes = torch.minimum((boxes[src] + xy.repeat(1, 2)).clamp(min=0), size[dst, None])  # clip to canvas
+        i = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        boxes, cls, dst = boxes[i], cls[src[i]], dst[i]
+
+        # Random perspective, sampling the output images from the tiles
+        M, scale = self._perspective(size)
+        G = torch.eye(3, device=device).repeat(n, 1, 1)
+        G[:, :2, 2] = offset  # tiles to canvas
+        y, x = torch.meshgrid(torch.arange(s, device=device), torch.arange(s, device=device), indexing="ij")
+        xy = torch.stack((x, y, torch.ones_like(x)), -1).view(1, -1, 3).float() @ torch.linalg.inv(M @ G).mT
+        xy = xy[..., :2] / xy[..., 2:]  # tile xy of the output pixels
+        c = xy + offset[:, None]  # canvas xy
+        inside = ((c > -0.5) & (c < size[:, None, None] - 0.5)).all(-1).view(n, 1, s, s)
+        out = torch.zeros_like(img)
+        for t in range(4 if mosaic.any() else 1):  # zero-padded tiles sum to the bilinear samples of the 2x2 tiles
+            grid = ((2 * (xy - xy.new_tensor((t % 2, t // 2)) * s) + 1) / s - 1).view(n, s, s, 2)
+            im = F.grid_sample(
+                img[tiles[:, t]] - fill, grid, mode="bilinear", padding_mode="zeros", align_corners=False
+            )
+            out += im if t == 0 else im * mosaic.view(n, 1, 1, 1)
+        img = torch.where(inside, out + fill, fill)
+        xy = torch.cat((boxes[:, [0, 1, 2, 3, 0, 3, 2, 1]].view(-1, 4, 2), torch.ones_like(boxes).view(-1, 4, 1)), 2)
+        xy = xy @ M[dst].mT
+        xy = xy[..., :2] / xy[..., 2:]  # perspective rescale or affine
+        new = torch.cat((xy.min(1).values, xy.max(1).values), 1).clamp(0, s)
+        w1, h1 = (boxes[:, 2:] - boxes[:, :2]).T * scale[dst]
+        w2, h2 = (new[:, 2:] - new[:, :2]).T
+        ar = torch.maximum(w2 / (h2 + 1e-16), h2 / (w2 + 1e-16))  # box candidates as in RandomPerspective
+        i = (w2 > 2) & (h2 > 2) & (w2 * h2 / (w1 * h1 + 1e-16) > 0.1) & (ar < 100)
+        boxes, cls, dst = new[i], cls[i], dst[i]
+
+        # MixUp with a random image of the batch
+        if hyp.mixup:
+            mix, other = torch.rand(n, device=device) < hyp.mixup, torch.randint(n, (n,), device=device)
+            r = torch.distributions.Beta(32.0, 32.0).sample((n, 1, 1, 1)).to(device)  # mixup ratio, alpha=beta=32.0
+            img = torch.where(mix.view(n, 1, 1, 1), img * r + img[other] * (1 - r), img)
+            i, j = ((dst[:, None] == other) & mix).nonzero(as_tuple=True)
+            boxes, cls, dst = torch.cat((boxes, boxes[i])), torch.cat((cls, cls[i])), torch.cat((dst, j))
+
+        # HSV and flips
+        if hyp.hsv_h or hyp.hsv_s or hyp.hsv_v:
+            gains = torch.tensor((hyp.hsv_h, hyp.hsv_s, hyp.hsv_v), device=device)
+            img = self._hsv(img, (torch.rand(n, 3, device=device) * 2 - 1) * gains + 1)
+        for p, dim, j in (hyp.flipud, -2, [1, 3]), (hyp.fliplr, -1, [0, 2]):
+            if p:
+                flip = torch.rand(n, device=device) < p
+                img = torch.where(flip.view(n, 1, 1, 1), img.flip(dim), img)
+                flipped = boxes.clone()
+                flipped[:, j] = s - boxes[:, j[::-1]]
+                boxes = torch.where(flip[dst, None], flipped, boxes)
+
+        dst, i = dst.sort(stable=True)
+        batch["img"] = img
+        batch["bboxes"] = xyxy2xywh(boxes[i]) / s
+        batch["cls"] = cls[i]
+        batch["batch_idx"] = dst.float()
+        return batch
+
+    def _perspective(self, size):
+        """Returns random perspective matrices from canvases of 'size' to output images as in RandomPerspective."""
+        hyp, n, device = self.hyp, len(size), size.device
+
+        def uniform(x, *shape):
+            """Returns uniform random values in range -x to x."""
+            return (torch.rand(n, *shape, device=device) * 2 - 1) * x
+
+        C, P, R, S, T = torch.eye(3, device=device).repeat(5, n, 1, 1)
+        C[:, :2, 2] = -size[:, None] / 2  # center
+        P[:, 2, :2] = uniform(hyp.perspective, 2)  # perspective
+        a, scale = uniform(hyp.degrees) * math.pi / 180, 1 + uniform(hyp.scale)  # rotation and scale
+        R[:, 0, 0] = R[:, 1, 1] = scale * a.cos()
+        R[:, 0, 1], R[:, 1, 0] = scale * a.sin(), -scale * a.sin()
+        S[:, 0, 1], S[:, 1, 0] = (uniform(hyp.shear, 2) * math.pi / 180).tan().T  # shear
+        T[:, :2, 2] = (0.5 + uniform(hyp.translate, 2)) * self.imgsz  # translation
+        return T @ S @ R @ P @ C, scale
+
+    @staticmethod
+    def _hsv(img, gains):
+        """Multiplies hue, saturation and value of RGB images by random (n, 3) 'gains' as in RandomHSV."""
+        r, g, b = img.split(1, 1)
+        v, m = img.max(1, keepdim=True).values, img.min(1, keepdim=True).values
+        d = v - m
+        h = torch.where(v == r, (g - b) / d, torch.where(v == g, (b - r) / d + 2, (r - g) / d + 4))
+        h = torch.where(d > 0, h / 6 % 1, 0)
+        s = torch.where(v > 0, d / v, 0)
+        gains = gains.view(-1, 3, 1, 1)
+        h, s, v = h * gains[:, :1] % 1, (s * gains[:, 1:2]).clamp(0, 1), (v * gains[:, 2:]).clamp(0, 1)
+        k = (torch.tensor((5, 3, 1), device=img.device).view(1, 3, 1, 1) + h * 6) % 6
+        return v - v * s * torch.minimum(k, 4 - k).clamp(0, 1)
+
+
 # Classification augmentations -----------------------------------------------------------------------------------------
 def classify_transforms(
     size=224,
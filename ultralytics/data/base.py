@@ -14,8 +14,8 @@ import numpy as np
 import psutil
 from torch.utils.data import Dataset
 
-from ultralytics.utils import DEFAULT_CFG, LOCAL_RANK, LOGGER, NUM_THREADS, TQDM
-from .utils import HELP_URL, IMG_FORMATS
+from ultralytics.utils import DEFAULT_CFG, LOCAL_RANK, LOGGER, NUM_THREADS, TQDM, is_dir_writeable
+from .utils import HELP_URL, IMG_FORMATS, IMREAD_REDUCED, ColumnarLabels, get_hash
 
 
 class BaseDataset(Dataset):
@@ -25,7 +25,7 @@ class BaseDataset(Dataset):
     Args:
         img_path (str): Path to the folder containing images.
         imgsz (int, optional): Image size. Defaults to 640.
-        cache (bool, optional): Cache images to RAM or disk during training. Defaults to False.
+        cache (bool | str, optional): Cache images to RAM, disk or a shared memory-mapped file. Defaults to False.
         augment (bool, optional): If True, data augmentation is applied. Defaults to True.
         hyp (dict, optional): Hyperparameters to apply data augmentation. Defaults to None.
         prefix (str, optional): Prefix to print in log messages. Defaults to ''.
@@ -36,12 +36,14 @@ class BaseDataset(Dataset):
         single_cls (bool, optional): If True, single class training is used. Defaults to False.
         classes (list): List of included classes. Default is None.
         fraction (float): Fraction of dataset to utilize. Default is 1.0 (use all data).
+        shard (tuple, optional): Keep only shard i of n as (i, n), for sharded validation. Default is None.
 
     Attributes:
         im_files (list): List of image file paths.
-        labels (list): List of label data dictionaries.
+        labels (list | ColumnarLabels): List of label data dictionaries.
         ni (int): Number of images in the dataset.
         ims (list): List of loaded images.
+        ims_index (np.ndarray): Byte offset, resized and original height and width of images in the 'mmap' cache.
         npy_files (list): List of numpy file paths.
         transforms (callable): Image transformation function.
     """
@@ -61,6 +63,7 @@ class BaseDataset(Dataset):
         single_cls=False,
         classes=None,
         fraction=1.0,
+        shard=None,
     ):
         """Initialize BaseDataset with given configuration and options."""
         super().__init__()
@@ -81,16 +84,19 @@ class BaseDataset(Dataset):
         if self.rect:
             assert self.batch_size is not None
             self.set_rectangle()
+        if shard:
+            self.set_shard(*shard)
 
         # Buffer thread for mosaic images
         self.buffer = []  # buffer size = batch size
         self.max_buffer_length = min((self.ni, self.batch_size * 8, 1000)) if self.augment else 0
 
         # Cache images
+        self.npy_files = [Path(f).with_suffix(".npy") for f in self.im_files]
         if cache == "ram" and not self.check_cache_ram():
             cache = False
         self.ims, self.im_hw0, self.im_hw = [None] * self.ni, [None] * self.ni, [None] * self.ni
-        self.npy_files = [Path(f).with_suffix(".npy") for f in self.im_files]
+        self.ims_file, self.ims_index, self.ims_mmap = None, None, None  # packed 'mmap' cache
         if cache:
             self.cache_images(cache)
 
@@ -127,6 +133,8 @@ class BaseDataset(Dataset):
 
     def update_labels(self, include_class: Optional[list]):
         """Update labels to include only these classes (optional)."""
+        if isinstance(self.labels, ColumnarLabels):
+            return self.labels.update(include_class, self.single_cls)
         include_class_array = np.array(include_class).reshape(1, -1)
         for i in range(len(self.labels)):
             if include_class is not None:
@@ -146,27 +154,27 @@ class BaseDataset(Dataset):
 
     def load_image(self, i, rect_mode=True):
         """Loads 1 image from dataset index 'i', returns (im, resized hw)."""
-        im, f, fn = self.ims[i], self.im_files[i], self.npy_files[i]
+        im = self.ims[i]
+        if im is None and self.ims_index is not None:  # packed 'mmap' cache of resized images
+            if self.ims_mmap is None:  # opened lazily, once per worker process
+                self.ims_mmap = np.memmap(self.ims_file, np.uint8, "r")
+            o, h, w, h0, w0 = self.ims_index[i]
+            im = np.array(self.ims_mmap[o : o + h * w * 3]).reshape(h, w, 3)  # copy from the shared page cache
+            if self.augment:  # recent images for mosaic
+                self.buffer.append(i)
+                if len(self.buffer) >= self.max_buffer_length:
+                    self.buffer.pop(0)
+            return im, (h0, w0), (h, w)
         if im is None:  # not cached in RAM
-            if fn.exists():  # load npy
-                try:
-                    im = np.load(fn)
-                except Exception as e:
-                    LOGGER.warning(f"{self.prefix}WARNING ⚠️ Removing corrupt *.npy image file {fn} due to: {e}")
-                    Path(fn).unlink(missing_ok=True)
-                    im = cv2.imread(f)  # BGR
-            else:  # read image
-                im = cv2.imread(f)  # BGR
-            if im is None:
-                raise FileNotFoundError(f"Image Not Found {f}")
-
-            h0, w0 = im.shape[:2]  # orig hw
+            scale, hw0 = self.decode_scale(i, rect_mode)
+            im = self.read_image(i, scale)
+            h0, w0 = hw0 if scale > 1 else im.shape[:2]  # orig hw
             if rect_mode:  # resize long side to imgsz while maintaining aspect ratio
                 r = self.imgsz / max(h0, w0)  # ratio
                 if r != 1:  # if sizes are not equal
                     w, h = (min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz))
                     im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
-            elif not (h0 == w0 == self.imgsz):  # resize by stretching image to square imgsz
+            elif im.shape[:2] != (self.imgsz, self.imgsz):  # resize by stretching image to square imgsz
                 im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
 
             # Add to buffer if training with augmentations
@@ -181,8 +189,44 @@ class BaseDataset(Dataset):
 
         return self.ims[i], self.im_hw0[i], self.im_hw[i]
 
+    def decode_scale(self, i, rect_mode=True):
+        """
+        Returns the largest JPEG decode downscale 1, 2, 4 or 8 of image 'i' that still decodes to at least its resized
+        shape, and the original shape of the image from its labels.
+
+        JPEGs are downscaled in the DCT domain while decoding, which skips most of the decoding work for large images.
+        """
+        labels = self.labels
+        hw0 = labels.hw[labels.order[i]] if isinstance(labels, ColumnarLabels) else labels[i].get("shape")
+        if hw0 is None or Path(self.im_files[i]).suffix.lower() not in {".jpg", ".jpeg"}:
+            return 1, hw0
+        h0, w0 = (int(x) for x in hw0)
+        if rect_mode:
+            r = min(self.imgsz / max(h0, w0), 1)
+            h, w = min(math.ceil(h0 * r), self.imgsz), min(math.ceil(w0 * r), self.imgsz)
+        else:
+            h = w = self.imgsz
+        scale = next(s for s in (8, 4, 2, 1) if math.ceil(h0 / s) >= h and math.ceil(w0 / s) >= w)
+        return scale, (h0, w0)
+
+    def read_image(self, i, scale=1):
+        """Reads image 'i' as a BGR array, from its *.npy file if cached to disk, JPEGs downscaled by 'scale'."""
+        f, fn = self.im_files[i], self.npy_files[i]
+        if fn.exists():  # load npy
+            try:
+                return np.load(fn)
+            except Exception as e:
+                LOGGER.warning(f"{self.prefix}WARNING ⚠️ Removing corrupt *.npy image file {fn} due to: {e}")
+                Path(fn).unlink(missing_ok=True)
+        im = cv2.imread(f, IMREAD_REDUCED.get(scale, cv2.IMREAD_COLOR))  # BGR
+        if im is None:
+            raise FileNotFoundError(f"Image Not Found {f}")
+        return im
+
     def cache_images(self, cache):
-        """Cache images to memory or disk."""
+        """Cache images to memory, disk or a packed memory-mapped file."""
+        if cache == "mmap":
+            return self.cache_images_to_mmap()
         b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
         fcn = self.cache_images_to_disk if cache == "disk" else self.load_image
         with ThreadPool(NUM_THREADS) as pool:
@@ -203,12 +247,54 @@ class BaseDataset(Dataset):
         if not f.exists():
             np.save(f.as_posix(), cv2.imread(self.im_files[i]), allow_pickle=False)
 
+    def cache_images_to_mmap(self):
+        """
+        Packs the resized images into one memory-mapped file with a byte offset and shape index.
+
+        All DataLoader workers and DDP ranks read the file through the shared OS page cache, instead of copy-on-write
+        copies of cached arrays per process. The file is reused until the image files or sizes change.
+        """
+        p = Path(self.im_files[0]).parent
+        self.ims_file = p.parent / f"{p.name}.{self.imgsz}.ims"
+        index_file = self.ims_file.with_suffix(".ims.index")
+        h = get_hash(self.im_files + [type(self).__name__])  # resized by the load_image() of the dataset class
+        try:
+            x = np.load(index_file, allow_pickle=True).item()
+            assert x["hash"] == h and x["bytes"] == self.ims_file.stat().st_size
+            self.ims_index = x["index"]
+            LOGGER.info(f"{self.prefix}Caching images from {self.ims_file} ✅")
+            return
+        except (FileNotFoundError, AssertionError, AttributeError, KeyError, ValueError):
+            pass
+        if not is_dir_writeable(p.parent):
+            LOGGER.warning(f"{self.prefix}WARNING ⚠️ Cache directory {p.parent} is not writeable, images not cached.")
+            return
+
+        b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
+        index = np.zeros((self.ni, 5), dtype=np.int64)  # offset, h, w, h0, w0
+        tmp = self.ims_file.with_suffix(".ims.tmp")
+        with ThreadPool(NUM_THREADS) as pool, open(tmp, "wb") as f:
+            pbar = TQDM(enumerate(pool.imap(self.load_image, range(self.ni))), total=self.ni, disable=LOCAL_RANK > 0)
+            for i, (im, hw0, hw) in pbar:
+                index[i] = b, *hw, *hw0
+                f.write(np.ascontiguousarray(im).data)
+                b += im.nbytes
+                pbar.desc = f"{self.prefix}Caching images ({b / gb:.1f}GB mmap)"
+            pbar.close()
+        self.ims, self.im_hw0, self.im_hw = [None] * self.ni, [None] * self.ni, [None] * self.ni  # free load buffer
+        tmp.replace(self.ims_file)
+        np.save(index_file.with_suffix(".tmp.npy"), {"hash": h, "bytes": b, "index": index})
+        index_file.with_suffix(".tmp.npy").replace(index_file)
+        self.ims_index = index
+        LOGGER.info(f"{self.prefix}New cache created: {self.ims_file}")
+
     def check_cache_ram(self, safety_margin=0.5):
         """Check image caching requirements vs available memory."""
         b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
         n = min(self.ni, 30)  # extrapolate from 30 random images
         for _ in range(n):
-            im = cv2.imread(random.choice(self.im_files))  # sample image
+            j = random.randrange(self.ni)
+            im = self.read_image(j, self.decode_scale(j)[0])  # sample image
             ratio = self.imgsz / max(im.shape[0], im.shape[1])  # max(h, w)  # ratio
             b += im.nbytes * ratio**2
         mem_required = b * self.ni / n * (1 + safety_margin)  # GB required to cache dataset into RAM
@@ -228,11 +314,12 @@ class BaseDataset(Dataset):
         bi = np.floor(np.arange(self.ni) / self.batch_size).astype(int)  # batch index
         nb = bi[-1] + 1  # number of batches
 
-        s = np.array([x.pop("shape") for x in self.labels])  # hw
+        columnar = isinstance(self.labels, ColumnarLabels)
+        s = self.labels.shapes if columnar else np.array([x.pop("shape") for x in self.labels])  # hw
         ar = s[:, 0] / s[:, 1]  # aspect ratio
         irect = ar.argsort()
         self.im_files = [self.im_files[i] for i in irect]
-        self.labels = [self.labels[i] for i in irect]
+        self.labels = self.labels[irect] if columnar else [self.labels[i] for i in irect]
         ar = ar[irect]
 
         # Set training image shapes
@@ -248,6 +335,21 @@ class BaseDataset(Dataset):
         self.batch_shapes = np.ceil(np.array(shapes) * self.imgsz / self.stride + self.pad).astype(int) * self.stride
         self.batch = bi  # batch index of image
 
+    def set_shard(self, i, n):
+        """Keeps shard i of n contiguous shards split at batch boundaries, so shards batch like the full dataset."""
+        nb = math.ceil(self.ni / self.batch_size)  # number of batches
+        b0, b1 = nb * i // n, nb * (i + 1) // n  # batch range of the shard
+        assert b0 < b1, f"{self.prefix}shard {i} of {n} is empty, {nb} batches allow at most {nb} shards"
+        a, b = b0 * self.batch_size, b1 * self.batch_size
+        self.im_files, self.labels = self.im_files[a:b], self.labels[a:b]
+        if self.rect:
+            self.batch_shapes, self.batch = self.batch_shapes[b0:b1], self.batch[a:b] - b0
+        self.ni = len(self.labels)
+
+    def __getstate__(self):
+        """Drops the memory map of the 'mmap' cache from pickles, e.g. for spawned workers, which reopen the file."""
+        return {**self.__dict__, "ims_mmap": None}
+
     def __getitem__(self, index):
         """Returns transformed label information for given index."""
         return self.transforms(self.get_image_and_label(index))
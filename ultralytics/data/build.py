@@ -1,7 +1,9 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
+import math
 import os
 import random
+import shutil
 from pathlib import Path
 
 import numpy as np
@@ -20,9 +22,9 @@ from ultralytics.data.loaders import (
     autocast_list,
 )
 from ultralytics.data.utils import IMG_FORMATS, VID_FORMATS
-from ultralytics.utils import RANK, colorstr
+from ultralytics.utils import LOGGER, RANK, colorstr
 from ultralytics.utils.checks import check_file
-from .dataset import YOLODataset
+from .dataset import SHARDS_INDEX, YOLODataset, YOLOShardDataset, YOLOStreamDataset
 from .utils import PIN_MEMORY
 
 
@@ -40,13 +42,16 @@ class InfiniteDataLoader(dataloader.DataLoader):
         self.iterator = super().__iter__()
 
     def __len__(self):
-        """Returns the length of the batch sampler's sampler."""
+        """Returns the length of the batch sampler's sampler, or the number of batches per epoch of a DDP rank."""
+        if isinstance(self.dataset, dataloader.IterableDataset):  # streams split their samples across DDP ranks
+            return math.ceil(len(self.dataset) / getattr(self.dataset, "world", 1) / self.batch_size)
         return len(self.batch_sampler.sampler)
 
     def __iter__(self):
         """Creates a sampler that repeats indefinitely."""
+        shared = self.collate_fn if isinstance(self.collate_fn, SharedBatches) else None
         for _ in range(len(self)):
-            yield next(self.iterator)
+            yield shared.wrap(next(self.iterator)) if shared else next(self.iterator)
 
     def reset(self):
         """
@@ -75,6 +80,73 @@ class _RepeatSampler:
             yield from iter(self.sampler)
 
 
+class SharedBatches:
+    """
+    Collate function that collates batches in dataloader workers into a ring of shared-memory image buffers.
+
+    Workers stack the images of a batch directly into the next slot of their own ring and return the slot with the
+    labels as numpy arrays, instead of a batch tensor that is copied into a new shared-memory segment for the worker
+    queue. The main process wraps the slot as the image tensor of the batch without copying, see wrap(). Every worker
+    has 'prefetch_factor' + 2 slots, so a slot is only rewritten two batches of the same worker after the main process
+    received it. With pin_memory() the ring is page-locked in place for asynchronous copies to CUDA devices.
+
+    Attributes:
+        collate_fn (callable): Collate function of the dataset.
+        buffers (torch.Tensor): Shared uint8 image buffers of shape (workers, slots, numel).
+        count (int): Number of batches collated into the ring by this worker.
+        pinned (int | None): ID of the process that page-locked the buffers.
+    """
+
+    def __init__(self, collate_fn, workers, slots, numel):
+        """Initializes the ring of 'slots' image buffers of 'numel' bytes for each of 'workers' workers."""
+        self.collate_fn = collate_fn
+        self.buffers = torch.empty((workers, slots, numel), dtype=torch.uint8).share_memory_()
+        self.count = 0
+        self.pinned = None
+
+    def __call__(self, batch):
+        """Collates the samples of 'batch', writing their uint8 images to the next slot of the worker's ring."""
+        info = dataloader.get_worker_info()
+        imgs = [x.pop("img") for x in batch]
+        batch = self.collate_fn(batch)
+        shape, numel = (len(imgs), *imgs[0].shape), len(imgs) * imgs[0].numel()
+        if info is None or numel > self.buffers.shape[2] or any(x.shape != imgs[0].shape for x in imgs):
+            batch["img"] = torch.stack(imgs, 0)
+            return batch
+        slot = self.count % self.buffers.shape[1]
+        self.count += 1
+        torch.stack(imgs, 0, out=self.buffers[info.id, slot, :numel].view(shape))
+        tensors = [k for k, v in batch.items() if isinstance(v, torch.Tensor)]  # labels, sent as bytes without shm
+        batch.update({k: batch[k].numpy() for k in tensors})
+        batch["img"] = info.id, slot, shape, tensors
+        return batch
+
+    def wrap(self, batch):
+        """Returns a batch received from a worker with its images wrapped from their slot and its labels as tensors."""
+        if isinstance(batch["img"], tuple):
+            worker, slot, shape, tensors = batch["img"]
+            batch.update({k: torch.from_numpy(batch[k]) for k in tensors})
+            batch["img"] = self.buffers[worker, slot, : math.prod(shape)].view(shape)
+        return batch
+
+    def pin_memory(self):
+        """Page-locks the ring in place for asynchronous copies to CUDA devices, returns True on success."""
+        if torch.cuda.is_available() and self.pinned is None:
+            cudart = torch.cuda.cudart()
+            if cudart.cudaHostRegister(self.buffers.data_ptr(), self.buffers.numel(), 0) == 0:
+                self.pinned = os.getpid()
+        return self.pinned is not None
+
+    def __getstate__(self):
+        """Returns the state for workers, whose copies of the ring are not page-locked."""
+        return {**self.__dict__, "pinned": None}
+
+    def __del__(self):
+        """Unlocks the ring in the process that page-locked it."""
+        if self.pinned == os.getpid():
+            torch.cuda.cudart().cudaHostUnregister(self.buffers.data_ptr())
+
+
 def seed_worker(worker_id):  # noqa
     """Set dataloader worker seed https://pytorch.org/docs/stable/notes/randomness.html#dataloader."""
     worker_seed = torch.initial_seed() % 2**32
@@ -83,8 +155,11 @@ def seed_worker(worker_id):  # noqa
 
 
 def build_yolo_dataset(cfg, img_path, batch, data, mode="train", rect=False, stride=32):
-    """Build YOLO Dataset."""
-    return YOLODataset(
+    """Build YOLO Dataset, streamed from the shards of convert_to_shards() for training if 'img_path' holds them."""
+    dataset = YOLODataset
+    if isinstance(img_path, (str, Path)) and (Path(img_path) / SHARDS_INDEX).is_file():
+        dataset = YOLOStreamDataset if mode == "train" and not (cfg.rect or rect) else YOLOShardDataset
+    return dataset(
         img_path=img_path,
         imgsz=cfg.imgsz,
         batch_size=batch,
@@ -100,25 +175,44 @@ def build_yolo_dataset(cfg, img_path, batch, data, mode="train", rect=False, str
         classes=cfg.classes,
         data=data,
         fraction=cfg.fraction if mode == "train" else 1.0,
+        shard=(cfg.shard, cfg.shards) if mode == "val" and cfg.shard is not None else None,
     )
 
 
-def build_dataloader(dataset, batch, workers, shuffle=True, rank=-1):
-    """Return an InfiniteDataLoader or DataLoader for training or validation set."""
+def build_dataloader(dataset, batch, workers, shuffle=True, rank=-1, shared=False):
+    """
+    Return an InfiniteDataLoader or DataLoader for training or validation set.
+
+    With 'shared', workers collate the images of YOLO datasets into a ring of shared-memory buffers, see SharedBatches.
+    """
     batch = min(batch, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
     nw = min([os.cpu_count() // max(nd, 1), workers])  # number of workers
-    sampler = None if rank == -1 else distributed.DistributedSampler(dataset, shuffle=shuffle)
+    stream = isinstance(dataset, dataloader.IterableDataset)  # shuffles and splits its samples itself
+    sampler = None if rank == -1 or stream else distributed.DistributedSampler(dataset, shuffle=shuffle)
     generator = torch.Generator()
     generator.manual_seed(6148914691236517205 + RANK)
+    collate_fn, pin_memory = getattr(dataset, "collate_fn", None), PIN_MEMORY
+    if shared and nw and hasattr(dataset, "imgsz"):
+        h, w = dataset.batch_shapes.max(0) if dataset.rect else (dataset.imgsz, dataset.imgsz)
+        numel, slots = batch * 3 * int(h) * int(w), 4  # DataLoader prefetch_factor 2 + 2 slots per worker
+        free = shutil.disk_usage("/dev/shm").free if os.path.isdir("/dev/shm") else float("inf")
+        if nw * slots * numel < free:
+            collate_fn = SharedBatches(collate_fn, nw, slots, numel)
+            pin_memory = pin_memory and not collate_fn.pin_memory()  # page-locked ring, no pin_memory copies
+        else:
+            LOGGER.warning(
+                f"WARNING ⚠️ 'shared_batches' needs {nw * slots * numel / 2**30:.1f}GB of /dev/shm with "
+                f"{free / 2**30:.1f}GB free, sending batches through worker queues instead"
+            )
     return InfiniteDataLoader(
         dataset=dataset,
         batch_size=batch,
-        shuffle=shuffle and sampler is None,
+        shuffle=shuffle and sampler is None and not stream,
         num_workers=nw,
         sampler=sampler,
-        pin_memory=PIN_MEMORY,
-        collate_fn=getattr(dataset, "collate_fn", None),
+        pin_memory=pin_memory,
+        collate_fn=collate_fn,
         worker_init_fn=seed_worker,
         generator=generator,
     )
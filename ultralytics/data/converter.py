@@ -1,13 +1,17 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
+import io
 import json
+import os
+import tarfile
 from collections import defaultdict
+from multiprocessing.pool import ThreadPool
 from pathlib import Path
 
 import cv2
 import numpy as np
 
-from ultralytics.utils import LOGGER, TQDM
+from ultralytics.utils import LOGGER, NUM_THREADS, TQDM, yaml_save
 from ultralytics.utils.files import increment_path
 
 
@@ -509,13 +513,14 @@ def yolo_bbox2segment(im_dir, save_dir=None, sam_model="sam_b.pt"):
 
     # NOTE: add placeholder to pass class index check
     dataset = YOLODataset(im_dir, data=dict(names=list(range(1000))))
-    if len(dataset.labels[0]["segments"]) > 0:  # if it's segment data
+    labels = list(dataset.labels)  # label dicts to add segments to
+    if len(labels[0]["segments"]) > 0:  # if it's segment data
         LOGGER.info("Segmentation labels detected, no need to generate new ones!")
         return
 
     LOGGER.info("Detection labels detected, generating segment labels by SAM model!")
     sam_model = SAM(sam_model)
-    for l in tqdm(dataset.labels, total=len(dataset.labels), desc="Generating segment labels"):
+    for l in tqdm(labels, total=len(labels), desc="Generating segment labels"):
         h, w = l["shape"]
         boxes = l["bboxes"]
         if len(boxes) == 0:  # skip empty labels
@@ -528,7 +533,7 @@ def yolo_bbox2segment(im_dir, save_dir=None, sam_model="sam_b.pt"):
 
     save_dir = Path(save_dir) if save_dir else Path(im_dir).parent / "labels-segment"
     save_dir.mkdir(parents=True, exist_ok=True)
-    for l in dataset.labels:
+    for l in labels:
         texts = []
         lb_name = Path(l["im_file"]).with_suffix(".txt").name
         txt_file = save_dir / lb_name
@@ -540,3 +545,83 @@ def yolo_bbox2segment(im_dir, save_dir=None, sam_model="sam_b.pt"):
             with open(txt_file, "a") as f:
                 f.writelines(text + "\n" for text in texts)
     LOGGER.info(f"Generated segment labels saved in {save_dir}")
+
+
+def convert_to_shards(data, save_dir=None, shard_size=1 << 30):
+    """
+    Packs the images and labels of a YOLO dataset into large tar shards with an index, for training from network
+    storage with sequential reads instead of random reads of small image files.
+
+    Args:
+        data (str): Path to the dataset YAML file of the dataset to convert.
+        save_dir (str | Path, optional): Directory to save the shards to. Default is the dataset directory + '-shards'.
+        shard_size (int, optional): Size of the shards in bytes. Default is 1GB.
+
+    Returns:
+        (Path): Path to the dataset YAML file of the shards, to train with as 'data'.
+
+    Example:
+        ```python
+        from ultralytics.data.converter import convert_to_shards
+
+        data = convert_to_shards('coco8.yaml')
+        ```
+
+    Output:
+        Every split of the dataset is saved to a directory of tar shards, which extract to the images and labels of
+        the split, and an index with the shard, byte offset and size of every image and the verified labels:
+
+            - save_dir
+                ├─ data.yaml
+                ├─ train
+                │   ├─ shard-000000.tar
+                │   ├─ ..
+                │   └─ index.cache
+                └─ val
+    """
+    from ultralytics.data.dataset import SHARDS_INDEX, YOLODataset, save_dataset_cache_file
+    from ultralytics.data.utils import ColumnarLabels, check_det_dataset, img2label_paths
+
+    data = check_det_dataset(data)
+    save_dir = Path(save_dir or f"{data['path']}-shards")
+    task = "pose" if "kpt_shape" in data else "detect"  # segments are kept with 'detect' labels
+    splits = [k for k in ("train", "val", "test") if data.get(k)]
+    for split in splits:
+        dataset = YOLODataset(data[split], augment=False, data=data, task=task, prefix=f"{split}: ")
+        labels = ColumnarLabels.from_labels(list(dataset.labels))  # in memory, pickled with the index
+        root = os.path.commonpath([os.path.dirname(f) for f in labels.files])
+        names = [os.path.relpath(f, root) for f in labels.files]
+        locations = np.zeros((len(names), 3), dtype=np.int64)  # shard, byte offset and size of images
+        (save_dir / split).mkdir(parents=True, exist_ok=True)
+        shards, tar = [], None
+
+        def read(i):
+            """Returns the bytes of image 'i' and of its label file, None if missing."""
+            lb = img2label_paths([labels.files[i]])[0]
+            return Path(labels.files[i]).read_bytes(), Path(lb).read_bytes() if os.path.isfile(lb) else None
+
+        with ThreadPool(NUM_THREADS) as pool:
+            pbar = TQDM(pool.imap(read, range(len(names))), total=len(names), desc=f"Packing {split} shards")
+            for i, (im, lb) in enumerate(pbar):
+                if tar is None or tar.offset >= shard_size:
+                    if tar:
+                        tar.close()
+                    shards.append(f"shard-{len(shards):06d}.tar")
+                    tar = tarfile.open(save_dir / split / shards[-1], "w", format=tarfile.GNU_FORMAT)
+                for name, b in ((f"images/{names[i]}", im), (f"labels/{Path(names[i]).with_suffix('.txt')}", lb)):
+                    if b is not None:
+                        info = tarfile.TarInfo(name)
+                        info.size = len(b)
+                        tar.addfile(info, io.BytesIO(b))
+                        if name.startswith("images/"):
+                            locations[i] = len(shards) - 1, tar.offset - (len(b) + 511) // 512 * 512, len(b)
+            if tar:
+                tar.close()
+        labels.files = [f"images/{x}" for x in names]  # relative to the shards directory
+        x = {"shards": shards, "locations": locations, "labels": labels}
+        save_dataset_cache_file(f"{split}: ", save_dir / split / SHARDS_INDEX, x)
+
+    yaml = {k: v for k, v in data.items() if k not in ("path", "yaml_file", "download", *splits)}
+    yaml_save(save_dir / "data.yaml", {"path": str(save_dir.resolve()), **{k: k for k in splits}, **yaml})
+    LOGGER.info(f"Shards saved to {save_dir}, train with data='{save_dir / 'data.yaml'}'")
+    return save_dir / "data.yaml"
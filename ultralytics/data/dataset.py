@@ -1,5 +1,6 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 import contextlib
+import random
 from itertools import repeat
 from multiprocessing.pool import ThreadPool
 from pathlib import Path
@@ -7,17 +8,39 @@ from pathlib import Path
 import cv2
 import numpy as np
 import torch
+import torch.distributed as dist
 import torchvision
 from PIL import Image
+from torch.utils.data import IterableDataset, get_worker_info
 
 from ultralytics.utils import LOCAL_RANK, NUM_THREADS, TQDM, colorstr, is_dir_writeable
 from ultralytics.utils.ops import resample_segments
-from .augment import Compose, Format, Instances, LetterBox, classify_augmentations, classify_transforms, v8_transforms
+from .augment import (
+    BatchAugment,
+    Compose,
+    Format,
+    Instances,
+    LetterBox,
+    classify_augmentations,
+    classify_transforms,
+    v8_transforms,
+)
 from .base import BaseDataset
-from .utils import HELP_URL, LOGGER, get_hash, img2label_paths, verify_image, verify_image_label
+from .utils import (
+    HELP_URL,
+    IMREAD_REDUCED,
+    LOGGER,
+    ColumnarLabels,
+    get_file_stats,
+    get_hash,
+    img2label_paths,
+    verify_image,
+    verify_image_label,
+)
 
 # Ultralytics dataset *.cache version, >= 1.0.0 for YOLOv8
-DATASET_CACHE_VERSION = "1.0.3"
+DATASET_CACHE_VERSION = "1.2.0"
+SHARDS_INDEX = "index.cache"  # index of the tar shards of convert_to_shards()
 
 
 class YOLODataset(BaseDataset):
@@ -41,32 +64,57 @@ class YOLODataset(BaseDataset):
         assert not (self.use_segments and self.use_keypoints), "Can not use both segments and keypoints."
         super().__init__(*args, **kwargs)
 
-    def cache_labels(self, path=Path("./labels.cache")):
+    def cache_labels(self, path=Path("./labels.cache"), cache=None):
         """
         Cache dataset labels, check images and read shapes.
 
+        The labels are stored as ColumnarLabels, whose float columns are memory-mapped from a *.cache.labels file next
+        to the cache file. Images whose image and label file fingerprints (size, mtime) match those of a previous
+        'cache' are not verified again, their labels and results are reused from it.
+
         Args:
             path (Path): Path where to save the cache file. Default is Path('./labels.cache').
+            cache (dict, optional): Previous cache of the dataset to reuse unchanged images from. Default is None.
 
         Returns:
             (dict): labels.
         """
-        x = {"labels": []}
-        nm, nf, ne, nc, msgs = 0, 0, 0, 0, []  # number missing, found, empty, corrupt, messages
-        desc = f"{self.prefix}Scanning {path.parent / path.stem}..."
-        total = len(self.im_files)
+        x = {"labels": {}, "msgs": {}}
+        n = len(self.im_files)
         nkpt, ndim = self.data.get("kpt_shape", (0, 0))
         if self.use_keypoints and (nkpt <= 0 or ndim not in (2, 3)):
             raise ValueError(
                 "'kpt_shape' in data.yaml missing or incorrect. Should be a list with [number of "
                 "keypoints, number of dims (2 for x,y or 3 for x,y,visible)], i.e. 'kpt_shape: [17, 3]'"
             )
+        stats = np.concatenate((get_file_stats(self.im_files), get_file_stats(self.label_files)), 1)  # (n, 4)
+        counts = np.zeros((n, 4), dtype=np.int64)  # number missing, found, empty, corrupt per image
+        reuse = np.zeros(n, dtype=bool)
+        if cache:  # reuse unchanged images
+            files = {f: i for i, f in enumerate(cache["files"])}
+            j = np.array([files.get(f, -1) for f in self.im_files], dtype=np.int64)
+            reuse = j >= 0
+            reuse[reuse] = (cache["stats"][j[reuse]] == stats[reuse]).all(1)
+            counts[reuse] = cache["counts"][j[reuse]]
+            labels = {f: i for i, f in enumerate(cache["labels"].files)}
+            for i in np.flatnonzero(reuse):
+                f = self.im_files[i]
+                if f in labels:
+                    x["labels"][i] = cache["labels"][labels[f]]
+                if f in cache["msgs"]:
+                    x["msgs"][f] = cache["msgs"][f]
+            cache.clear()  # release the memory-mapped labels before replacing their file
+        verify = np.flatnonzero(~reuse)
+        nm, nf, ne, nc = counts.sum(0)
+        desc = f"{self.prefix}Scanning {path.parent / path.stem}..."
+        if reuse.any():
+            desc = f"{self.prefix}Scanning {len(verify)} new or modified images in {path.parent / path.stem}..."
         with ThreadPool(NUM_THREADS) as pool:
             results = pool.imap(
                 func=verify_image_label,
                 iterable=zip(
-                    self.im_files,
-                    self.label_files,
+                    (self.im_files[i] for i in verify),
+                    (self.label_files[i] for i in verify),
                     repeat(self.prefix),
                     repeat(self.use_keypoints),
                     repeat(len(self.data["names"])),
@@ -74,37 +122,42 @@ class YOLODataset(BaseDataset):
                     repeat(ndim),
                 ),
             )
-            pbar = TQDM(results, desc=desc, total=total)
-            for im_file, lb, shape, segments, keypoint, nm_f, nf_f, ne_f, nc_f, msg in pbar:
+            pbar = TQDM(zip(verify, results), desc=desc, total=len(verify))
+            for i, (im_file, lb, shape, segments, keypoint, nm_f, nf_f, ne_f, nc_f, msg) in pbar:
                 nm += nm_f
                 nf += nf_f
                 ne += ne_f
                 nc += nc_f
+                counts[i] = nm_f, nf_f, ne_f, nc_f
                 if im_file:
-                    x["labels"].append(
-                        dict(
-                            im_file=im_file,
-                            shape=shape,
-                            cls=lb[:, 0:1],  # n, 1
-                            bboxes=lb[:, 1:],  # n, 4
-                            segments=segments,
-                            keypoints=keypoint,
-                            normalized=True,
-                            bbox_format="xywh",
-                        )
+                    x["labels"][i] = dict(
+                        im_file=im_file,
+                        shape=shape,
+                        cls=lb[:, 0:1],  # n, 1
+                        bboxes=lb[:, 1:],  # n, 4
+                        segments=segments,
+                        keypoints=keypoint,
+                        normalized=True,
+                        bbox_format="xywh",
                     )
                 if msg:
-                    msgs.append(msg)
+                    x["msgs"][self.im_files[i]] = msg
                 pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
             pbar.close()
+        stats[verify] = np.concatenate(
+            (get_file_stats(self.im_files[i] for i in verify), get_file_stats(self.label_files[i] for i in verify)), 1
+        )  # after verification, which may restore corrupt JPEGs
 
+        msgs = [x["msgs"][f] for f in self.im_files if f in x["msgs"]]
         if msgs:
             LOGGER.info("\n".join(msgs))
         if nf == 0:
             LOGGER.warning(f"{self.prefix}WARNING ⚠️ No labels found in {path}. {HELP_URL}")
-        x["hash"] = get_hash(self.label_files + self.im_files)
-        x["results"] = nf, nm, ne, nc, len(self.im_files)
-        x["msgs"] = msgs  # warnings
+        x["labels"] = ColumnarLabels.from_labels([x["labels"][i] for i in sorted(x["labels"])])
+        if is_dir_writeable(path.parent):
+            x["labels"].save(path.with_suffix(".cache.labels"))
+        x["files"], x["stats"], x["counts"] = list(self.im_files), stats, counts
+        x["results"] = nf, nm, ne, nc, n
         save_dataset_cache_file(self.prefix, path, x)
         return x
 
@@ -113,11 +166,14 @@ class YOLODataset(BaseDataset):
         self.label_files = img2label_paths(self.im_files)
         cache_path = Path(self.label_files[0]).parent.with_suffix(".cache")
         try:
-            cache, exists = load_dataset_cache_file(cache_path), True  # attempt to load a *.cache file
+            cache = load_dataset_cache_file(cache_path)  # attempt to load a *.cache file
             assert cache["version"] == DATASET_CACHE_VERSION  # matches current version
-            assert cache["hash"] == get_hash(self.label_files + self.im_files)  # identical hash
         except (FileNotFoundError, AssertionError, AttributeError):
-            cache, exists = self.cache_labels(cache_path), False  # run cache ops
+            cache = None
+        stats = np.concatenate((get_file_stats(self.im_files), get_file_stats(self.label_files)), 1)
+        exists = cache is not None and cache["files"] == self.im_files and np.array_equal(cache["stats"], stats)
+        if not exists:
+            cache = self.cache_labels(cache_path, cache)  # verify only new or modified images
 
         # Display cache
         nf, nm, ne, nc, n = cache.pop("results")  # found, missing, empty, corrupt, total
@@ -125,36 +181,45 @@ class YOLODataset(BaseDataset):
             d = f"Scanning {cache_path}... {nf} images, {nm + ne} backgrounds, {nc} corrupt"
             TQDM(None, desc=self.prefix + d, total=n, initial=n)  # display results
             if cache["msgs"]:
-                LOGGER.info("\n".join(cache["msgs"]))  # display warnings
+                LOGGER.info("\n".join(cache["msgs"].values()))  # display warnings
 
         # Read cache
-        [cache.pop(k) for k in ("hash", "version", "msgs")]  # remove items
+        [cache.pop(k) for k in ("files", "stats", "counts", "version", "msgs")]  # remove items
         labels = cache["labels"]
         if not labels:
             LOGGER.warning(f"WARNING ⚠️ No images found in {cache_path}, training may not work correctly. {HELP_URL}")
-        self.im_files = [lb["im_file"] for lb in labels]  # update im_files
+        self.im_files = labels.im_files  # update im_files
 
         # Check if the dataset is all boxes or all segments
-        lengths = ((len(lb["cls"]), len(lb["bboxes"]), len(lb["segments"])) for lb in labels)
-        len_cls, len_boxes, len_segments = (sum(x) for x in zip(*lengths))
+        len_cls, len_boxes = len(labels.cls), len(labels.bboxes)
+        len_segments = int(np.count_nonzero(np.diff(labels.point_offsets)))  # instances with a segment
         if len_segments and len_boxes != len_segments:
             LOGGER.warning(
                 f"WARNING ⚠️ Box and segment counts should be equal, but got len(segments) = {len_segments}, "
                 f"len(boxes) = {len_boxes}. To resolve this only boxes will be used and all segments will be removed. "
                 "To avoid this please supply either a detect or segment dataset, not a detect-segment mixed dataset."
             )
-            for lb in labels:
-                lb["segments"] = []
+            labels.drop_segments()
         if len_cls == 0:
             LOGGER.warning(f"WARNING ⚠️ No labels found in {cache_path}, training may not work correctly. {HELP_URL}")
         return labels
 
     def build_transforms(self, hyp=None):
         """Builds and appends transforms to the list."""
+        self.batch_augment = None
         if self.augment:
             hyp.mosaic = hyp.mosaic if self.augment and not self.rect else 0.0
             hyp.mixup = hyp.mixup if self.augment and not self.rect else 0.0
-            transforms = v8_transforms(self, self.imgsz, hyp)
+            if hyp.gpu_augment and (self.rect or self.use_segments or self.use_keypoints or self.use_obb):
+                LOGGER.warning(
+                    "WARNING ⚠️ 'gpu_augment' supports detection without 'rect' only, setting 'gpu_augment=False'"
+                )
+                hyp.gpu_augment = False
+            if hyp.gpu_augment:  # workers only letterbox, the trainer augments batches on device
+                transforms = Compose([LetterBox(new_shape=(self.imgsz, self.imgsz))])
+                self.batch_augment = BatchAugment(self.imgsz, hyp)
+            else:
+                transforms = v8_transforms(self, self.imgsz, hyp)
         else:
             transforms = Compose([LetterBox(new_shape=(self.imgsz, self.imgsz), scaleup=False)])
         transforms.append(
@@ -224,6 +289,146 @@ class YOLODataset(BaseDataset):
         return new_batch
 
 
+class YOLOShardDataset(YOLODataset):
+    """
+    YOLO dataset read from the tar shards and the index written by convert_to_shards(), e.g. on network storage.
+
+    Images are read from their memory-mapped shard at the byte offset of the index instead of opening one small image
+    file each, and their labels come from the index. See YOLOStreamDataset for sequential reads while training.
+
+    Attributes:
+        shards (list): Tar shard files.
+        locations (np.ndarray): Shard, byte offset and size of the images of the index, shape (n, 3).
+        shard_mmaps (dict): Memory-mapped shards of this process by shard number.
+    """
+
+    def get_img_files(self, img_path):
+        """Reads the index of the shards in directory 'img_path' and returns its image files."""
+        path = Path(img_path)
+        try:
+            index = load_dataset_cache_file(path / SHARDS_INDEX)
+        except (FileNotFoundError, AttributeError) as e:
+            raise FileNotFoundError(f"{self.prefix}No shard index found in {path}, see convert_to_shards()") from e
+        self.shards, self.locations, self.shard_mmaps = [str(path / x) for x in index["shards"]], index["locations"], {}
+        self.shard_labels = index["labels"]
+        self.shard_labels.files = [str(path / x) for x in self.shard_labels.files]  # paths as if extracted
+        im_files = self.shard_labels.files
+        if self.fraction < 1:
+            im_files = random.sample(im_files, round(len(im_files) * self.fraction))
+        return im_files
+
+    def get_labels(self):
+        """Returns the labels of the index for the image files."""
+        self.label_files = img2label_paths(self.im_files)  # members of the shards
+        rows = {f: i for i, f in enumerate(self.shard_labels.files)}
+        labels = self.shard_labels[np.array([rows[f] for f in self.im_files], dtype=np.int64)]
+        del self.shard_labels
+        if len(labels.cls) == 0:
+            LOGGER.warning(
+                f"WARNING ⚠️ No labels found in {self.img_path}, training may not work correctly. {HELP_URL}"
+            )
+        return labels
+
+    def read_image(self, i, scale=1):
+        """Reads image 'i' from its memory-mapped shard, JPEGs downscaled by 'scale'."""
+        s, offset, size = self.locations[self.labels.order[i]]
+        if s not in self.shard_mmaps:  # mapped lazily, once per worker process
+            self.shard_mmaps[s] = np.memmap(self.shards[s], np.uint8, "r")
+        return self.decode(self.shard_mmaps[s][offset : offset + size], i, scale)
+
+    def decode(self, buf, i, scale=1):
+        """Decodes the encoded image 'buf' of image 'i' to a BGR array, JPEGs downscaled by 'scale'."""
+        im = cv2.imdecode(np.frombuffer(buf, np.uint8), IMREAD_REDUCED.get(scale, cv2.IMREAD_COLOR))
+        if im is None:
+            raise FileNotFoundError(f"Image Not Decoded {self.im_files[i]}")
+        return im
+
+    def cache_images(self, cache):
+        """Caches images to memory or a packed memory-mapped file, shards have no image files to cache to disk."""
+        if cache == "disk":
+            LOGGER.warning(f"{self.prefix}WARNING ⚠️ cache='disk' is not supported for shards, images not cached.")
+            return
+        super().cache_images(cache)
+
+    def __getstate__(self):
+        """Drops the memory-mapped shards from pickles, e.g. for spawned workers, which map them again."""
+        return {**super().__getstate__(), "shard_mmaps": {}}
+
+
+class YOLOStreamDataset(YOLOShardDataset, IterableDataset):
+    """
+    YOLO dataset streamed from the tar shards of convert_to_shards() with sequential reads, for training from network
+    storage.
+
+    Every epoch the shards are shuffled and their images are split into contiguous spans, one for each DataLoader
+    worker of each DDP rank, or one for each image with fewer images than workers, shared by the workers in turn.
+    Workers read their span sequentially in large blocks and yield samples in random order from a shuffle buffer of
+    encoded images. Images are decoded and augmented by the usual load_image() and transforms, so the Mosaic buffer
+    of recent images works unchanged. MixUp reads its random images from the memory-mapped shards.
+
+    Attributes:
+        shuffle_buffer (int): Number of encoded images read ahead to draw samples from.
+        pending (dict): Encoded images of the shuffle buffer by index.
+        rank (int): DDP rank of the dataset.
+        world (int): Number of DDP ranks.
+    """
+
+    def __init__(self, *args, shuffle_buffer=1000, **kwargs):
+        """Initializes the dataset with a shuffle buffer of 'shuffle_buffer' images."""
+        super().__init__(*args, **kwargs)
+        self.shuffle_buffer = shuffle_buffer
+        self.pending = {}
+        self.rank, self.world = (dist.get_rank(), dist.get_world_size()) if dist.is_initialized() else (0, 1)
+
+    def __iter__(self):
+        """Yields transformed samples from the span of the shards of this worker and rank, epoch after epoch."""
+        info = get_worker_info()
+        nw, w = (info.num_workers, info.id) if info else (1, 0)
+        index = np.full(len(self.locations), -1, dtype=np.int64)
+        index[self.labels.order] = np.arange(self.ni)  # dataset index of the rows of the index
+        rows = np.lexsort((self.locations[:, 1], self.locations[:, 0]))  # by shard and offset
+        rows = np.split(rows, np.cumsum(np.bincount(self.locations[:, 0], minlength=len(self.shards)))[:-1])
+        keys, epoch = [], 0
+        while True:
+            shards = list(range(len(self.shards)))
+            random.Random(epoch).shuffle(shards)  # same order in all workers and ranks
+            span = np.concatenate([rows[s][index[rows[s]] >= 0] for s in shards])
+            n = max(1, min(len(span), nw * self.world))  # fewer spans than workers for tiny datasets, shared in turn
+            span = np.array_split(span, n)[(self.rank * nw + w) % n]
+            for i, buf in self.read_span(span, index):
+                self.pending[i] = buf
+                keys.append(i)
+                if len(keys) >= self.shuffle_buffer:
+                    j = random.randrange(len(keys))
+                    keys[j], keys[-1] = keys[-1], keys[j]
+                    j = keys.pop()
+                    sample = self[j]
+                    self.pending.pop(j, None)  # not read if cached
+                    yield sample
+            epoch += 1
+
+    def read_span(self, span, index):
+        """Yields dataset index and encoded image of the rows 'span' of the index, reading shards sequentially."""
+        s, f = -1, None
+        try:
+            for r in span:
+                shard, offset, size = self.locations[r]
+                if shard != s:
+                    if f:
+                        f.close()
+                    s, f = shard, open(self.shards[shard], "rb", buffering=1 << 24)  # 16MB sequential reads
+                f.seek(offset)  # skips headers and labels within the read buffer
+                yield index[r], f.read(size)
+        finally:
+            if f:
+                f.close()
+
+    def read_image(self, i, scale=1):
+        """Reads image 'i' from the shuffle buffer, or from its memory-mapped shard if not streamed, e.g. for MixUp."""
+        buf = self.pending.pop(i, None)
+        return super().read_image(i, scale) if buf is None else self.decode(buf, i, scale)
+
+
 # Classification dataloaders -------------------------------------------------------------------------------------------
 class ClassificationDataset(torchvision.datasets.ImageFolder):
     """
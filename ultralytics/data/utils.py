@@ -1,13 +1,18 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
 import contextlib
+import glob
 import hashlib
 import json
 import os
 import random
+import re
+import shutil
 import subprocess
 import time
 import zipfile
+from collections import defaultdict
+from itertools import combinations
 from multiprocessing.pool import ThreadPool
 from pathlib import Path
 from tarfile import is_tarfile
@@ -38,6 +43,7 @@ HELP_URL = "See https://docs.ultralytics.com/datasets/detect for dataset formatt
 IMG_FORMATS = {"bmp", "dng", "jpeg", "jpg", "mpo", "png", "tif", "tiff", "webp", "pfm"}  # image suffixes
 VID_FORMATS = {"asf", "avi", "gif", "m4v", "mkv", "mov", "mp4", "mpeg", "mpg", "ts", "wmv", "webm"}  # video suffixes
 PIN_MEMORY = str(os.getenv("PIN_MEMORY", True)).lower() == "true"  # global pin_memory for dataloaders
+IMREAD_REDUCED = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}  # JPEG
 
 
 def img2label_paths(img_paths):
@@ -54,6 +60,20 @@ def get_hash(paths):
     return h.hexdigest()  # return hash
 
 
+def get_file_stats(paths):
+    """Returns the (size, mtime) fingerprints of a list of files as an (n, 2) int64 array, -1 for missing files."""
+
+    def stat(p):
+        """Returns the (size, mtime in ns) of file 'p'."""
+        try:
+            s = os.stat(p)
+            return s.st_size, s.st_mtime_ns
+        except OSError:
+            return -1, -1
+
+    return np.array([stat(p) for p in paths], dtype=np.int64).reshape(-1, 2)
+
+
 def exif_size(img: Image.Image):
     """Returns exif-corrected PIL size."""
     s = img.size  # (width, height)
@@ -164,6 +184,147 @@ def verify_image_label(args):
         return [None, None, None, None, None, nm, nf, ne, nc, msg]
 
 
+class ColumnarLabels:
+    """
+    Labels of a YOLO dataset stored as flat columns with per-image offsets, optionally memory-mapped from a file.
+
+    Behaves as the sequence of per-image label dicts of YOLODataset, whose items are sliced from the columns in O(1)
+    as new arrays. Reordering and subsets only index the image order, so the columns stay shared.
+
+    Attributes:
+        files (list): Image files of all images in the columns.
+        hw (np.ndarray): Original (height, width) of all images in the columns, shape (n, 2).
+        offsets (np.ndarray): Instance offsets of the images in the columns, shape (n + 1,).
+        cls (np.ndarray): Classes of all instances, shape (N, 1).
+        bboxes (np.ndarray): Normalized xywh boxes of all instances, shape (N, 4).
+        keypoints (np.ndarray | None): Keypoints of all instances, shape (N, nkpt, ndim), or None without keypoints.
+        points (np.ndarray): Segment points of all instances, shape (P, 2).
+        point_offsets (np.ndarray): Segment point offsets of the instances, empty segments for none, shape (N + 1,).
+        order (np.ndarray): Indices of the images of this sequence in the columns.
+        file (Path | None): Raw float32 file the float columns are memory-mapped from.
+    """
+
+    float_columns = "cls", "bboxes", "keypoints", "points"
+
+    def __init__(self, files, hw, offsets, cls, bboxes, keypoints, points, point_offsets, order=None):
+        """Initializes the labels from their columns, optionally viewing only the images of 'order'."""
+        self.files, self.hw, self.offsets = files, hw, offsets
+        self.cls, self.bboxes, self.keypoints = cls, bboxes, keypoints
+        self.points, self.point_offsets = points, point_offsets
+        self.order = np.arange(len(files)) if order is None else order
+        self.file, self.layout = None, {}  # float columns memory-mapped from 'file' as {name: (offset, shape)}
+
+    @classmethod
+    def from_labels(cls, labels):
+        """Builds the columns from a list of per-image label dicts."""
+
+        def cat(x, shape):
+            """Concatenates arrays of 'shape' rows to float32."""
+            return np.concatenate(x, 0).astype(np.float32) if x else np.zeros((0, *shape), np.float32)
+
+        segments = [x for lb in labels for x in (lb["segments"] or [np.zeros((0, 2), np.float32)] * len(lb["cls"]))]
+        keypoints = labels[0]["keypoints"] if labels else None
+        return cls(
+            files=[lb["im_file"] for lb in labels],
+            hw=np.array([lb["shape"] for lb in labels], dtype=np.int64).reshape(-1, 2),
+            offsets=np.cumsum([0] + [len(lb["cls"]) for lb in labels], dtype=np.int64),
+            cls=cat([lb["cls"] for lb in labels], (1,)),
+            bboxes=cat([lb["bboxes"] for lb in labels], (4,)),
+            keypoints=None if keypoints is None else cat([lb["keypoints"] for lb in labels], keypoints.shape[1:]),
+            points=cat(segments, (2,)),
+            point_offsets=np.cumsum([0] + [len(x) for x in segments], dtype=np.int64),
+        )
+
+    def save(self, file):
+        """Writes the float columns to a raw float32 file and memory-maps them from it, e.g. for a labels cache."""
+        file, layout, offset = Path(file), {}, 0
+        with open(file.with_suffix(".tmp"), "wb") as f:
+            for k in self.float_columns:
+                x = getattr(self, k)
+                if x is not None:
+                    f.write(np.ascontiguousarray(x, dtype=np.float32).data)
+                    layout[k], offset = (offset, x.shape), offset + x.size
+        file.with_suffix(".tmp").replace(file)
+        self.file, self.layout = file, layout
+        self._map()
+
+    def _map(self):
+        """Memory-maps the float columns of 'layout' from 'file'."""
+        x = np.memmap(self.file, np.float32, "r") if self.file.stat().st_size else np.zeros(0, np.float32)
+        for k, (offset, shape) in self.layout.items():
+            setattr(self, k, x[offset : offset + int(np.prod(shape))].reshape(shape))
+
+    def __getstate__(self):
+        """Drops memory-mapped columns from pickles, e.g. of *.cache files or spawned workers, which map them again."""
+        return {k: None if k in self.layout else v for k, v in self.__dict__.items()}
+
+    def __setstate__(self, state):
+        """Restores the labels and maps their columns from 'file' again."""
+        self.__dict__.update(state)
+        if self.layout:
+            self._map()
+
+    def __len__(self):
+        """Returns the number of images."""
+        return len(self.order)
+
+    def __iter__(self):
+        """Yields the label dicts of all images."""
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, index):
+        """Returns the label dict of image 'index', or the labels of the images of a slice or index array."""
+        if not isinstance(index, (int, np.integer)):
+            labels = self.__class__.__new__(self.__class__)
+            labels.__dict__.update(self.__dict__)
+            labels.order = self.order[index]
+            return labels
+        j = self.order[index]
+        a, b = self.offsets[j], self.offsets[j + 1]
+        p = self.point_offsets[a : b + 1]
+        return dict(
+            im_file=self.files[j],
+            shape=tuple(int(x) for x in self.hw[j]),
+            cls=np.array(self.cls[a:b]),
+            bboxes=np.array(self.bboxes[a:b]),
+            segments=[np.array(self.points[i:k]) for i, k in zip(p[:-1], p[1:])] if p[-1] > p[0] else [],
+            keypoints=None if self.keypoints is None else np.array(self.keypoints[a:b]),
+            normalized=True,
+            bbox_format="xywh",
+        )
+
+    @property
+    def im_files(self):
+        """Image files of the images in order."""
+        return [self.files[j] for j in self.order]
+
+    @property
+    def shapes(self):
+        """Original (height, width) of the images in order, shape (n, 2)."""
+        return self.hw[self.order]
+
+    def drop_segments(self):
+        """Removes all segments, keeping the boxes."""
+        self.points, self.point_offsets = np.zeros((0, 2), np.float32), np.zeros_like(self.point_offsets)
+        self.layout.pop("points", None)  # in memory now
+
+    def update(self, include_class=None, single_cls=False):
+        """Keeps only the instances of 'include_class' classes if given, and sets all classes to 0 if 'single_cls'."""
+        if include_class is not None:
+            keep = np.isin(self.cls[:, 0], include_class)
+            n = np.diff(self.point_offsets)[keep]  # points per kept instance
+            self.points = self.points[np.repeat(keep, np.diff(self.point_offsets))]
+            self.point_offsets = np.cumsum(np.r_[0, n], dtype=np.int64)
+            self.offsets = np.cumsum(np.r_[0, keep], dtype=np.int64)[self.offsets]
+            self.cls, self.bboxes = self.cls[keep], self.bboxes[keep]
+            if self.keypoints is not None:
+                self.keypoints = self.keypoints[keep]
+            self.layout = {}  # all columns in memory now
+        if single_cls:
+            self.cls = np.zeros_like(self.cls)
+            self.layout.pop("cls", None)
+
+
 def polygon2mask(imgsz, polygons, color=1, downsample_ratio=1):
     """
     Convert a list of polygons to a binary mask of the specified image size.
@@ -649,3 +810,220 @@ def autosplit(path=DATASETS_DIR / "coco8/images", weights=(0.9, 0.1, 0.0), annot
         if not annotated_only or Path(img2label_paths([str(img)])[0]).exists():  # check label
             with open(path.parent / txt[i], "a") as f:
                 f.write(f"./{img.relative_to(path.parent).as_posix()}" + "\n")  # add image to txt file
+
+
+def split_dataset(
+    path=DATASETS_DIR / "coco8/images",
+    save_dir=None,
+    weights=(0.8, 0.1, 0.1),
+    group=None,
+    mode="txt",
+    names=("train", "val", "test"),
+):
+    """
+    Split a dataset into train/val/test splits stratified by image classes, keeping groups of images in one split.
+
+    Images are paired with their label files by img2label_paths(), images without label file are backgrounds. Images
+    are stratified by the set of classes in their labels, so that every split gets its share of e.g. images with and
+    without defects. Each group of images goes to the split furthest below its share of the images assigned so far,
+    which carries rounding remainders from one stratum to the next, so that rare classes of a few images are spread
+    over the splits instead of all landing in train. Images of the same group, e.g. of the same tower, always land in
+    the same split to avoid leakage between splits.
+
+    Args:
+        path (Path, optional): Path to images directory. Defaults to DATASETS_DIR / 'coco8/images'.
+        save_dir (Path, optional): Directory to save the splits to. Defaults to the parent directory of 'path'.
+        weights (list | tuple, optional): Train, validation, and test split fractions. Defaults to (0.8, 0.1, 0.1).
+        group (str | callable, optional): Regex whose first match in the file stem, or function of the image path,
+            that returns the group of an image. Defaults to None, one group per image.
+        mode (str, optional): 'txt' to save autosplit_*.txt image lists to 'save_dir', 'link' to hardlink images and
+            labels to 'save_dir'/{train,val,test}/{images,labels}, falling back to copies, or 'copy' to copy them.
+            Defaults to 'txt'.
+        names (tuple, optional): Names of the splits, e.g. ('train', 'valid', 'test'). Defaults to ('train', 'val',
+            'test').
+
+    Returns:
+        (dict): Image files of each split by name.
+
+    Example:
+        ```python
+        from ultralytics.data.utils import split_dataset
+
+        split_dataset('path/to/images', group=r'^[^_]+', mode='link')  # group by the stem prefix before '_'
+        ```
+    """
+    if mode not in {"txt", "link", "copy"}:
+        raise ValueError(f"Invalid split mode='{mode}'. Valid modes are ('txt', 'link', 'copy')")
+    path = Path(path).resolve()  # images dir
+    save_dir = Path(save_dir or path.parent)
+    files = glob.glob(str(path / "**" / "*.*"), recursive=True)
+    files = sorted(x for x in files if x.rsplit(".", 1)[-1].lower() in IMG_FORMATS)  # image files only
+    labels = img2label_paths(files)
+
+    def classes(lb):
+        """Returns the classes in label file 'lb', empty for backgrounds, None without label file."""
+        with contextlib.suppress(FileNotFoundError), open(lb) as f:
+            return frozenset(x.split(maxsplit=1)[0] for x in f.read().splitlines() if x.strip())
+
+    with ThreadPool(NUM_THREADS) as pool:
+        cls = pool.map(classes, labels, chunksize=256)
+    label_dir = os.path.dirname(img2label_paths([str(path / "x.jpg")])[0])
+    orphans = set(glob.glob(os.path.join(label_dir, "**", "*.txt"), recursive=True)) - set(labels)
+    if label_dir != str(path) and orphans:
+        LOGGER.warning(f"WARNING ⚠️ {len(orphans)} label files without images, i.e. {min(orphans)}, not split")
+
+    def key(f):
+        """Returns the group of image 'f'."""
+        if group is None or callable(group):
+            return group(Path(f)) if group else f
+        stem = os.path.splitext(os.path.basename(f))[0]
+        m = re.search(group, stem)
+        return m[0] if m else stem
+
+    # Stratify groups by their classes and assign them to the splits with the largest deficit in image count
+    groups = defaultdict(list)
+    for i, f in enumerate(files):
+        groups[key(f)].append(i)
+    strata = defaultdict(list)
+    for g in groups.values():
+        strata[tuple(sorted(frozenset().union(*(cls[i] or () for i in g))))].append(g)
+    deficit = [0.0] * len(weights)  # images per split below its share, carried across strata
+    splits = np.zeros(len(files), dtype=int)
+    rng = random.Random(0)  # for reproducibility
+    for _, s in sorted(strata.items()):
+        rng.shuffle(s)
+        for g in sorted(s, key=len, reverse=True):  # large groups first, small ones even out the counts
+            deficit = [d + w * len(g) / sum(weights) for d, w in zip(deficit, weights)]
+            j = deficit.index(max(deficit))
+            deficit[j] -= len(g)
+            splits[g] = j
+
+    result = {x: [f for f, j in zip(files, splits) if j == i] for i, x in enumerate(names)}
+    LOGGER.info(
+        f"Splitting {len(files)} images from {path} in {len(groups)} groups and {len(strata)} class strata into "
+        + ", ".join(f"{len(v)} {k}" for k, v in result.items())
+    )
+    if mode == "txt":
+        for x in names:
+            (save_dir / f"autosplit_{x}.txt").write_text("".join(f"{f}\n" for f in result[x]))
+    else:
+
+        def transfer(src_dst):
+            """Hardlinks or copies a file."""
+            src, dst = src_dst
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(dst)
+            if mode == "link":
+                with contextlib.suppress(OSError):  # i.e. across file systems
+                    return os.link(src, dst)
+            shutil.copyfile(src, dst)
+
+        jobs = []
+        for f, lb, c, j in zip(files, labels, cls, splits):
+            jobs.append((f, os.path.join(save_dir, names[j], "images", os.path.relpath(f, path))))
+            if c is not None:
+                jobs.append((lb, os.path.join(save_dir, names[j], "labels", os.path.relpath(lb, label_dir))))
+        for d in {os.path.dirname(dst) for _, dst in jobs}:
+            os.makedirs(d, exist_ok=True)
+        with ThreadPool(NUM_THREADS * 4) as pool:  # IO bound
+            desc = "Linking files" if mode == "link" else "Copying files"
+            for _ in TQDM(pool.imap_unordered(transfer, jobs, chunksize=64), total=len(jobs), desc=desc):
+                pass
+    return result
+
+
+def image_hash(f):
+    """
+    Returns the 64-bit DCT perceptual hash of an image file, or None if it can not be read.
+
+    The image is decoded in grayscale at 1/8 size, which JPEG decoders do in the DCT domain, and resized to 32x32. The
+    hash bits are the signs of the lowest 8x8 frequencies of its DCT against their median, so that resized, recompressed
+    and slightly shifted copies of an image differ in only a few bits.
+    """
+    im = cv2.imread(f, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if im is None:
+        return None
+    d = cv2.dct(cv2.resize(im, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32))[:8, :8].ravel()
+    return np.packbits(d > np.median(d[1:])).view(">u8")[0]
+
+
+def dedup_dataset(path=DATASETS_DIR / "coco8/images", threshold=8, save_dir=None):
+    """
+    Find clusters of near-duplicate images in a dataset by perceptual hash, and save an image list without them.
+
+    Images are hashed with image_hash() in parallel and clustered by Hamming distance <= 'threshold' between hashes,
+    e.g. consecutive frames of a video. Near neighbors are found with a multi-index hash: hashes within 'threshold' bits
+    match within threshold // 4 bits in at least one of their four 16-bit chunks, so each chunk is looked up for all bit
+    flips up to that radius in a sorted table instead of comparing all pairs. Pairs of near neighbors are joined into
+    clusters transitively. The first image of each cluster is kept, and 'save_dir'/dedup.txt lists the kept images for
+    use as a 'train' or 'val' entry of a dataset YAML. No model is needed, 100k images take minutes on CPU.
+
+    Args:
+        path (Path, optional): Path to images directory. Defaults to DATASETS_DIR / 'coco8/images'.
+        threshold (int, optional): Maximum Hamming distance of near-duplicate hashes, of 64 bits. Defaults to 8.
+        save_dir (Path, optional): Directory to save dedup.txt and dedup_clusters.json to. Defaults to the parent
+            directory of 'path'.
+
+    Returns:
+        (list): Sorted lists of the image files of each cluster of near-duplicates.
+
+    Example:
+        ```python
+        from ultralytics.data.utils import dedup_dataset, split_dataset
+
+        clusters = dedup_dataset('path/to/images', threshold=8)
+        group = {f: c[0] for c in clusters for f in c}
+        split_dataset('path/to/images', group=lambda f: group.get(str(f), str(f)))  # keep near-duplicates in one split
+        ```
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    path = Path(path).resolve()  # images dir
+    save_dir = Path(save_dir or path.parent)
+    files = glob.glob(str(path / "**" / "*.*"), recursive=True)
+    files = sorted(x for x in files if x.rsplit(".", 1)[-1].lower() in IMG_FORMATS)  # image files only
+    with ThreadPool(NUM_THREADS) as pool:  # OpenCV releases the GIL
+        results = pool.imap(image_hash, files, chunksize=64)
+        hashes = list(TQDM(results, total=len(files), desc=f"Hashing {path}"))
+    bad = [f for f, h in zip(files, hashes) if h is None]
+    if bad:
+        LOGGER.warning(f"WARNING ⚠️ {len(bad)} images can not be read, i.e. {bad[0]}, not deduplicated")
+        files, hashes = zip(*((f, h) for f, h in zip(files, hashes) if h is not None))
+    hashes, inverse = np.unique(np.array(hashes, dtype=np.uint64), return_inverse=True)  # identical hashes once
+
+    # Multi-index hash lookup of near neighbor pairs between unique hashes
+    n = len(hashes)
+    popcount = np.array([bin(x).count("1") for x in range(256)], dtype=np.uint8)
+    flips = [sum(1 << b for b in bits) for r in range(threshold // 4 + 1) for bits in combinations(range(16), r)]
+    pairs = [np.zeros((2, 0), dtype=np.int64)]
+    for k in range(4):
+        key = ((hashes >> np.uint64(16 * k)) & np.uint64(0xFFFF)).astype(np.int64)
+        order = np.argsort(key, kind="stable")
+        table = key[order]
+        for flip in flips:
+            q = key ^ flip
+            lo, hi = np.searchsorted(table, q, "left"), np.searchsorted(table, q, "right")
+            m = hi - lo
+            i = np.repeat(np.arange(n), m)
+            j = order[np.arange(m.sum()) + np.repeat(lo - np.cumsum(m) + m, m)]
+            i, j = i[i < j], j[i < j]
+            d = popcount[(hashes[i] ^ hashes[j]).view(np.uint8)].reshape(-1, 8).sum(1)  # Hamming distance
+            pairs.append(np.stack((i, j))[:, d <= threshold])
+    i, j = np.concatenate(pairs, 1)
+    _, label = connected_components(coo_matrix((np.ones(len(i)), (i, j)), shape=(n, n)), directed=False)
+
+    clusters = defaultdict(list)
+    for f, c in zip(files, label[inverse]):
+        clusters[c].append(f)
+    clusters = sorted(c for c in clusters.values() if len(c) > 1)
+    dups = {f for c in clusters for f in c[1:]}
+    (save_dir / "dedup.txt").write_text("".join(f"{f}\n" for f in files if f not in dups))
+    with open(save_dir / "dedup_clusters.json", "w") as f:
+        json.dump(clusters, f, indent=2)
+    LOGGER.info(
+        f"Found {len(dups) + len(clusters)} near-duplicates of {len(files)} images in {len(clusters)} clusters, "
+        f"saved {len(files) - len(dups)} images to {save_dir / 'dedup.txt'} and clusters to "
+        f"{save_dir / 'dedup_clusters.json'}"
+    )
+    return clusters
@@ -52,6 +52,8 @@ TensorFlow.js:
 
 import json
 import os
+import re
+import shlex
 import shutil
 import subprocess
 import time
@@ -224,6 +226,12 @@ class Exporter:
         model.eval()
         model.float()
         model = model.fuse()
+        issues = model.fusion_report(im, n=3, verbose=False) if hasattr(model, "fusion_report") else []  # audit
+        if issues:
+            LOGGER.warning(
+                f"WARNING ⚠️ {len(issues)} ops left unfused before export: "
+                + ", ".join(f"{x['module']} {x['type']} ({x['issue']})" for x in issues)
+            )
         for m in model.modules():
             if isinstance(m, (Detect, RTDETRDecoder)):  # includes all Detect subclasses like Segment, Pose, OBB
                 m.dynamic = self.args.dynamic
@@ -288,6 +296,8 @@ class Exporter:
             f[1], _ = self.export_engine()
         if onnx:  # ONNX
             f[2], _ = self.export_onnx()
+            if self.args.int8:  # other formats exported via ONNX quantize with their own converters
+                f[2], _ = self.export_onnx_int8(f[2])
         if xml:  # OpenVINO
             f[3], _ = self.export_openvino()
         if coreml:  # CoreML
@@ -412,6 +422,156 @@ class Exporter:
         onnx.save(model_onnx, f)
         return f, model_onnx
 
+    @try_export
+    def export_onnx_int8(self, f, prefix=colorstr("ONNX INT8:")):
+        """YOLOv8 ONNX INT8 export, static quantization of the float ONNX model 'f' for format='onnx' only."""
+        fq = self._quantize_onnx(f, prefix)
+        self._int8_val_delta(f, fq, prefix)
+        return fq, None
+
+    def _get_calibration_images(self, prefix, n=300):
+        """
+        Returns up to 'n' letterboxed float32 calibration batches of shape(batch, 3, h, w) from the 'data' train split.
+
+        Images are sampled evenly across the split and preprocessed by the non-augmented LetterBox pipeline used for
+        validation, so that activation ranges match those seen at inference. The train split is used to keep the
+        calibration set disjoint from the images the quantized model is later validated on.
+        """
+        if not self.args.data:
+            self.args.data = (
+                (self.model.args.get("data") if isinstance(getattr(self.model, "args", None), dict) else None)
+                or DEFAULT_CFG.data
+                or "coco128.yaml"
+            )
+            LOGGER.warning(
+                f"{prefix} WARNING ⚠️ INT8 export requires a missing 'data' arg for calibration. "
+                f"Using 'data={self.args.data}'."
+            )
+        LOGGER.info(f"{prefix} collecting INT8 calibration images from 'data={self.args.data}'")
+        data = check_det_dataset(self.args.data)
+        dataset = YOLODataset(data["train"], data=data, imgsz=self.imgsz[0], augment=False)
+        bs = self.im.shape[0]
+        n = max(min(n, len(dataset)) // bs * bs, bs)
+        if len(dataset) < 300:
+            LOGGER.warning(f"{prefix} WARNING ⚠️ >300 images recommended for INT8 calibration, found {len(dataset)}")
+        idx = np.linspace(0, len(dataset) - 1, n).round().astype(int)
+        ims = np.stack([dataset[i]["img"].numpy() for i in idx]).astype(np.float32) / 255.0  # uint8 to 0.0 - 1.0
+        return list(ims.reshape(-1, bs, *ims.shape[1:]))
+
+    def _quantize_onnx(self, f, prefix=colorstr("ONNX:")):
+        """
+        Post-training static INT8 quantization of the exported ONNX model 'f' in QDQ format with onnxruntime.
+
+        Nodes matching the comma-separated 'quant_exclude' regex patterns are kept in float, where 'head' selects all
+        nodes of the final Detect module (box/DFL and class convs plus the v10Detect top-k postprocess), the most
+        quantization-sensitive part of the model. The calibration batches are also saved as float32 *.bin files for
+        INT8 OM conversion with the Ascend AMCT and ATC tools, which run automatically when 'amct_onnx' is on PATH.
+        """
+        check_requirements("onnxruntime" + ("-gpu" if torch.cuda.is_available() else ""))
+        import onnx  # noqa
+        from onnxruntime.quantization import (
+            CalibrationDataReader,
+            CalibrationMethod,
+            QuantFormat,
+            QuantType,
+            quantize_static,
+        )
+
+        batches = self._get_calibration_images(prefix)
+
+        class _Reader(CalibrationDataReader):
+            """Feeds calibration batches to onnxruntime by input name."""
+
+            def __init__(self):
+                self.it = iter(batches)
+
+            def get_next(self):
+                """Returns the next input feed or None when calibration is complete."""
+                x = next(self.it, None)
+                return None if x is None else {"images": x}
+
+        # Nodes kept in float
+        patterns = [x.strip() for x in str(self.args.quant_exclude or "").split(",") if x.strip()]
+        if "head" in patterns and isinstance(self.model.model[-1], Detect):
+            patterns[patterns.index("head")] = rf"^/model\.{len(self.model.model) - 1}/"
+        nodes = [n.name for n in onnx.load(f).graph.node if any(re.search(p, n.name) for p in patterns)]
+        LOGGER.info(f"{prefix} quantizing to INT8 QDQ with {len(batches)} batches, {len(nodes)} nodes kept in float")
+
+        fq = f.replace(".onnx", "_int8.onnx")
+        quantize_static(
+            f,
+            fq,
+            _Reader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.MinMax,
+            nodes_to_exclude=nodes,
+        )
+        model_onnx = onnx.load(fq)
+        for k, v in self.metadata.items():
+            meta = model_onnx.metadata_props.add()
+            meta.key, meta.value = k, str(v)
+        onnx.save(model_onnx, fq)
+
+        # Ascend OM INT8 calibration data
+        calib_dir = Path(f).parent / f"{self.file.stem}_int8_calib"
+        calib_dir.mkdir(parents=True, exist_ok=True)
+        for i, x in enumerate(batches):
+            x.tofile(calib_dir / f"{i}.bin")
+        shape = ",".join(str(x) for x in self.im.shape)
+        amct = [
+            "amct_onnx",
+            "calibration",
+            f"--model={f}",
+            f"--save_path={calib_dir.parent / (self.file.stem + '_amct')}",
+            f"--input_shape=images:{shape}",
+            f"--data_dir={calib_dir}",
+            "--data_types=float32",
+        ]
+        atc = [
+            "atc",
+            f"--model={calib_dir.parent / (self.file.stem + '_amct_deploy_model.onnx')}",
+            "--framework=5",
+            f"--output={self.file.stem}_int8",
+            f"--input_shape=images:{shape}",
+            "--soc_version=<soc>",
+        ]
+        if shutil.which("amct_onnx"):
+            LOGGER.info(f"{prefix} running '{shlex.join(amct)}'")
+            subprocess.run(amct)
+        LOGGER.info(
+            f"{prefix} OM INT8 calibration data saved to '{calib_dir}', convert with:\n"
+            f"{shlex.join(amct)}\n{shlex.join(atc)}"
+        )
+        return fq
+
+    def _int8_val_delta(self, f, fq, prefix=colorstr("ONNX:")):
+        """Validates float ONNX 'f' and INT8 ONNX 'fq' on the 'data' val split and logs the mAP and latency deltas."""
+        if self.model.task != "detect":
+            return
+        from ultralytics.models.yolo.detect import DetectionValidator
+        from ultralytics.models.yolov10 import YOLOv10DetectionValidator
+        from ultralytics.nn.tasks import YOLOv10DetectionModel
+
+        validator = YOLOv10DetectionValidator if isinstance(self.model, YOLOv10DetectionModel) else DetectionValidator
+        args = dict(task="detect", mode="val", data=self.args.data, imgsz=self.imgsz[0], batch=1, plots=False)
+        results = []
+        try:
+            for w in f, fq:
+                v = validator(args={**args, "device": self.args.device})
+                v(model=w)
+                results.append((v.metrics.box.map, v.speed["inference"]))
+        except Exception as e:
+            LOGGER.warning(f"{prefix} WARNING ⚠️ INT8 validation failure: {e}")
+            return
+        (m0, t0), (m1, t1) = results
+        LOGGER.info(
+            f"{prefix} INT8 mAP50-95 {m0:.4f} -> {m1:.4f} ({m1 - m0:+.4f}), "
+            f"inference {t0:.1f}ms -> {t1:.1f}ms ({t0 / max(t1, 1e-6):.2f}x faster)"
+        )
+
     @try_export
     def export_openvino(self, prefix=colorstr("OpenVINO:")):
         """YOLOv8 OpenVINO export."""
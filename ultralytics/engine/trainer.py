@@ -6,21 +6,26 @@ Usage:
     $ yolo mode=train model=yolov8n.pt data=coco128.yaml imgsz=640 epochs=100 batch=16
 """
 
+import io
 import math
 import os
+import queue
 import subprocess
 import time
 import warnings
-from copy import deepcopy
+from copy import copy, deepcopy
 from datetime import datetime, timedelta
 from pathlib import Path
+from types import SimpleNamespace
 
 import numpy as np
 import torch
 from torch import distributed as dist
+from torch import multiprocessing as mp
 from torch import nn, optim
 
 from ultralytics.cfg import get_cfg, get_save_dir
+from ultralytics.data.build import build_dataloader
 from ultralytics.data.utils import check_cls_dataset, check_det_dataset
 from ultralytics.nn.tasks import attempt_load_one_weight, attempt_load_weights
 from ultralytics.utils import (
@@ -99,6 +104,9 @@ class BaseTrainer:
         self.check_resume(overrides)
         self.device = select_device(self.args.device, self.args.batch)
         self.validator = None
+        self.val_worker = None  # (process, jobs, results) of 'val_async' validation
+        self.val_pending = []  # epochs awaiting their 'val_async' results, in order
+        self.val_results = {}  # 'val_async' results by epoch
         self.metrics = None
         self.plots = {}
         init_seeds(self.args.seed + 1 + RANK, deterministic=self.args.deterministic)
@@ -347,7 +355,7 @@ class BaseTrainer:
             self.epoch = epoch
             self.run_callbacks("on_train_epoch_start")
             self.model.train()
-            if RANK != -1:
+            if RANK != -1 and hasattr(self.train_loader.sampler, "set_epoch"):  # not for stream datasets
                 self.train_loader.sampler.set_epoch(epoch)
             pbar = enumerate(self.train_loader)
             # Update dataloader attributes (optional)
@@ -425,11 +433,20 @@ class BaseTrainer:
                 self.ema.update_attr(self.model, include=["yaml", "nc", "args", "names", "stride", "class_weights"])
 
                 # Validation
-                if (self.args.val and (((epoch+1) % self.args.val_period == 0) or (self.epochs - epoch) <= 10)) \
-                    or final_epoch or self.stopper.possible_stop or self.stop:
-                    self.metrics, self.fitness = self.validate()
-                self.save_metrics(metrics={**self.label_loss_items(self.tloss), **self.metrics, **self.lr})
-                self.stop |= self.stopper(epoch + 1, self.fitness) or final_epoch
+                validate = (
+                    (self.args.val and (((epoch + 1) % self.args.val_period == 0) or (self.epochs - epoch) <= 10))
+                    or final_epoch
+                    or self.stopper.possible_stop
+                    or self.stop
+                )
+                if self.args.val_async and not (final_epoch or self.stop):
+                    self.validate_async(validate)
+                else:
+                    self.collect_val(keep=0)
+                    if validate:
+                        self.metrics, self.fitness = self.validate()
+                    self.save_metrics(metrics={**self.label_loss_items(self.tloss), **self.metrics, **self.lr})
+                    self.stop |= self.stopper(epoch + 1, self.fitness) or final_epoch
                 if self.args.time:
                     self.stop |= (time.time() - self.train_time_start) > (self.args.time * 3600)
 
@@ -464,6 +481,10 @@ class BaseTrainer:
             epoch += 1
 
         if RANK in (-1, 0):
+            self.collect_val(keep=0)
+            if self.val_worker:
+                self.val_worker[1].put(None)  # stop the 'val_async' worker
+                self.val_worker[0].join()
             # Do final val with best.pt
             LOGGER.info(
                 f"\n{epoch - self.start_epoch + 1} epochs completed in "
@@ -481,7 +502,8 @@ class BaseTrainer:
         import pandas as pd  # scope for faster startup
 
         metrics = {**self.metrics, **{"fitness": self.fitness}}
-        results = {k.strip(): v for k, v in pd.read_csv(self.csv).to_dict(orient="list").items()}
+        csv = pd.read_csv(self.csv).to_dict(orient="list") if self.csv.exists() else {}  # no rows yet with 'val_async'
+        results = {k.strip(): v for k, v in csv.items()}
         ckpt = {
             "epoch": self.epoch,
             "best_fitness": self.best_fitness,
@@ -500,8 +522,14 @@ class BaseTrainer:
 
         # Save last and best
         torch.save(ckpt, self.last)
-        if self.best_fitness == self.fitness:
-            torch.save(ckpt, self.best)
+        job = self.val_pending[-1] if self.val_pending else None
+        if job is None:
+            if self.best_fitness == self.fitness:
+                torch.save(ckpt, self.best)
+        elif job["validate"] and job["epoch"] == self.epoch:  # best.pt is decided once its validation arrives
+            buffer = io.BytesIO()
+            torch.save(ckpt, buffer)
+            job["ckpt"] = buffer.getvalue()
         if (self.save_period > 0) and (self.epoch > 0) and (self.epoch % self.save_period == 0):
             torch.save(ckpt, self.wdir / f"epoch{self.epoch}.pt")
 
@@ -555,6 +583,96 @@ class BaseTrainer:
             self.best_fitness = fitness
         return metrics, fitness
 
+    def validate_async(self, validate=True):
+        """
+        Queues the current epoch for 'val_async' validation of an EMA snapshot in a background process.
+
+        The EMA weights are copied to shared memory and validated on the 'val_async' device while training continues.
+        The results.csv row, early stopping and best.pt of the epoch are completed in epoch order by collect_val().
+
+        Args:
+            validate (bool): Whether to validate this epoch, otherwise its row repeats the last validation metrics.
+        """
+        job = {"epoch": self.epoch, "train": self.label_loss_items(self.tloss), "lr": self.lr, "validate": validate}
+        if validate:
+            if self.val_worker is None:
+                self.val_worker = self._start_val_worker()
+            self.collect_val(keep=1)  # at most one snapshot waits while another is validated
+            job["fitness"] = -self.loss.detach().cpu().numpy()  # fitness if the validator reports none
+            job["state"] = {k: v.detach().to("cpu", copy=True) for k, v in self.ema.ema.state_dict().items()}
+            self.val_worker[1].put((self.epoch, self.epochs, self.stopper.possible_stop, job["state"]))  # shared memory
+        self.val_pending.append(job)
+        self.collect_val()
+
+    def collect_val(self, keep=None):
+        """
+        Completes the epochs queued by validate_async() in epoch order with the validation results that have arrived.
+
+        Args:
+            keep (int, optional): Wait until at most 'keep' validations are pending, or take only the results that have
+                arrived if None.
+        """
+        while self.val_pending:
+            job = self.val_pending[0]
+            if job["validate"] and job["epoch"] not in self.val_results:
+                pending = sum(x["validate"] for x in self.val_pending)
+                if not self._receive_val(wait=keep is not None and pending > keep):
+                    break
+                continue
+            self.val_pending.pop(0)
+            if job["validate"]:
+                metrics = self.val_results.pop(job["epoch"])
+                self.metrics, self.fitness = metrics, metrics.pop("fitness", job["fitness"])
+                if not self.best_fitness or self.best_fitness < self.fitness:
+                    self.best_fitness = self.fitness
+            self.save_metrics(metrics={**job["train"], **self.metrics, **job["lr"]}, epoch=job["epoch"])
+            self.stop |= self.stopper(job["epoch"] + 1, self.fitness)
+            if job.get("ckpt") and self.best_fitness == self.fitness:
+                self._save_best(job["ckpt"])
+
+    def _receive_val(self, wait=False):
+        """Stores the next 'val_async' result, waiting for it if 'wait', and returns whether one was received."""
+        process, _, results = self.val_worker
+        while True:
+            try:
+                epoch, metrics = results.get(timeout=1 if wait else 0.001)
+            except queue.Empty:
+                if not wait:
+                    return False
+                if not process.is_alive():
+                    raise RuntimeError(f"'val_async' validation process exited with code {process.exitcode}")
+                continue
+            self.val_results[epoch] = metrics
+            return True
+
+    def _start_val_worker(self):
+        """Starts the background process of 'val_async' validation and returns it with its job and result queues."""
+        ctx = mp.get_context("spawn")  # CUDA is not fork-safe
+        jobs, results = ctx.Queue(), ctx.Queue()
+        device = "cpu" if self.args.val_async is True else str(self.args.val_async)
+        model = deepcopy(self.ema.ema).float().cpu()
+        keys = list(self.label_loss_items(self.loss_items, prefix="val"))
+        loader = self.test_loader
+        loader = SimpleNamespace(dataset=loader.dataset, batch=loader.batch_size, workers=loader.num_workers)
+        process = ctx.Process(
+            target=_validate_async,
+            args=(type(self.validator), copy(self.validator.args), self.save_dir, self.data, loader, device),
+            kwargs={"model": model, "keys": keys, "jobs": jobs, "results": results},
+        )
+        process.start()
+        LOGGER.info(f"{colorstr('val_async:')} validating EMA snapshots on device={device} while training continues")
+        return process, jobs, results
+
+    def _save_best(self, serialized_ckpt):
+        """Saves the checkpoint of a 'val_async' epoch as best.pt with the metrics that arrived for it."""
+        import pandas as pd  # scope for faster startup
+
+        ckpt = torch.load(io.BytesIO(serialized_ckpt))
+        ckpt["best_fitness"] = self.best_fitness
+        ckpt["train_metrics"] = {**self.metrics, **{"fitness": self.fitness}}
+        ckpt["train_results"] = {k.strip(): v for k, v in pd.read_csv(self.csv).to_dict(orient="list").items()}
+        torch.save(ckpt, self.best)
+
     def get_model(self, cfg=None, weights=None, verbose=True):
         """Get model and raise NotImplementedError for loading cfg files."""
         raise NotImplementedError("This task trainer doesn't support loading cfg files")
@@ -601,13 +719,14 @@ class BaseTrainer:
         """Plots training labels for YOLO model."""
         pass
 
-    def save_metrics(self, metrics):
-        """Saves training metrics to a CSV file."""
+    def save_metrics(self, metrics, epoch=None):
+        """Saves training metrics of 'epoch', by default the current epoch, to a CSV file."""
         keys, vals = list(metrics.keys()), list(metrics.values())
         n = len(metrics) + 1  # number of cols
         s = "" if self.csv.exists() else (("%23s," * n % tuple(["epoch"] + keys)).rstrip(",") + "\n")  # header
+        epoch = self.epoch if epoch is None else epoch
         with open(self.csv, "a") as f:
-            f.write(s + ("%23.5g," * n % tuple([self.epoch + 1] + vals)).rstrip(",") + "\n")
+            f.write(s + ("%23.5g," * n % tuple([epoch + 1] + vals)).rstrip(",") + "\n")
 
     def plot_metrics(self):
         """Plot and display metrics visually."""
@@ -754,3 +873,32 @@ class BaseTrainer:
             f'{len(g[1])} weight(decay=0.0), {len(g[0])} weight(decay={decay}), {len(g[2])} bias(decay=0.0)'
         )
         return optimizer
+
+
+def _validate_async(validator, args, save_dir, data, loader, device, model, keys, jobs, results):
+    """Validates the EMA snapshots queued by BaseTrainer.validate_async() in a background process until None arrives."""
+    device = select_device(device)
+    workers = 0 if device.type in ("cpu", "mps") else loader.workers  # as in CPU validation
+    v = validator(build_dataloader(loader.dataset, loader.batch, workers, shuffle=False), save_dir=save_dir, args=args)
+    model = model.to(device)
+    trainer = SimpleNamespace(
+        device=device,
+        data=data,
+        model=model,
+        ema=SimpleNamespace(ema=model),
+        loss_items=torch.zeros(len(keys)),
+        label_loss_items=lambda x, prefix="val": dict(zip(keys, x.reshape(-1).tolist())),
+    )
+    while True:
+        try:
+            job = jobs.get(timeout=5)
+        except queue.Empty:
+            if mp.parent_process().is_alive():
+                continue
+            break  # training process is gone
+        if job is None:
+            break
+        trainer.epoch, trainer.epochs, possible_stop, state = job
+        trainer.stopper = SimpleNamespace(possible_stop=possible_stop)
+        model.load_state_dict(state)
+        results.put((trainer.epoch, v(trainer)))
@@ -21,8 +21,13 @@ Usage - formats:
 """
 
 import json
+import multiprocessing as mp
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
 from pathlib import Path
+from types import SimpleNamespace
 
 import numpy as np
 import torch
@@ -63,6 +68,7 @@ class BaseValidator:
         save_dir (Path): Directory to save results.
         plots (dict): Dictionary to store plots for visualization.
         callbacks (dict): Dictionary to store various callback functions.
+        threads (int): CPU threads of ONNX Runtime sessions, set in the shard processes of run_shards().
     """
 
     def __init__(self, dataloader=None, save_dir=None, pbar=None, args=None, _callbacks=None):
@@ -92,6 +98,7 @@ class BaseValidator:
         self.iouv = None
         self.jdict = None
         self.speed = {"preprocess": 0.0, "inference": 0.0, "loss": 0.0, "postprocess": 0.0}
+        self.threads = None
 
         self.save_dir = save_dir or get_save_dir(self.args)
         (self.save_dir / "labels" if self.args.save_txt else self.save_dir).mkdir(parents=True, exist_ok=True)
@@ -109,6 +116,7 @@ class BaseValidator:
         """
         self.training = trainer is not None
         augment = self.args.augment and (not self.training)
+        pad = False  # pad the last batch to the fixed batch-size of static exported models
         if self.training:
             self.device = trainer.device
             self.data = trainer.data
@@ -120,6 +128,10 @@ class BaseValidator:
             self.args.plots &= trainer.stopper.possible_stop or (trainer.epoch == trainer.epochs - 1)
             model.eval()
         else:
+            if self.args.shards > 1 and self.args.task != "detect":
+                raise NotImplementedError(f"sharded validation is not supported for task={self.args.task}")
+            if self.args.shards > 1 and self.args.shard is None:
+                return self.run_shards(model=model)
             callbacks.add_integration_callbacks(self)
             model = AutoBackend(
                 weights=model or self.args.model,
@@ -127,14 +139,21 @@ class BaseValidator:
                 dnn=self.args.dnn,
                 data=self.args.data,
                 fp16=self.args.half,
+                batch=self.args.batch,
+                threads=self.threads,
             )
             # self.model = model
             self.device = model.device  # update device
             self.args.half = model.fp16  # update half
             stride, pt, jit, engine = model.stride, model.pt, model.jit, model.engine
             imgsz = check_imgsz(self.args.imgsz, stride=stride)
-            if engine:
+            if engine or (model.onnx and not model.dnn) or model.xml:  # backends reporting their batch dimension
                 self.args.batch = model.batch_size
+                pad = not model.dynamic  # static batch, pad the last batch
+                LOGGER.info(
+                    f"Using {'dynamic' if model.dynamic else 'static'} batch={self.args.batch} square inference "
+                    f"({self.args.batch},3,{imgsz},{imgsz}) for non-PyTorch models"
+                )
             elif not pt and not jit:
                 self.args.batch = 1  # export.py models default to batch-size 1
                 LOGGER.info(f"Forcing batch=1 square inference (1,3,{imgsz},{imgsz}) for non-PyTorch models")
@@ -151,6 +170,8 @@ class BaseValidator:
             if not pt:
                 self.args.rect = False
             self.stride = model.stride  # used in get_dataloader() for padding
+            if self.args.val_cache:
+                return self.run_cached(model, pad)
             self.dataloader = self.dataloader or self.get_dataloader(self.data.get(self.args.split), self.args.batch)
 
             model.eval()
@@ -175,7 +196,7 @@ class BaseValidator:
 
             # Inference
             with dt[1]:
-                preds = model(batch["img"], augment=augment)
+                preds = self.infer(model, batch["img"], pad, augment)
 
             # Loss
             with dt[2]:
@@ -187,84 +208,159 @@ class BaseValidator:
                 preds = self.postprocess(preds)
 
             self.update_metrics(preds, batch)
-            if self.args.plots and batch_i < 3:
+            if self.args.plots and batch_i < 3 and not self.args.shard:  # first shard holds the first batches
                 self.plot_val_samples(batch, batch_i)
                 self.plot_predictions(batch, preds, batch_i)
 
             self.run_callbacks("on_val_batch_end")
+        self.speed = dict(zip(self.speed.keys(), (x.t / len(self.dataloader.dataset) * 1e3 for x in dt)))
+        if not self.training:
+            return self.summarize()
         stats = self.get_stats()
         self.check_stats(stats)
-        self.speed = dict(zip(self.speed.keys(), (x.t / len(self.dataloader.dataset) * 1e3 for x in dt)))
         self.finalize_metrics()
         if not (self.args.save_json and self.is_coco and len(self.jdict)):
             self.print_results()
         self.run_callbacks("on_val_end")
-        if self.training:
-            model.float()
-            if self.args.save_json and self.jdict:
-                with open(str(self.save_dir / "predictions.json"), "w") as f:
-                    LOGGER.info(f"Saving {f.name}...")
-                    json.dump(self.jdict, f)  # flatten and save
-                stats = self.eval_json(stats)  # update stats
-                stats['fitness'] = stats['metrics/mAP50-95(B)']
-            results = {**stats, **trainer.label_loss_items(self.loss.cpu() / len(self.dataloader), prefix="val")}
-            return {k: round(float(v), 5) for k, v in results.items()}  # return results as 5 decimal place floats
-        else:
-            LOGGER.info(
-                "Speed: %.1fms preprocess, %.1fms inference, %.1fms loss, %.1fms postprocess per image"
-                % tuple(self.speed.values())
-            )
-            if self.args.save_json and self.jdict:
-                with open(str(self.save_dir / "predictions.json"), "w") as f:
-                    LOGGER.info(f"Saving {f.name}...")
-                    json.dump(self.jdict, f)  # flatten and save
-                stats = self.eval_json(stats)  # update stats
-            if self.args.plots or self.args.save_json:
-                LOGGER.info(f"Results saved to {colorstr('bold', self.save_dir)}")
-            return stats
+        model.float()
+        if self.args.save_json and self.jdict:
+            with open(str(self.save_dir / "predictions.json"), "w") as f:
+                LOGGER.info(f"Saving {f.name}...")
+                json.dump(self.jdict, f)  # flatten and save
+            stats = self.eval_json(stats)  # update stats
+            stats['fitness'] = stats['metrics/mAP50-95(B)']
+        results = {**stats, **trainer.label_loss_items(self.loss.cpu() / len(self.dataloader), prefix="val")}
+        return {k: round(float(v), 5) for k, v in results.items()}  # return results as 5 decimal place floats
+
+    def infer(self, model, im, pad=False, augment=False):
+        """Runs the model on a batch of images, padded with the last image up to the static batch-size if 'pad'."""
+        n = len(im)
+        if pad and n < self.args.batch:  # repeat the last image up to the static batch-size
+            im = torch.cat((im, im[-1:].expand(self.args.batch - n, *im.shape[1:])))
+        preds = model(im, augment=augment)
+        return self.unpad(preds, n) if len(im) > n else preds  # drop padded rows before they reach the metrics
+
+    def summarize(self):
+        """Computes, prints and saves the final metrics of a standalone validation and returns its stats."""
+        stats = self.get_stats()
+        self.check_stats(stats)
+        self.finalize_metrics()
+        if not (self.args.save_json and self.is_coco and len(self.jdict)):
+            self.print_results()
+        self.run_callbacks("on_val_end")
+        LOGGER.info(
+            "Speed: %.1fms preprocess, %.1fms inference, %.1fms loss, %.1fms postprocess per image"
+            % tuple(self.speed.values())
+        )
+        if self.args.save_json and self.jdict:
+            with open(str(self.save_dir / "predictions.json"), "w") as f:
+                LOGGER.info(f"Saving {f.name}...")
+                json.dump(self.jdict, f)  # flatten and save
+            stats = self.eval_json(stats)  # update stats
+        if self.args.shard is not None:
+            torch.save(self.get_state(), self.save_dir / f"shard{self.args.shard}.pt")  # for run_shards(states)
+        if self.args.plots or self.args.save_json:
+            LOGGER.info(f"Results saved to {colorstr('bold', self.save_dir)}")
+        return stats
+
+    def run_shards(self, states=None, model=None):
+        """
+        Validates 'shards' disjoint shards of the dataset and reduces their metric states to the final metrics.
+
+        Without 'states' each shard runs in its own process of a local process pool, with the devices of 'device'
+        assigned round-robin and the CPU threads split between the processes. Shards validated elsewhere with 'shard=i',
+        e.g. on other machines, are reduced by passing their saved 'shard{i}.pt' states instead.
+
+        Args:
+            states (list, optional): Metric states or paths of saved states of all shards, in shard order.
+            model (torch.nn.Module | str, optional): Model to validate, sent to every shard process as a CPU copy of
+                an in-memory model. Defaults to None, loading 'model' from its path.
+
+        Returns:
+            (dict): Validation stats, identical to validating the dataset at once.
+        """
+        n = self.args.shards
+        if states is None:
+            devices = [None] if self.args.device is None else str(self.args.device).replace(" ", "").split(",")
+            threads = max((os.cpu_count() or 1) // n, 1)
+            cfgs = [{**vars(self.args), "shard": i, "device": devices[i % len(devices)]} for i in range(n)]
+            if isinstance(model, torch.nn.Module):  # e.g. trained or pruned in memory, not saved to 'model'
+                model = deepcopy(model).cpu()
+            LOGGER.info(f"{colorstr('val:')} validating {n} shards in {n} processes with {threads} CPU threads each")
+            with ProcessPoolExecutor(n, mp_context=mp.get_context("spawn")) as pool:  # CUDA/ONNX not fork-safe
+                args = [type(self)] * n, cfgs, [self.save_dir] * n, [threads] * n, [model] * n
+                states = list(pool.map(_validate_shard, *args))
+        states = [torch.load(x) if isinstance(x, (str, Path)) else x for x in states]
+        assert len(states) == n, f"expected {n} shard states but got {len(states)}"
+
+        self.training = False
+        self.data = check_det_dataset(self.args.data)
+        self.init_metrics(SimpleNamespace(names=states[0]["names"]))
+        for state in states:
+            self.merge_state(state)
+        self.speed = {k: sum(x["speed"][k] * x["seen"] for x in states) / max(self.seen, 1) for k in self.speed}
+        return self.summarize()
+
+    def get_state(self):
+        """Returns the mergeable metric state of a finished validation, e.g. of one dataset shard."""
+        raise NotImplementedError(f"sharded validation is not supported for task={self.args.task}")
+
+    def merge_state(self, state):
+        """Merges the metric state of one dataset shard into the metrics of this validator."""
+        raise NotImplementedError(f"sharded validation is not supported for task={self.args.task}")
+
+    def run_cached(self, model, pad=False):
+        """Validates from cached raw predictions of the model on the dataset, recording them first if missing."""
+        raise NotImplementedError(f"val_cache is not supported for task={self.args.task}")
 
     def match_predictions(self, pred_classes, true_classes, iou, use_scipy=False):
         """
         Matches predictions to ground truth objects (pred_classes, true_classes) using IoU.
 
+        Leading batch dimensions are supported, e.g. a whole padded batch with pred_classes (B, N), true_classes (B, M)
+        and iou (B, M, N), and are matched in one pass on the device of the inputs.
+
         Args:
             pred_classes (torch.Tensor): Predicted class indices of shape(N,).
             true_classes (torch.Tensor): Target class indices of shape(M,).
-            iou (torch.Tensor): An NxM tensor containing the pairwise IoU values for predictions and ground of truth
+            iou (torch.Tensor): An MxN tensor containing the pairwise IoU values for ground truth and predictions
             use_scipy (bool): Whether to use scipy for matching (more precise).
 
         Returns:
             (torch.Tensor): Correct tensor of shape(N,10) for 10 IoU thresholds.
         """
-        # Dx10 matrix, where D - detections, 10 - IoU thresholds
-        correct = np.zeros((pred_classes.shape[0], self.iouv.shape[0])).astype(bool)
         # LxD matrix where L - labels (rows), D - detections (columns)
-        correct_class = true_classes[:, None] == pred_classes
+        correct_class = true_classes[..., :, None] == pred_classes[..., None, :]
         iou = iou * correct_class  # zero out the wrong classes
-        iou = iou.cpu().numpy()
-        for i, threshold in enumerate(self.iouv.cpu().tolist()):
-            if use_scipy:
-                # WARNING: known issue that reduces mAP in https://github.com/ultralytics/ultralytics/pull/4708
-                import scipy  # scope import to avoid importing for all commands
-
+        if use_scipy:
+            # WARNING: known issue that reduces mAP in https://github.com/ultralytics/ultralytics/pull/4708
+            import scipy  # scope import to avoid importing for all commands
+
+            # Dx10 matrix, where D - detections, 10 - IoU thresholds
+            correct = np.zeros((pred_classes.shape[0], self.iouv.shape[0])).astype(bool)
+            iou = iou.cpu().numpy()
+            for i, threshold in enumerate(self.iouv.cpu().tolist()):
                 cost_matrix = iou * (iou >= threshold)
                 if cost_matrix.any():
                     labels_idx, detections_idx = scipy.optimize.linear_sum_assignment(cost_matrix, maximize=True)
                     valid = cost_matrix[labels_idx, detections_idx] > 0
                     if valid.any():
                         correct[detections_idx[valid], i] = True
-            else:
-                matches = np.nonzero(iou >= threshold)  # IoU > threshold and classes match
-                matches = np.array(matches).T
-                if matches.shape[0]:
-                    if matches.shape[0] > 1:
-                        matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
-                        matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                        # matches = matches[matches[:, 2].argsort()[::-1]]
-                        matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
-                    correct[matches[:, 1].astype(int), i] = True
-        return torch.tensor(correct, dtype=torch.bool, device=pred_classes.device)
-
+            return torch.tensor(correct, dtype=torch.bool, device=pred_classes.device)
+
+        # Greedy matching at all thresholds at once: every detection pairs with its highest-IoU label, and every
+        # label keeps the lowest-index detection paired with it at IoU >= threshold
+        *b, nl, nd = iou.shape
+        ni = self.iouv.shape[0]
+        correct = torch.zeros((*b, nd + 1, ni), dtype=torch.bool, device=iou.device)
+        if nl and nd:
+            best, label = iou.max(-2)  # (..., D) best IoU and label of each detection
+            valid = best[..., None] >= self.iouv.to(iou.device)  # (..., D, 10)
+            idx = torch.arange(nd, device=iou.device)[:, None].expand(valid.shape)
+            first = torch.full((*b, nl, ni), nd, dtype=torch.long, device=iou.device)
+            first.scatter_reduce_(-2, label[..., None].expand(valid.shape), idx.masked_fill(~valid, nd), "amin")
+            correct.scatter_(-2, first, True)
+        return correct[..., :nd, :]  # drop the row of unmatched labels
     def add_callback(self, event: str, callback):
         """Appends the given callback."""
         self.callbacks[event].append(callback)
@@ -290,6 +386,15 @@ class BaseValidator:
         """Describes and summarizes the purpose of 'postprocess()' but no details mentioned."""
         return preds
 
+    @staticmethod
+    def unpad(preds, n):
+        """Keeps the first n batch rows of raw model outputs, recursing into lists, tuples and dicts."""
+        if isinstance(preds, (list, tuple)):
+            return type(preds)(BaseValidator.unpad(x, n) for x in preds)
+        if isinstance(preds, dict):
+            return {k: BaseValidator.unpad(v, n) for k, v in preds.items()}
+        return preds[:n] if isinstance(preds, torch.Tensor) and preds.ndim else preds
+
     def init_metrics(self, model):
         """Initialize performance metrics for the YOLO model."""
         pass
@@ -343,3 +448,12 @@ class BaseValidator:
     def eval_json(self, stats):
         """Evaluate and return JSON format of prediction statistics."""
         pass
+
+
+def _validate_shard(validator, args, save_dir, threads, model=None):
+    """Validates one dataset shard in a process of BaseValidator.run_shards() and returns its metric state."""
+    torch.set_num_threads(threads)
+    v = validator(save_dir=save_dir, args=args)
+    v.threads = threads
+    v(model=model)
+    return v.get_state()
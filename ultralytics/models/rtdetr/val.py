@@ -113,6 +113,11 @@ class RTDETRValidator(DetectionValidator):
 
         return outputs
 
+    def cache_preds(self, preds):
+        """Returns all (B, 300, 4 + nc) decoder rows for the prediction cache, as evaluation keeps every query."""
+        preds = preds[0] if isinstance(preds, (list, tuple)) else preds
+        return preds, preds.new_ones(preds.shape[:2]), False
+
     def _prepare_batch(self, si, batch):
         """Prepares a batch for training or inference by applying transformations."""
         idx = batch["batch_idx"] == si
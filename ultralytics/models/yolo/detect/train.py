@@ -52,11 +52,14 @@ class DetectionTrainer(BaseTrainer):
             LOGGER.warning("WARNING ⚠️ 'rect=True' is incompatible with DataLoader shuffle, setting shuffle=False")
             shuffle = False
         workers = self.args.workers if mode == "train" else self.args.workers * 2
-        return build_dataloader(dataset, batch_size, workers, shuffle, rank)  # return dataloader
+        return build_dataloader(dataset, batch_size, workers, shuffle, rank, shared=self.args.shared_batches)
 
     def preprocess_batch(self, batch):
         """Preprocesses a batch of images by scaling and converting to float."""
         batch["img"] = batch["img"].to(self.device, non_blocking=True).float() / 255
+        augment = getattr(self.train_loader.dataset, "batch_augment", None)
+        if augment:  # gpu_augment
+            batch = augment(batch)
         if self.args.multi_scale:
             imgs = batch["img"]
             sz = (
@@ -1,17 +1,31 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 
+import hashlib
+import json
 import os
 from pathlib import Path
+from types import SimpleNamespace
 
 import numpy as np
 import torch
 
+from ultralytics.cfg import get_cfg
 from ultralytics.data import build_dataloader, build_yolo_dataset, converter
+from ultralytics.data.utils import get_hash
 from ultralytics.engine.validator import BaseValidator
-from ultralytics.utils import LOGGER, ops
-from ultralytics.utils.checks import check_requirements
-from ultralytics.utils.metrics import ConfusionMatrix, DetMetrics, box_iou
+from ultralytics.utils import LOGGER, TQDM, colorstr, ops
+from ultralytics.utils.metrics import (
+    COCOEval,
+    ConfHistogram,
+    ConfusionMatrix,
+    DetMetrics,
+    ErrorIndex,
+    box_iou,
+    operating_points,
+)
+from ultralytics.utils.ops import Profile
 from ultralytics.utils.plotting import output_to_target, plot_images
+from ultralytics.utils.torch_utils import de_parallel
 
 
 class DetectionValidator(BaseValidator):
@@ -67,7 +81,8 @@ class DetectionValidator(BaseValidator):
         val = self.data.get(self.args.split, "")  # validation path
         self.is_coco = isinstance(val, str) and "coco" in val and val.endswith(f"{os.sep}val2017.txt")  # is COCO
         self.class_map = converter.coco80_to_coco91_class() if self.is_coco else list(range(1000))
-        self.args.save_json |= self.is_coco  # run on final val if training COCO
+        if self.args.task != "detect":
+            self.args.save_json |= self.is_coco  # pycocotools evaluation of masks and keypoints on COCO
         self.names = model.names
         self.nc = len(model.names)
         self.metrics.names = self.names
@@ -75,7 +90,15 @@ class DetectionValidator(BaseValidator):
         self.confusion_matrix = ConfusionMatrix(nc=self.nc, conf=self.args.conf)
         self.seen = 0
         self.jdict = []
+        self.coco = COCOEval() if self.args.task == "detect" and (self.is_coco or self.args.save_json) else None
         self.stats = dict(tp=[], conf=[], pred_cls=[], target_cls=[])
+        self.image_stats = dict(conf=[], target=[])  # per-image class confidences and labels for 'target_recall'
+        self.errors = ErrorIndex(self.iouv.numpy()) if self.args.error_index and self.args.task == "detect" else None
+        self.hist = (
+            ConfHistogram(self.nc, self.niou, self.args.conf_bins, self.device)
+            if self.args.conf_bins and self.args.task == "detect"
+            else None
+        )  # constant-memory stats
 
     def get_desc(self):
         """Return a formatted string summarizing class metrics of YOLO model."""
@@ -116,63 +139,288 @@ class DetectionValidator(BaseValidator):
 
     def update_metrics(self, preds, batch):
         """Metrics."""
+        predns, bboxes, clss = [], [], []
         for si, pred in enumerate(preds):
             self.seen += 1
             npr = len(pred)
-            stat = dict(
-                conf=torch.zeros(0, device=self.device),
-                pred_cls=torch.zeros(0, device=self.device),
-                tp=torch.zeros(npr, self.niou, dtype=torch.bool, device=self.device),
-            )
             pbatch = self._prepare_batch(si, batch)
             cls, bbox = pbatch.pop("cls"), pbatch.pop("bbox")
-            nl = len(cls)
-            stat["target_cls"] = cls
             if npr == 0:
-                if nl:
-                    for k in self.stats.keys():
-                        self.stats[k].append(stat[k])
-                    if self.args.plots:
-                        self.confusion_matrix.process_batch(detections=None, gt_bboxes=bbox, gt_cls=cls)
+                predns.append(pred.float())
+                bboxes.append(bbox)
+                clss.append(cls)
                 continue
 
             # Predictions
             if self.args.single_cls:
                 pred[:, 5] = 0
             predn = self._prepare_pred(pred, pbatch)
-            stat["conf"] = predn[:, 4]
-            stat["pred_cls"] = predn[:, 5]
-
-            # Evaluate
-            if nl:
-                stat["tp"] = self._process_batch(predn, bbox, cls)
-                if self.args.plots:
-                    self.confusion_matrix.process_batch(predn, bbox, cls)
-            for k in self.stats.keys():
-                self.stats[k].append(stat[k])
+            predns.append(predn.float())
+            bboxes.append(bbox)
+            clss.append(cls)
 
             # Save
-            if self.args.save_json:
+            if self.args.save_json and not self.coco:
                 self.pred_to_json(predn, batch["im_file"][si])
             if self.args.save_txt:
                 file = self.save_dir / "labels" / f'{Path(batch["im_file"][si]).stem}.txt'
                 self.save_one_txt(predn, self.args.save_conf, pbatch["ori_shape"], file)
 
+        # Evaluate the whole batch at once, one append per batch instead of per image
+        predn = torch.cat(predns)
+        stat = dict(
+            tp=self._process_batches(predns, bboxes, clss),
+            conf=predn[:, 4],
+            pred_cls=predn[:, 5],
+            target_cls=torch.cat(clss),
+        )
+        if self.hist:
+            self.hist.update(**stat)
+        else:
+            for k in self.stats.keys():
+                self.stats[k].append(stat[k])
+        if self.args.plots:
+            i = [j for j, c in enumerate(clss) if len(c)]  # images with labels
+            self.confusion_matrix.process_batches([predns[j] for j in i], [bboxes[j] for j in i], [clss[j] for j in i])
+        if self.args.target_recall:
+            self._update_image_stats(predns, clss)
+        if self.coco:
+            self._update_coco(predns, bboxes, clss, batch["im_file"])
+        if self.errors:
+            self.errors.update(batch["im_file"], predns, bboxes, clss, stat["tp"])
+
+    def _update_image_stats(self, predns, clss):
+        """Appends the highest detection confidence and the label presence of each class in each image of a batch."""
+        b, device = len(predns), self.device
+        i = torch.arange(b, device=device).repeat_interleave(torch.tensor([len(x) for x in predns], device=device))
+        j = torch.arange(b, device=device).repeat_interleave(torch.tensor([len(x) for x in clss], device=device))
+        predn = torch.cat(predns)
+        conf = torch.zeros(b * self.nc, device=device).scatter_reduce_(
+            0, i * self.nc + predn[:, 5].long(), predn[:, 4], "amax"
+        )
+        target = torch.zeros(b * self.nc, dtype=torch.bool, device=device)
+        target[j * self.nc + torch.cat(clss).long()] = True
+        self.image_stats["conf"].append(conf.view(b, self.nc))
+        self.image_stats["target"].append(target.view(b, self.nc))
+
+    def _update_coco(self, predns, bboxes, clss, files):
+        """Adds the native-space detections and labels of each image of a batch to the COCO evaluator."""
+        class_map = np.asarray(self.class_map)
+        for predn, bbox, cls, f in zip(predns, bboxes, clss, files):
+            stem = Path(f).stem
+            det = predn.cpu().numpy()
+            det[:, 5] = class_map[det[:, 5].astype(int)]
+            cls = class_map[cls.cpu().numpy().astype(int)]
+            self.coco.add(int(stem) if stem.isnumeric() else stem, det, bbox.cpu().numpy(), cls)
+
     def finalize_metrics(self, *args, **kwargs):
         """Set final values for metrics speed and confusion matrix."""
         self.metrics.speed = self.speed
         self.metrics.confusion_matrix = self.confusion_matrix
+        if self.args.target_recall and not self.training:
+            self.save_operating_points()
+        if self.errors and not self.training and self.args.shard is None:
+            f = self.save_dir / "error_index.npz"
+            self.errors.save(f)
+            LOGGER.info(f"{colorstr('error index:')} {len(self.errors.files)} images saved to {f}")
+
+    def save_operating_points(self):
+        """Saves per-class image-level alarm thresholds reaching 'target_recall' to operating_point.json."""
+        conf, target = (torch.cat(v).cpu().numpy() for v in self.image_stats.values())
+        points = operating_points(
+            conf, target, self.args.target_recall, self.args.plots, self.on_plot, self.save_dir, self.names
+        )
+        box, prefix = self.metrics.box, colorstr("operating point:")
+        for c, point in points.items():
+            if c in box.ap_class_index:  # box-level precision and recall at the alarm threshold
+                i = list(box.ap_class_index).index(c)
+                point["box_precision"] = float(np.interp(point["conf"], box.px, box.p_curve[i]))
+                point["box_recall"] = float(np.interp(point["conf"], box.px, box.r_curve[i]))
+            LOGGER.info(
+                f"{prefix} {self.names[c]} conf={point['conf']:.4f}, image recall {point['recall']:.3f}, "
+                f"false alarm rate {point['false_alarm_rate']:.3f}"
+            )
+        f = self.save_dir / "operating_point.json"
+        with open(f, "w") as file:
+            json.dump(
+                dict(
+                    model=str(self.args.model),
+                    data=str(self.args.data),
+                    imgsz=self.args.imgsz,
+                    target_recall=self.args.target_recall,
+                    classes={str(c): dict(name=self.names[c], **point) for c, point in points.items()},
+                ),
+                file,
+                indent=2,
+            )
+        LOGGER.info(f"{prefix} saved to {f}")
 
     def get_stats(self):
         """Returns metrics statistics and results dictionary."""
-        stats = {k: torch.cat(v, 0).cpu().numpy() for k, v in self.stats.items()}  # to numpy
-        if len(stats) and stats["tp"].any():
-            self.metrics.process(**stats)
-        self.nt_per_class = np.bincount(
-            stats["target_cls"].astype(int), minlength=self.nc
-        )  # number of targets per class
+        if self.hist:
+            if self.hist.tp.any():
+                self.metrics.process_hist(self.hist)
+            self.nt_per_class = self.hist.nt.cpu().numpy()  # number of targets per class
+        else:
+            stats = {k: torch.cat(v, 0).cpu().numpy() for k, v in self.stats.items()}  # to numpy
+            if len(stats) and stats["tp"].any():
+                self.metrics.process(**stats)
+            self.nt_per_class = np.bincount(
+                stats["target_cls"].astype(int), minlength=self.nc
+            )  # number of targets per class
+        if self.coco and self.args.shard is None:  # sharded runs evaluate once merged
+            return self.eval_coco(self.metrics.results_dict)
         return self.metrics.results_dict
 
+    def eval_coco(self, stats):
+        """
+        Computes the 12 COCO metrics from the in-memory predictions, streaming them to predictions.json if 'save_json'.
+
+        On COCO, labels are read from the dataset annotations JSON, with crowd boxes and segment areas, and mAP50-95 and
+        mAP50 are replaced by their COCO values, elsewhere the labels of the validation dataset are used.
+        """
+        if self.args.save_json:
+            f = self.save_dir / "predictions.json"
+            LOGGER.info(f"Saving {f}...")
+            self.coco.save_json(f)
+        if self.is_coco:
+            anno_json = self.data["path"] / "annotations/instances_val2017.json"  # annotations
+            if not anno_json.is_file():
+                LOGGER.warning(f"WARNING ⚠️ COCO evaluation skipped, {anno_json} file not found")
+                return stats
+            self.coco.load_annotations(anno_json)
+        LOGGER.info(f"\nEvaluating COCO metrics of {len(self.coco.ids)} images...")
+        self.coco.evaluate()
+        LOGGER.info(self.coco.summary())
+        if self.is_coco:
+            # update mAP50-95 and mAP50
+            stats[self.metrics.keys[-1]], stats[self.metrics.keys[-2]] = self.coco.stats[:2]
+        if self.training:
+            stats["fitness"] = stats[self.metrics.keys[-1]]
+        return stats
+
+    def get_state(self):
+        """Returns the mergeable metric state of a finished validation as CPU tensors and lists, e.g. of one shard."""
+        errors = zip(("det", "label"), self.errors.columns()) if self.errors else ()
+        return dict(
+            names=self.names,
+            seen=self.seen,
+            speed=self.speed,
+            stats={k: [x.cpu() for x in v] for k, v in self.stats.items()},
+            hist={k: getattr(self.hist, k).cpu() for k in ("tp", "n", "nt")} if self.hist else None,
+            confusion=torch.from_numpy(self.confusion_matrix.matrix),
+            jdict=self.jdict,
+            coco=(
+                dict(
+                    ids=self.coco.ids,
+                    **{k: [torch.from_numpy(x) for x in getattr(self.coco, k)] for k in ("dets", "gts")},
+                )
+                if self.coco
+                else None
+            ),
+            image_stats={k: [x.cpu() for x in v] for k, v in self.image_stats.items()},
+            errors=(
+                dict(files=self.errors.files, **{k: {c: torch.from_numpy(x) for c, x in v.items()} for k, v in errors})
+                if self.errors
+                else None
+            ),
+        )
+
+    def merge_state(self, state):
+        """Merges the metric state of one dataset shard, merging shards in order reproduces the unsharded metrics."""
+        self.seen += state["seen"]
+        for k, v in state["stats"].items():
+            self.stats[k].extend(v)
+        if self.hist:
+            self.hist.merge(SimpleNamespace(**state["hist"]))
+        self.confusion_matrix.merge(SimpleNamespace(matrix=state["confusion"].numpy()))
+        self.jdict.extend(state["jdict"])
+        if self.coco:
+            coco = state["coco"]
+            self.coco.merge(
+                SimpleNamespace(ids=coco["ids"], **{k: [x.numpy() for x in coco[k]] for k in ("dets", "gts")})
+            )
+        for k, v in state["image_stats"].items():
+            self.image_stats[k].extend(v)
+        if self.errors:
+            errors = state["errors"]
+            self.errors.merge(
+                SimpleNamespace(
+                    files=errors["files"],
+                    **{k: {c: [x.numpy()] for c, x in errors[k].items()} for k in ("det", "label")},
+                )
+            )
+
+    def run_cached(self, model, pad=False):
+        """
+        Validates from cached raw predictions of the model on the dataset, recording them first if missing.
+
+        The cache is keyed by the model weights and the dataset files, so later validations with another 'conf' (not
+        below the recording 'conf'), 'iou', 'max_det', 'classes' or 'single_cls' only re-run postprocessing and metrics.
+
+        Args:
+            model (AutoBackend): Loaded model, only run when recording.
+            pad (bool): Pad the last batch to the static batch-size of the model.
+
+        Returns:
+            (dict): Validation stats.
+        """
+        if self.args.task != "detect":
+            raise NotImplementedError(f"val_cache is not supported for task={self.args.task}")
+        args, self.args = self.args, get_cfg(self.args, dict(classes=None, single_cls=False))  # cache all labels
+        dataset = self.build_dataset(self.data.get(self.args.split), batch=self.args.batch, mode="val")
+        self.args = args
+        self.run_callbacks("on_val_start")
+        self.init_metrics(de_parallel(model))
+        cache = PredictionCache(self.save_dir.parent / "val_cache" / self.pred_cache_key(model, dataset))
+        if not cache.load(self.args.conf):
+            LOGGER.info(f"{colorstr('val_cache:')} recording raw predictions to {cache.path}")
+            model.eval()
+            loader = build_dataloader(dataset, self.args.batch, self.args.workers, shuffle=False, rank=-1)
+            cache.record(self.raw_batches(model, loader, pad), self.args.conf)
+        else:
+            LOGGER.info(f"{colorstr('val_cache:')} re-scoring raw predictions from {cache.path}")
+
+        dt = Profile(device=self.device)
+        for rows, transposed, batch in TQDM(cache.batches(self.args.batch, self.args.classes, self.args.single_cls)):
+            with dt:
+                batch = self.preprocess(batch)
+                preds = self.postprocess(self.uncache_preds(rows.to(self.device), transposed))
+            self.update_metrics(preds, batch)
+        self.speed = {**dict.fromkeys(self.speed, 0.0), "postprocess": dt.t / max(self.seen, 1) * 1e3}
+        return self.summarize()
+
+    def raw_batches(self, model, dataloader, pad=False):
+        """Yields raw prediction rows and scores of cache_preds() with each preprocessed batch, for PredictionCache."""
+        for batch in TQDM(dataloader, desc=f"{colorstr('val_cache:')} recording"):
+            batch = self.preprocess(batch)
+            yield (*self.cache_preds(self.infer(model, batch["img"], pad, self.args.augment)), batch)
+
+    def cache_preds(self, preds):
+        """Returns raw predictions as (B, N, C) rows, their (B, N) scores and whether rows are transposed outputs."""
+        preds = (preds[0] if isinstance(preds, (list, tuple)) else preds).transpose(-1, -2)  # (B, A, 4 + nc)
+        return preds, preds[..., 4 : 4 + self.nc].amax(-1), True
+
+    def uncache_preds(self, rows, transposed):
+        """Returns raw predictions from (B, N, C) cached rows as postprocess() inputs, inverting cache_preds()."""
+        return rows.transpose(-1, -2) if transposed else rows
+
+    def pred_cache_key(self, model, dataset):
+        """Returns the cache key of raw predictions from the model weights, the dataset files and preprocessing args."""
+        h = hashlib.sha256()
+        if model.pt:
+            for v in model.model.state_dict().values():
+                h.update(v.cpu().numpy().tobytes())
+        else:
+            w = Path(self.args.model)
+            for f in sorted(w.rglob("*")) if w.is_dir() else [w]:
+                if f.is_file():
+                    h.update(f.read_bytes())
+        h.update(get_hash(dataset.label_files + dataset.im_files).encode())
+        a = self.args
+        h.update(str((a.split, a.imgsz, a.batch, a.rect, a.half, a.augment, a.dnn)).encode())
+        return h.hexdigest()[:16]
+
     def print_results(self):
         """Prints training/validation set metrics per class."""
         pf = "%22s" + "%11i" * 2 + "%11.3g" * len(self.metrics.keys)  # print format
@@ -207,6 +455,25 @@ class DetectionValidator(BaseValidator):
         iou = box_iou(gt_bboxes, detections[:, :4])
         return self.match_predictions(detections[:, 5], gt_cls, iou)
 
+    def _process_batches(self, detections, gt_bboxes, gt_cls):
+        """
+        Return the correct prediction matrix of a whole batch, matched on-device as one padded problem.
+
+        Args:
+            detections (List[torch.Tensor]): Per-image detections of shape [N, 6], x1, y1, x2, y2, conf, class.
+            gt_bboxes (List[torch.Tensor]): Per-image ground truth boxes of shape [M, 4], x1, y1, x2, y2.
+            gt_cls (List[torch.Tensor]): Per-image ground truth class indices of shape [M].
+
+        Returns:
+            (torch.Tensor): Correct prediction matrix of shape [sum(N), 10] for 10 IoU levels.
+        """
+        n = torch.tensor([len(x) for x in detections], device=self.device)
+        pad = torch.nn.utils.rnn.pad_sequence
+        det = pad(detections, batch_first=True, padding_value=-2.0)  # (B, N, 6), padded rows: empty boxes, class -2
+        iou = box_iou(pad(gt_bboxes, batch_first=True), det[..., :4])  # (B, M, N)
+        correct = self.match_predictions(det[..., 5], pad(gt_cls, batch_first=True, padding_value=-1.0), iou)
+        return correct[torch.arange(det.shape[1], device=self.device) < n[:, None]]  # (sum(N), 10)
+
     def build_dataset(self, img_path, mode="val", batch=None):
         """
         Build YOLO Dataset.
@@ -221,7 +488,9 @@ class DetectionValidator(BaseValidator):
     def get_dataloader(self, dataset_path, batch_size):
         """Construct and return dataloader."""
         dataset = self.build_dataset(dataset_path, batch=batch_size, mode="val")
-        return build_dataloader(dataset, batch_size, self.args.workers, shuffle=False, rank=-1)  # return dataloader
+        return build_dataloader(
+            dataset, batch_size, self.args.workers, shuffle=False, rank=-1, shared=self.args.shared_batches
+        )  # return dataloader
 
     def plot_val_samples(self, batch, ni):
         """Plot validation image samples."""
@@ -256,44 +525,100 @@ class DetectionValidator(BaseValidator):
             with open(file, "a") as f:
                 f.write(("%g " * len(line)).rstrip() % line + "\n")
 
-    def pred_to_json(self, predn, filename):
-        """Serialize YOLO predictions to COCO json format."""
-        stem = Path(filename).stem
-        image_id = int(stem) if stem.isnumeric() else stem
-        box = ops.xyxy2xywh(predn[:, :4])  # xywh
-        box[:, :2] -= box[:, 2:] / 2  # xy center to top-left corner
-        for p, b in zip(predn.tolist(), box.tolist()):
-            self.jdict.append(
-                {
-                    "image_id": image_id,
-                    "category_id": self.class_map[int(p[5])],
-                    "bbox": [round(x, 3) for x in b],
-                    "score": round(p[4], 5),
-                }
-            )
 
-    def eval_json(self, stats):
-        """Evaluates YOLO output in JSON format and returns performance statistics."""
-        if self.args.save_json and self.is_coco and len(self.jdict):
-            anno_json = self.data["path"] / "annotations/instances_val2017.json"  # annotations
-            pred_json = self.save_dir / "predictions.json"  # predictions
-            LOGGER.info(f"\nEvaluating pycocotools mAP using {pred_json} and {anno_json}...")
-            try:  # https://github.com/cocodataset/cocoapi/blob/master/PythonAPI/pycocoEvalDemo.ipynb
-                check_requirements("pycocotools>=2.0.6")
-                from pycocotools.coco import COCO  # noqa
-                from pycocotools.cocoeval import COCOeval  # noqa
-
-                for x in anno_json, pred_json:
-                    assert x.is_file(), f"{x} file not found"
-                anno = COCO(str(anno_json))  # init annotations api
-                pred = anno.loadRes(str(pred_json))  # init predictions api (must pass string, not Path)
-                eval = COCOeval(anno, pred, "bbox")
-                if self.is_coco:
-                    eval.params.imgIds = [int(Path(x).stem) for x in self.dataloader.dataset.im_files]  # images to eval
-                eval.evaluate()
-                eval.accumulate()
-                eval.summarize()
-                stats[self.metrics.keys[-1]], stats[self.metrics.keys[-2]] = eval.stats[:2]  # update mAP50-95 and mAP50
-            except Exception as e:
-                LOGGER.warning(f"pycocotools unable to run: {e}")
-        return stats
+class PredictionCache:
+    """
+    Columnar on-disk cache of the raw per-image predictions and labels of a validation dataset.
+
+    Prediction rows (N, C) and label rows (M, 5) of all images are appended to flat float32 files that are memory-mapped
+    when replayed, with per-image counts and letterbox metadata in 'index.npz', which is written last and marks a
+    complete cache. Rows scoring at or below the recording 'conf' are not stored, so a cache replays any higher 'conf'.
+
+    Attributes:
+        path (Path): Cache directory.
+        index (dict): Per-image arrays and metadata of a complete cache, None before load() or record().
+    """
+
+    def __init__(self, path):
+        """Initializes a cache in the given directory."""
+        self.path = Path(path)
+        self.index = None
+
+    def load(self, conf):
+        """Loads the index of a complete cache recorded at or below 'conf' and returns True, else returns False."""
+        f = self.path / "index.npz"
+        if not f.exists():
+            return False
+        index = dict(np.load(f))
+        if conf < index["conf"]:
+            LOGGER.warning(f"WARNING ⚠️ val_cache recorded at conf={index['conf']:g} can not re-score conf={conf:g}")
+            return False
+        self.index = index
+        return True
+
+    def record(self, batches, conf):
+        """Records (rows, scores, transposed, batch) tuples of raw (B, N, C) prediction rows, their scores and batch."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / "index.npz").unlink(missing_ok=True)  # incomplete until the index is written
+        index = {k: [] for k in ("npred", "nlabel", "ori_shape", "imgsz", "ratio_pad", "im_file")}
+        c, transposed = 0, True
+        with open(self.path / "preds.bin", "wb") as fp, open(self.path / "labels.bin", "wb") as fl:
+            for rows, scores, transposed, batch in batches:
+                keep, rows, c = (scores > conf).cpu(), rows.float().cpu(), rows.shape[-1]
+                labels = torch.cat((batch["cls"].view(-1, 1), batch["bboxes"]), 1).float().cpu()
+                bi = batch["batch_idx"].cpu()
+                for i in range(len(rows)):
+                    r, lb = rows[i][keep[i]].numpy(), labels[bi == i].numpy()
+                    fp.write(r.tobytes())
+                    fl.write(lb.tobytes())
+                    ratio, pad = batch["ratio_pad"][i]
+                    index["npred"].append(len(r))
+                    index["nlabel"].append(len(lb))
+                    index["ori_shape"].append(batch["ori_shape"][i])
+                    index["imgsz"].append(batch["img"].shape[2:])
+                    index["ratio_pad"].append((*ratio, *pad))
+                    index["im_file"].append(batch["im_file"][i])
+        index = {k: np.array(v) for k, v in index.items()}
+        np.savez(self.path / "index.npz", conf=conf, channels=c, transposed=transposed, **index)
+        self.index = dict(np.load(self.path / "index.npz"))
+
+    def _memmap(self, name, n, c):
+        """Returns the (n, c) float32 rows of a cache file, memory-mapped."""
+        return np.memmap(self.path / name, np.float32, "r", shape=(n, c)) if n else np.zeros((0, c), np.float32)
+
+    def batches(self, batch_size, classes=None, single_cls=False):
+        """
+        Yields recorded (rows, transposed, batch) tuples, labels filtered by 'classes' and 'single_cls' as in datasets.
+
+        Batches hold up to 'batch_size' consecutive images of the same letterboxed size, and prediction rows are
+        zero-padded to the same count, at least 8 so that short rows are never mistaken for (B, N, 6) outputs.
+        """
+        x = self.index
+        po, lo = np.cumsum(x["npred"]) - x["npred"], np.cumsum(x["nlabel"]) - x["nlabel"]
+        preds = self._memmap("preds.bin", x["npred"].sum(), int(x["channels"]))
+        labels = self._memmap("labels.bin", x["nlabel"].sum(), 5)
+        i, n = 0, len(x["npred"])
+        while i < n:
+            j = i + 1
+            while j < min(i + batch_size, n) and (x["imgsz"][j] == x["imgsz"][i]).all():
+                j += 1
+            rows = np.zeros((j - i, max(x["npred"][i:j].max(), 8), preds.shape[1]), np.float32)
+            for k in range(i, j):
+                rows[k - i, : x["npred"][k]] = preds[po[k] : po[k] + x["npred"][k]]
+            lb = [np.array(labels[lo[k] : lo[k] + x["nlabel"][k]]) for k in range(i, j)]
+            if classes is not None:
+                lb = [y[np.isin(y[:, 0], classes)] for y in lb]
+            if single_cls:
+                for y in lb:
+                    y[:, 0] = 0
+            batch = dict(
+                img=torch.empty((j - i, 0, *x["imgsz"][i])),  # letterboxed shape only
+                batch_idx=torch.from_numpy(np.repeat(np.arange(j - i), [len(y) for y in lb])).float(),
+                cls=torch.from_numpy(np.concatenate(lb)[:, :1]),
+                bboxes=torch.from_numpy(np.concatenate(lb)[:, 1:]),
+                ori_shape=[tuple(s) for s in x["ori_shape"][i:j].tolist()],
+                ratio_pad=[(tuple(r[:2]), tuple(r[2:])) for r in x["ratio_pad"][i:j].tolist()],
+                im_file=x["im_file"][i:j].tolist(),
+            )
+            yield torch.from_numpy(rows), bool(x["transposed"]), batch
+            i = j
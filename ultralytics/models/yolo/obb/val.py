@@ -67,6 +67,15 @@ class OBBValidator(DetectionValidator):
         iou = batch_probiou(gt_bboxes, torch.cat([detections[:, :4], detections[:, -1:]], dim=-1))
         return self.match_predictions(detections[:, 5], gt_cls, iou)
 
+    def _process_batches(self, detections, gt_bboxes, gt_cls):
+        """Return the correct prediction matrix of a whole batch, matching rotated boxes image by image."""
+        return torch.cat(
+            [
+                self._process_batch(d, b, c) if len(d) and len(c) else d.new_zeros(len(d), self.niou, dtype=torch.bool)
+                for d, b, c in zip(detections, gt_bboxes, gt_cls)
+            ]
+        )
+
     def _prepare_batch(self, si, batch):
         """Prepares and returns a batch for OBB validation."""
         idx = batch["batch_idx"] == si
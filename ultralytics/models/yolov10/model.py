@@ -23,6 +23,15 @@ class YOLOv10(Model, PyTorchModelHubMixin, model_card_template=card_template_tex
         kwargs['config'] = config
         super().push_to_hub(repo_name, **kwargs)
 
+    def prune(self, target_gflops=None, target_latency=None, **kwargs):
+        """Prunes channels in fine-tuned rounds until the GFLOPs or latency target is met, see YOLOv10Pruner."""
+        self._check_is_pytorch_model()
+        from .prune import YOLOv10Pruner
+
+        args = {**self.overrides, **kwargs}
+        self.model = YOLOv10Pruner(self.model, target_gflops, target_latency, **args)()
+        return self.model
+
     @property
     def task_map(self):
         """Map head to model, trainer, validator, and predictor classes."""
@@ -0,0 +1,268 @@
+# Ultralytics YOLO 🚀, AGPL-3.0 license
+"""
+Structured channel pruning for YOLOv10 detection models with iterative fine-tuning towards a GFLOPs or latency target.
+
+Channels are removed in coupled groups so that every tensor edge stays consistent: the two C2f/C2fCIB split halves and
+their residual chain into the concat of cv2, Bottleneck and CIB hidden channels (including the depth-wise and RepVGGDW
+convs), the PSA feed-forward, the SCDown outputs together with all downstream Concat/C2f inputs, and the hidden convs of
+both the one2many and one2one v10Detect heads. Channel importance is the BatchNorm scale magnitude summed over each
+group.
+
+Usage:
+    from ultralytics import YOLOv10
+
+    model = YOLOv10("runs/detect/insulator_detect2/weights/best.pt")
+    model.prune(data="insulator.yaml", target_gflops=8.0, ratio=0.1, epochs=10, imgsz=640, batch=12)
+"""
+
+from copy import deepcopy
+
+import torch
+import torch.nn as nn
+
+from ultralytics.nn.modules import PSA, SPPF, C2f, Concat, Conv, RepVGGDW, SCDown, v10Detect
+from ultralytics.nn.modules.block import CIB
+from ultralytics.nn.tasks import attempt_load_one_weight
+from ultralytics.utils import LOGGER, colorstr
+from ultralytics.utils.torch_utils import get_flops, get_flops_with_torch_profiler, time_sync
+
+from .train import YOLOv10DetectionTrainer
+
+
+def _sources(m):
+    """Returns the absolute indices of the layers feeding layer 'm'."""
+    return [x if x >= 0 else m.i + x for x in ([m.f] if isinstance(m.f, int) else m.f)]
+
+
+def _width(layers, i):
+    """Returns the output channels of layer 'i'."""
+    m = layers[i]
+    if isinstance(m, Concat):
+        return sum(_width(layers, j) for j in _sources(m))
+    if isinstance(m, nn.Upsample):
+        return _width(layers, _sources(m)[0])
+    return (m.cv2 if hasattr(m, "cv2") else m).conv.out_channels
+
+
+def _consumers(layers, i, offset=0):
+    """Returns the input slots of all layers fed by layer 'i' at channel 'offset', or None if any cannot be pruned."""
+    slots = []
+    for m in layers[i + 1 :]:
+        src = _sources(m)
+        for k, j in enumerate(src):
+            if j != i:
+                continue
+            if isinstance(m, Concat):
+                s = _consumers(layers, m.i, offset + sum(_width(layers, x) for x in src[:k]))
+            elif isinstance(m, nn.Upsample):
+                s = _consumers(layers, m.i, offset)
+            elif isinstance(m, (C2f, SCDown, SPPF, PSA)):
+                s = [("in", m.cv1, offset)]
+            elif type(m) is Conv and m.conv.groups == 1:
+                s = [("in", m, offset)]
+            else:
+                s = None
+            if s is None:
+                return None
+            slots += s
+    return slots
+
+
+def _dw(m):
+    """Returns the depth-wise slots of a depth-wise Conv or RepVGGDW module."""
+    return [("dw", m.conv, 0), ("dw", m.conv1, 0)] if isinstance(m, RepVGGDW) else [("dw", m, 0)]
+
+
+def channel_groups(model):
+    """
+    Returns the coupled prunable channel groups of a YOLOv10 detection model.
+
+    Args:
+        model (YOLOv10DetectionModel): Unfused model.
+
+    Returns:
+        (list): (n, slots) tuples, where 'slots' is a list of (kind, module, offset) entries that all share the same 'n'
+            channels. The 'kind' is 'out' or 'in' for the output or input channels of a Conv or nn.Conv2d, and 'dw' for
+            both channel axes of a depth-wise Conv.
+    """
+    layers = model.model
+    groups = []
+    for i, m in enumerate(layers):
+        if isinstance(m, C2f):  # includes C2fCIB
+            c = m.c
+            cur = [("out", m.cv1, 0), ("in", m.cv2, 0), ("out", m.cv1, c), ("in", m.cv2, c)]  # both split halves
+            groups.append((c, cur))
+            for j, b in enumerate(m.m):
+                if isinstance(b, CIB):
+                    cur += [("dw", b.cv1[0], 0), ("in", b.cv1[1], 0)]
+                    out = [("out", b.cv1[3], 0), ("dw", b.cv1[4], 0)]
+                    hidden = [("out", b.cv1[1], 0), *_dw(b.cv1[2]), ("in", b.cv1[3], 0)]
+                else:
+                    cur += [("in", b.cv1, 0)]
+                    out = [("out", b.cv2, 0)]
+                    hidden = [("out", b.cv1, 0), ("in", b.cv2, 0)]
+                groups.append((hidden[0][1].conv.out_channels, hidden))
+                if not b.add:  # block output starts a new group, otherwise tied to its input by the residual
+                    cur = []
+                    groups.append((c, cur))
+                cur += [*out, ("in", m.cv2, (2 + j) * c)]
+        elif isinstance(m, PSA):
+            groups.append((m.ffn[0].conv.out_channels, [("out", m.ffn[0], 0), ("in", m.ffn[1], 0)]))
+        elif isinstance(m, SCDown):
+            slots = _consumers(layers, i)
+            if slots:
+                groups.append((m.cv1.conv.out_channels, [("out", m.cv1, 0), ("dw", m.cv2, 0), *slots]))
+        elif isinstance(m, v10Detect):
+            for box, cls in zip((*m.cv2, *m.one2one_cv2), (*m.cv3, *m.one2one_cv3)):  # one2many and one2one heads
+                groups += [
+                    (box[0].conv.out_channels, [("out", box[0], 0), ("in", box[1], 0)]),
+                    (box[1].conv.out_channels, [("out", box[1], 0), ("in", box[2], 0)]),
+                    (cls[0][1].conv.out_channels, [("out", cls[0][1], 0), ("dw", cls[1][0], 0), ("in", cls[1][1], 0)]),
+                    (cls[1][1].conv.out_channels, [("out", cls[1][1], 0), ("in", cls[2], 0)]),
+                ]
+    return groups
+
+
+def _importance(slots, n):
+    """Returns the channel importance of a group as the sum of mean-normalized BatchNorm scale magnitudes."""
+    score = 0
+    for kind, m, offset in slots:
+        if kind != "in":
+            w = m.bn.weight.detach().abs()[offset : offset + n].float()
+            score = score + w / (w.mean() + 1e-9)
+    return score
+
+
+@torch.no_grad()
+def prune_channels(model, ratio=0.1, round_to=16):
+    """
+    Removes the lowest-importance channels of every coupled channel group of a YOLOv10 detection model in place.
+
+    Args:
+        model (YOLOv10DetectionModel): Unfused model to prune.
+        ratio (float): Fraction of channels to remove from each group, rounded to a multiple of 'round_to'.
+        round_to (int): Kept channels are rounded to this multiple, 16 matches the Ascend cube unit.
+
+    Returns:
+        (YOLOv10DetectionModel): The pruned model.
+    """
+    masks = {}
+    for n, slots in channel_groups(model):
+        k = min(n, max(round_to, round(n * (1 - ratio) / round_to) * round_to))
+        if k == n:  # too narrow to remove 'ratio' of the channels in multiples of 'round_to'
+            continue
+        keep = torch.zeros(n, dtype=torch.bool)
+        keep[_importance(slots, n).argsort(descending=True)[:k].cpu()] = True
+        for kind, m, offset in slots:
+            conv = m.conv if isinstance(m, Conv) else m
+            for axis in ("out", "in") if kind == "dw" else (kind,):
+                size = conv.out_channels if axis == "out" else conv.in_channels
+                mask = masks.setdefault((id(m), axis), (m, torch.ones(size, dtype=torch.bool)))[1]
+                mask[offset : offset + n] &= keep
+
+    for (_, axis), (m, mask) in masks.items():
+        conv = m.conv if isinstance(m, Conv) else m
+        mask = mask.to(conv.weight.device)
+        if axis == "out":
+            conv.weight = nn.Parameter(conv.weight.data[mask].clone())
+            if conv.bias is not None:
+                conv.bias = nn.Parameter(conv.bias.data[mask].clone())
+            conv.out_channels = int(mask.sum())
+            if isinstance(m, Conv):
+                bn = m.bn
+                bn.weight = nn.Parameter(bn.weight.data[mask].clone())
+                bn.bias = nn.Parameter(bn.bias.data[mask].clone())
+                bn.running_mean, bn.running_var = bn.running_mean[mask], bn.running_var[mask]
+                bn.num_features = conv.out_channels
+        elif conv.groups > 1:  # depth-wise, weight already pruned on the output axis
+            conv.in_channels = conv.groups = int(mask.sum())
+        else:
+            conv.weight = nn.Parameter(conv.weight.data[:, mask].clone())
+            conv.in_channels = int(mask.sum())
+
+    for m in model.modules():
+        if isinstance(m, C2f):
+            m.c = m.cv1.conv.out_channels // 2
+        elif isinstance(m, RepVGGDW):
+            m.dim = m.conv.conv.out_channels
+    model.pruned = True  # trainers reuse the pruned module instead of rebuilding it from its yaml
+    return model
+
+
+class YOLOv10Pruner:
+    """
+    Iteratively prunes a YOLOv10 detection model with short fine-tuning rounds until a GFLOPs or latency target is met.
+
+    Attributes:
+        model (YOLOv10DetectionModel): The model being pruned.
+        target_gflops (float, optional): Stop once the model is at or below this many GFLOPs.
+        target_latency (float, optional): Stop once the latency in milliseconds is at or below this value.
+        ratio (float): Fraction of channels removed from each group per round.
+        round_to (int): Kept channel counts are rounded to this multiple.
+        rounds (int): Maximum number of prune and fine-tune rounds.
+        latency_fn (callable, optional): Returns the latency in ms of a fused model, i.e. measured on the Atlas board.
+            Defaults to batch-1 PyTorch inference on the training device.
+        args (dict): Fine-tuning arguments for YOLOv10DetectionTrainer, i.e. data, epochs, imgsz, batch.
+        history (list): GFLOPs, latency and fine-tuned mAP50-95 after each round.
+    """
+
+    def __init__(
+        self, model, target_gflops=None, target_latency=None, ratio=0.1, round_to=16, rounds=10, latency_fn=None, **args
+    ):
+        """Initializes the pruner with a copy of 'model', the targets and the fine-tuning arguments."""
+        assert target_gflops or target_latency, "YOLOv10Pruner requires 'target_gflops' or 'target_latency'"
+        self.model = deepcopy(model).float()
+        self.target_gflops, self.target_latency = target_gflops, target_latency
+        self.ratio, self.round_to, self.rounds = ratio, round_to, rounds
+        self.latency_fn = latency_fn or self.latency
+        self.args = args
+        self.imgsz = args.get("imgsz", 640)
+        self.history = []
+        self.prefix = colorstr("Pruner: ")
+
+    @torch.no_grad()
+    def latency(self, model, n=30):
+        """Returns the mean batch-1 inference time in milliseconds of a fused copy of 'model'."""
+        model = deepcopy(model).fuse().eval()
+        p = next(model.parameters())
+        im = torch.zeros(1, 3, self.imgsz, self.imgsz, device=p.device, dtype=p.dtype)
+        for _ in range(3):
+            model(im)  # warmup
+        t = time_sync()
+        for _ in range(n):
+            model(im)
+        return (time_sync() - t) / n * 1e3
+
+    def measure(self):
+        """Returns the current (GFLOPs, latency) of the model, latency only when a latency target is set."""
+        gflops = get_flops(self.model, self.imgsz) or get_flops_with_torch_profiler(self.model, self.imgsz)
+        latency = self.latency_fn(self.model) if self.target_latency else None
+        return gflops, latency
+
+    def finetune(self, i):
+        """Fine-tunes the pruned model for one round and returns the best checkpoint model and its mAP50-95."""
+        trainer = YOLOv10DetectionTrainer(overrides={**self.args, "mode": "train", "name": f"prune{i + 1}"})
+        trainer.model = self.model
+        trainer.train()
+        model = attempt_load_one_weight(trainer.best if trainer.best.exists() else trainer.last)[0]
+        for p in model.parameters():
+            p.requires_grad = True
+        return model, trainer.metrics.get("metrics/mAP50-95(B)", 0.0)
+
+    def __call__(self):
+        """Runs prune and fine-tune rounds until the target is met and returns the pruned model."""
+        gflops, latency = self.measure()
+        for i in range(self.rounds + 1):
+            LOGGER.info(f"{self.prefix}round {i}: {gflops:.1f} GFLOPs" + (f", {latency:.1f}ms" if latency else ""))
+            if (not self.target_gflops or gflops <= self.target_gflops) and (
+                not self.target_latency or latency <= self.target_latency
+            ):
+                break
+            if i == self.rounds:
+                LOGGER.warning(f"{self.prefix}WARNING ⚠️ target not reached after {self.rounds} rounds")
+                break
+            prune_channels(self.model, self.ratio, self.round_to)
+            self.model, fitness = self.finetune(i)
+            gflops, latency = self.measure()
+            self.history.append(dict(round=i + 1, gflops=gflops, latency=latency, map=fitness))
+        return self.model
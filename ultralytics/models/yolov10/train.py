@@ -2,19 +2,51 @@ from ultralytics.models.yolo.detect import DetectionTrainer
 from .val import YOLOv10DetectionValidator
 from .model import YOLOv10DetectionModel
 from copy import copy
-from ultralytics.utils import RANK
+from ultralytics.nn.tasks import attempt_load_one_weight
+from ultralytics.utils import LOGGER, RANK, colorstr
+from ultralytics.utils.loss import v10DistillLoss
+from ultralytics.utils.torch_utils import de_parallel
 
 class YOLOv10DetectionTrainer(DetectionTrainer):
     def get_validator(self):
         """Returns a DetectionValidator for YOLO model validation."""
-        self.loss_names = "box_om", "cls_om", "dfl_om", "box_oo", "cls_oo", "dfl_oo", 
+        self.loss_names = "box_om", "cls_om", "dfl_om", "box_oo", "cls_oo", "dfl_oo",
+        if self.args.teacher:
+            self.loss_names += ("kd",)
         return YOLOv10DetectionValidator(
             self.test_loader, save_dir=self.save_dir, args=copy(self.args), _callbacks=self.callbacks
         )
 
     def get_model(self, cfg=None, weights=None, verbose=True):
         """Return a YOLO detection model."""
+        if getattr(weights, "pruned", False):  # channel-pruned models no longer match their yaml
+            return weights
         model = YOLOv10DetectionModel(cfg, nc=self.data["nc"], verbose=verbose and RANK == -1)
         if weights:
             model.load(weights)
         return model
+
+    def _setup_train(self, world_size):
+        """Builds the training setup and, given a 'teacher', attaches the frozen teacher and the distillation loss."""
+        super()._setup_train(world_size)
+        if self.args.teacher:
+            teacher = attempt_load_one_weight(self.args.teacher, device=self.device)[0].eval()
+            for p in teacher.parameters():
+                p.requires_grad = False
+            if self.amp:
+                teacher.half()  # FP16 teacher forward under autocast
+            student = de_parallel(self.model)
+            student.criterion = v10DistillLoss(student, teacher, self.args.distill)
+            self.ema.ema.criterion = v10DistillLoss(self.ema.ema)  # same loss items for validation, no teacher
+            LOGGER.info(f"{colorstr('distill:')} teacher '{self.args.teacher}', gain {self.args.distill}")
+
+    def save_model(self):
+        """Saves checkpoints without the teacher-holding distillation criterion and feature hooks of the student."""
+        student = de_parallel(self.model)
+        criterion = student.__dict__.pop("criterion", None) if self.args.teacher else None
+        if criterion:
+            criterion.attach(False)
+        super().save_model()
+        if criterion:
+            criterion.attach()
+            student.criterion = criterion
@@ -1,12 +1,7 @@
 from ultralytics.models.yolo.detect import DetectionValidator
 from ultralytics.utils import ops
-import torch
 
 class YOLOv10DetectionValidator(DetectionValidator):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.args.save_json |= self.is_coco
-
     def postprocess(self, preds):
         if isinstance(preds, dict):
             preds = preds["one2one"]
@@ -16,9 +11,18 @@ class YOLOv10DetectionValidator(DetectionValidator):
         
         # Acknowledgement: Thanks to sanha9999 in #190 and #181!
         if preds.shape[-1] == 6:
-            return preds
+            det, offsets = ops.pack_detections(preds, self.args.conf)
         else:
             preds = preds.transpose(-1, -2)
-            boxes, scores, labels = ops.v10postprocess(preds, self.args.max_det, self.nc)
-            bboxes = ops.xywh2xyxy(boxes)
-            return torch.cat([bboxes, scores.unsqueeze(-1), labels.unsqueeze(-1)], dim=-1)
\ No newline at end of file
+            det, offsets = ops.v10postprocess_packed(preds, self.args.max_det, self.nc, self.args.conf)
+        offsets = offsets.tolist()
+        return [det[offsets[i] : offsets[i + 1]] for i in range(len(offsets) - 1)]  # per-image views
+
+    def cache_preds(self, preds):
+        if isinstance(preds, dict):
+            preds = preds["one2one"]
+        if isinstance(preds, (list, tuple)):
+            preds = preds[0]
+        if preds.shape[-1] == 6:  # exported (B, max_det, 6) xyxy, score, class detections
+            return preds, preds[..., 4], False
+        return super().cache_preds(preds)
@@ -89,6 +89,7 @@ class AutoBackend(nn.Module):
         batch=1,
         fuse=True,
         verbose=True,
+        threads=None,
     ):
         """
         Initialize the AutoBackend for inference.
@@ -102,6 +103,7 @@ class AutoBackend(nn.Module):
             batch (int): Batch-size to assume for inference.
             fuse (bool): Fuse Conv2D + BatchNorm layers for optimization. Defaults to True.
             verbose (bool): Enable verbose logging. Defaults to True.
+            threads (int, optional): CPU threads of ONNX Runtime sessions. Defaults to None, the ONNX Runtime default.
         """
         super().__init__()
         w = str(weights[0] if isinstance(weights, list) else weights)
@@ -125,6 +127,7 @@ class AutoBackend(nn.Module):
         fp16 &= pt or jit or onnx or xml or engine or nn_module or triton  # FP16
         nhwc = coreml or saved_model or pb or tflite or edgetpu  # BHWC formats (vs torch BCWH)
         stride = 32  # default stride
+        batch_size, dynamic = batch, False  # accepted batch-size and dynamic batch dimension, set per format below
         model, metadata = None, None
 
         # Set device
@@ -185,9 +188,14 @@ class AutoBackend(nn.Module):
             import onnxruntime
 
             providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if cuda else ["CPUExecutionProvider"]
-            session = onnxruntime.InferenceSession(w, providers=providers)
+            options = onnxruntime.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            session = onnxruntime.InferenceSession(w, options, providers=providers)
             output_names = [x.name for x in session.get_outputs()]
             metadata = session.get_modelmeta().custom_metadata_map
+            dynamic = not isinstance(session.get_inputs()[0].shape[0], int)  # symbolic batch dimension
+            batch_size = batch if dynamic else session.get_inputs()[0].shape[0]
 
         # OpenVINO
         elif xml:
@@ -202,9 +210,13 @@ class AutoBackend(nn.Module):
             ov_model = core.read_model(model=str(w), weights=w.with_suffix(".bin"))
             if ov_model.get_parameters()[0].get_layout().empty:
                 ov_model.get_parameters()[0].set_layout(ov.Layout("NCHW"))
+            ov_batch = ov_model.get_parameters()[0].get_partial_shape()[0]  # batch dimension
+            dynamic = ov_batch.is_dynamic
+            batch_size = batch if dynamic else ov_batch.get_length()
 
             # OpenVINO inference modes are 'LATENCY', 'THROUGHPUT' (not recommended), or 'CUMULATIVE_THROUGHPUT'
-            inference_mode = "CUMULATIVE_THROUGHPUT" if batch > 1 else "LATENCY"
+            # static-batch models run whole batches, per-image async requests need a dynamic batch dimension
+            inference_mode = "CUMULATIVE_THROUGHPUT" if batch > 1 and dynamic else "LATENCY"
             LOGGER.info(f"Using OpenVINO {inference_mode} mode for batch={batch} inference...")
             ov_compiled_model = core.compile_model(
                 ov_model,
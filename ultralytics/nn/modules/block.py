@@ -788,14 +788,28 @@ class Attention(nn.Module):
         qkv = self.qkv(x)
         q, k, v = qkv.view(B, self.num_heads, self.key_dim*2 + self.head_dim, N).split([self.key_dim, self.key_dim, self.head_dim], dim=2)
 
-        attn = (
-            (q.transpose(-2, -1) @ k) * self.scale
-        )
+        attn = q.transpose(-2, -1) @ k
+        if self.scale != 1:  # folded into the qkv projection by fuse()
+            attn = attn * self.scale
         attn = attn.softmax(dim=-1)
         x = (v @ attn.transpose(-2, -1)).view(B, C, H, W) + self.pe(v.reshape(B, C, H, W))
         x = self.proj(x)
         return x
 
+    @torch.no_grad()
+    def fuse(self):
+        """Folds the attention scale into the query rows of the qkv projection, removing a Mul from the graph."""
+        if self.scale == 1:
+            return
+        m = self.qkv.bn if hasattr(self.qkv, "bn") else self.qkv.conv
+        q = torch.zeros(self.num_heads, self.key_dim * 2 + self.head_dim, dtype=torch.bool, device=m.weight.device)
+        q[:, : self.key_dim] = True  # per-head (q, k, v) channel layout of the qkv output
+        q = q.flatten()
+        m.weight[q] *= self.scale
+        if m.bias is not None:
+            m.bias[q] *= self.scale
+        self.scale = 1.0
+
 class PSA(nn.Module):
 
     def __init__(self, c1, c2, e=0.5):
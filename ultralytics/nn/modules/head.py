@@ -497,6 +497,7 @@ class RTDETRDecoder(nn.Module):
 class v10Detect(Detect):
 
     max_det = 300
+    one2many_infer = True  # compute the one2many head outside training, disabled by fuse()
 
     def __init__(self, nc=80, ch=()):
         super().__init__(nc, ch)
@@ -510,13 +511,14 @@ class v10Detect(Detect):
     
     def forward(self, x):
         one2one = self.forward_feat([xi.detach() for xi in x], self.one2one_cv2, self.one2one_cv3)
-        if not self.export:
+        one2many = None
+        if not self.export and (self.training or self.one2many_infer):  # one2many head only supervises training
             one2many = super().forward(x)
 
         if not self.training:
             one2one = self.inference(one2one)
             if not self.export:
-                return {"one2many": one2many, "one2one": one2one}
+                return {"one2many": one2many, "one2one": one2one} if one2many is not None else {"one2one": one2one}
             else:
                 assert(self.max_det != -1)
                 boxes, scores, labels = ops.v10postprocess(one2one.permute(0, 2, 1), self.max_det, self.nc)
@@ -524,6 +526,10 @@ class v10Detect(Detect):
         else:
             return {"one2many": one2many, "one2one": one2one}
 
+    def fuse(self):
+        """Skips the one2many head, which only provides training supervision, at inference and keeps its weights."""
+        self.one2many_infer = False
+
     def bias_init(self):
         super().bias_init()
         """Initialize Detect() biases, WARNING: requires stride availability."""
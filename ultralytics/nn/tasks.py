@@ -55,6 +55,7 @@ from ultralytics.nn.modules import (
     RepVGGDW,
     v10Detect
 )
+from ultralytics.nn.modules.block import Attention
 from ultralytics.utils import DEFAULT_CFG_DICT, DEFAULT_CFG_KEYS, LOGGER, colorstr, emojis, yaml_load
 from ultralytics.utils.checks import check_requirements, check_suffix, check_yaml
 from ultralytics.utils.loss import v8ClassificationLoss, v8DetectionLoss, v8OBBLoss, v8PoseLoss, v8SegmentationLoss, v10DetectLoss
@@ -181,7 +182,7 @@ class BaseModel(nn.Module):
         Returns:
             (nn.Module): The fused model is returned.
         """
-        if not self.is_fused():
+        if not self.is_fused(thresh=1):  # any BatchNorm left, fusion is idempotent
             for m in self.model.modules():
                 if isinstance(m, (Conv, Conv2, DWConv)) and hasattr(m, "bn"):
                     if isinstance(m, Conv2):
@@ -196,13 +197,83 @@ class BaseModel(nn.Module):
                 if isinstance(m, RepConv):
                     m.fuse_convs()
                     m.forward = m.forward_fuse  # update forward
-                if isinstance(m, RepVGGDW):
+                if isinstance(m, RepVGGDW) and hasattr(m, "conv1"):
                     m.fuse()
                     m.forward = m.forward_fuse
+                if isinstance(m, (Attention, v10Detect)):  # Attention before its qkv Conv, which folds the scale
+                    m.fuse()
             self.info(verbose=verbose)
 
         return self
 
+    @torch.no_grad()
+    def fusion_report(self, im=None, imgsz=640, n=10, verbose=True):
+        """
+        Audits the model for operations left unfused at inference and measures their latency cost.
+
+        Reports normalization layers not folded into a conv, RepConv and RepVGGDW modules with parallel branches,
+        Attention modules with an unfolded scale and a v10Detect one2many head, which is unused at inference.
+
+        Args:
+            im (torch.Tensor, optional): Input BCHW image, defaults to zeros of shape (1, 3, imgsz, imgsz).
+            imgsz (int): Image size of the default input.
+            n (int): Number of timed forward passes.
+            verbose (bool): Log the report.
+
+        Returns:
+            (list): Dicts with 'module', 'type', 'issue' and 'ms', the mean cost per forward pass (None if not timed).
+        """
+        norm = tuple(v for k, v in nn.__dict__.items() if "Norm" in k)
+        issues, covered = [], set()
+        for name, m in self.named_modules():
+            if id(m) in covered:
+                continue
+            if isinstance(m, norm):
+                issue, cost = "normalization not folded into a conv", [m]
+            elif isinstance(m, RepVGGDW) and hasattr(m, "conv1"):
+                issue, cost = "parallel 3x3 depth-wise branch", [m.conv1]
+            elif isinstance(m, RepConv) and hasattr(m, "conv1"):
+                issue, cost = "parallel 1x1 and identity branches", [m.conv2] + ([m.bn] if m.bn is not None else [])
+            elif isinstance(m, Attention) and m.scale != 1:
+                issue, cost = "attention scale not folded into qkv", []
+            elif isinstance(m, v10Detect) and m.one2many_infer:
+                issue, cost = "one2many head computed at inference", [*m.cv2, *m.cv3]
+            else:
+                continue
+            issues.append(dict(module=name, type=m.__class__.__name__, issue=issue, ms=None, cost=cost))
+            covered.update(id(x) for c in cost for x in c.modules())
+
+        # Time the modules that would disappear when fused
+        t = {}
+        hooks = []
+        for c in (c for x in issues for c in x["cost"]):
+            hooks.append(c.register_forward_pre_hook(lambda m, x: t.__setitem__(id(m), t.get(id(m), 0) - time_sync())))
+            hooks.append(c.register_forward_hook(lambda m, x, y: t.__setitem__(id(m), t[id(m)] + time_sync())))
+        if hooks:
+            p = next(self.parameters())
+            im = torch.zeros(1, 3, imgsz, imgsz, device=p.device, dtype=p.dtype) if im is None else im
+            training = self.training
+            self.eval()
+            self.predict(im)  # warmup
+            t.clear()
+            for _ in range(n):
+                self.predict(im)
+            self.train(training)
+        for h in hooks:
+            h.remove()
+        for x in issues:
+            cost = x.pop("cost")
+            if cost:
+                x["ms"] = sum(t.get(id(c), 0) for c in cost) / n * 1e3
+
+        if verbose:
+            total = sum(x["ms"] or 0 for x in issues)
+            LOGGER.info(f"Fusion audit: {len(issues)} unfused ops, {total:.2f}ms per forward pass")
+            for x in issues:
+                ms = "-" if x["ms"] is None else f"{x['ms']:.3f}ms"
+                LOGGER.info(f"{x['module']:>40}  {x['type']:<16}{x['issue']:<40}{ms:>10}")
+        return issues
+
     def is_fused(self, thresh=10):
         """
         Check if the model has less than a certain threshold of BatchNorm layers.
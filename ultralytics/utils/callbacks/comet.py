@@ -236,7 +236,8 @@ def _log_image_predictions(experiment, validator, curr_step):
     if task not in COMET_SUPPORTED_TASKS:
         return
 
-    jdict = validator.jdict
+    coco = getattr(validator, "coco", None)  # detection predictions are kept by the COCO evaluator
+    jdict = validator.jdict or (list(coco.results()) if coco else [])
     if not jdict:
         return
 
@@ -725,3 +725,80 @@ class v10DetectLoss:
         one2one = preds["one2one"]
         loss_one2one = self.one2one(one2one, batch)
         return loss_one2many[0] + loss_one2one[0], torch.cat((loss_one2many[1], loss_one2one[1]))
+
+
+def _cache_inputs(m, x):
+    """Forward pre-hook keeping a copy of the Detect input feature list, which Detect.forward() overwrites in place."""
+    m.kd_feats = list(x[0])
+
+
+class v10DistillLoss(v10DetectLoss):
+    """
+    v10DetectLoss plus knowledge distillation from a frozen teacher with the same classes and strides.
+
+    The student mimics the teacher's spatial attention on the neck features, which is independent of the channel counts
+    so no adapter layers are needed, and the teacher's class probabilities and DFL box distributions on both the
+    one2many and one2one branches, weighted by the teacher confidence per anchor. Without a teacher the distillation
+    term is zero, so that validation loss items keep the same length.
+    """
+
+    def __init__(self, model, teacher=None, gain=1.0, T=2.0):
+        """Initializes the loss with the de-paralleled student, optional teacher, loss gain and temperature 'T'."""
+        super().__init__(model)
+        m = model.model[-1]
+        self.head, self.no, self.nc, self.reg_max = m, m.no, m.nc, m.reg_max
+        self.teacher, self.gain, self.T = teacher, gain, T
+        self.hooks = []
+        if teacher is not None:
+            t = teacher.model[-1]
+            assert (t.nc, t.reg_max) == (m.nc, m.reg_max), "teacher and student heads must have the same nc and reg_max"
+            t.training = True  # raw head outputs from an otherwise eval-mode teacher
+            self.attach()
+
+    def attach(self, enabled=True):
+        """Registers or removes the student and teacher feature hooks, i.e. before pickling the student."""
+        for h in self.hooks:
+            h.remove()
+        self.hooks = (
+            [x.register_forward_pre_hook(_cache_inputs) for x in (self.head, self.teacher.model[-1])]
+            if enabled and self.teacher is not None
+            else []
+        )
+
+    @staticmethod
+    def feature_loss(s, t):
+        """Attention transfer loss between lists of student and teacher feature maps of the same spatial sizes."""
+        loss = 0
+        for a, b in zip(s, t):
+            a, b = (F.normalize(x.float().pow(2).mean(1).flatten(1), dim=1) for x in (a, b))
+            loss += (a - b).pow(2).sum(1).mean()
+        return loss
+
+    def head_loss(self, s, t):
+        """Teacher-confidence weighted class and box distribution KL divergences between student and teacher heads."""
+        b = s[0].shape[0]
+        s, t = (torch.cat([xi.view(b, self.no, -1) for xi in x], 2).float() for x in (s, t))
+        s_box, s_cls = s.split((self.reg_max * 4, self.nc), 1)
+        t_box, t_logits = t.split((self.reg_max * 4, self.nc), 1)
+        t_cls = t_logits.sigmoid()
+        w = t_cls.amax(1)  # (b, anchors)
+        cls = F.binary_cross_entropy_with_logits(s_cls, t_cls, reduction="none")
+        cls = (cls - F.binary_cross_entropy_with_logits(t_logits, t_cls, reduction="none")).mean(1)  # minus entropy
+        s_box = (s_box.view(b, 4, self.reg_max, -1) / self.T).log_softmax(2)
+        t_box = (t_box.view(b, 4, self.reg_max, -1) / self.T).log_softmax(2)
+        box = F.kl_div(s_box, t_box, reduction="none", log_target=True).sum(2).mean(1) * self.T**2
+        return ((cls + box) * w).sum() / w.sum().clamp(min=1)
+
+    def __call__(self, preds, batch):
+        """Returns the v10DetectLoss plus distillation loss and the loss items with the distillation term appended."""
+        loss, items = super().__call__(preds, batch)
+        kd = torch.zeros(1, device=items.device)
+        if self.teacher is not None and "kd_feats" in self.head.__dict__:
+            with torch.no_grad():
+                t_preds = self.teacher(batch["img"])
+            s_feats, t_feats = self.head.__dict__.pop("kd_feats"), self.teacher.model[-1].__dict__.pop("kd_feats")
+            kd[0] = self.feature_loss(s_feats, t_feats) + sum(
+                self.head_loss(preds[k], t_preds[k]) for k in ("one2many", "one2one")
+            )
+            kd *= self.gain
+        return loss + kd.sum() * batch["img"].shape[0], torch.cat((items, kd.detach()))
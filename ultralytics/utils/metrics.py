@@ -1,6 +1,7 @@
 # Ultralytics YOLO 🚀, AGPL-3.0 license
 """Model validation metrics."""
 
+import json
 import math
 import warnings
 from pathlib import Path
@@ -56,23 +57,23 @@ def box_iou(box1, box2, eps=1e-7):
     Based on https://github.com/pytorch/vision/blob/master/torchvision/ops/boxes.py
 
     Args:
-        box1 (torch.Tensor): A tensor of shape (N, 4) representing N bounding boxes.
-        box2 (torch.Tensor): A tensor of shape (M, 4) representing M bounding boxes.
+        box1 (torch.Tensor): A tensor of shape (N, 4) or batched (B, N, 4) representing N bounding boxes.
+        box2 (torch.Tensor): A tensor of shape (M, 4) or batched (B, M, 4) representing M bounding boxes.
         eps (float, optional): A small value to avoid division by zero. Defaults to 1e-7.
 
     Returns:
-        (torch.Tensor): An NxM tensor containing the pairwise IoU values for every element in box1 and box2.
+        (torch.Tensor): An NxM (or BxNxM) tensor containing the pairwise IoU values for every element in box1 and box2.
     """
 
     # NOTE: need float32 to get accurate iou values
     box1 = torch.as_tensor(box1, dtype=torch.float32)
     box2 = torch.as_tensor(box2, dtype=torch.float32)
     # inter(N,M) = (rb(N,M,2) - lt(N,M,2)).clamp(0).prod(2)
-    (a1, a2), (b1, b2) = box1.unsqueeze(1).chunk(2, 2), box2.unsqueeze(0).chunk(2, 2)
-    inter = (torch.min(a2, b2) - torch.max(a1, b1)).clamp_(0).prod(2)
+    (a1, a2), (b1, b2) = box1.unsqueeze(-2).chunk(2, -1), box2.unsqueeze(-3).chunk(2, -1)
+    inter = (torch.min(a2, b2) - torch.max(a1, b1)).clamp_(0).prod(-1)
 
     # IoU = inter / (area1 + area2 - inter)
-    return inter / ((a2 - a1).prod(2) + (b2 - b1).prod(2) - inter + eps)
+    return inter / ((a2 - a1).prod(-1) + (b2 - b1).prod(-1) - inter + eps)
 
 
 def bbox_iou(box1, box2, xywh=True, GIoU=False, DIoU=False, CIoU=False, eps=1e-7):
@@ -313,8 +314,7 @@ class ConfusionMatrix:
             targets (Array[N, 1]): Ground truth class labels.
         """
         preds, targets = torch.cat(preds)[:, 0], torch.cat(targets)
-        for p, t in zip(preds.cpu().numpy(), targets.cpu().numpy()):
-            self.matrix[p][t] += 1
+        np.add.at(self.matrix, (preds.cpu().numpy(), targets.cpu().numpy()), 1)
 
     def process_batch(self, detections, gt_bboxes, gt_cls):
         """
@@ -327,53 +327,55 @@ class ConfusionMatrix:
             gt_bboxes (Array[M, 4]| Array[N, 5]): Ground truth bounding boxes with xyxy/xyxyr format.
             gt_cls (Array[M]): The class labels.
         """
-        if gt_cls.shape[0] == 0:  # Check if labels is empty
-            if detections is not None:
-                detections = detections[detections[:, 4] > self.conf]
-                detection_classes = detections[:, 5].int()
-                for dc in detection_classes:
-                    self.matrix[dc, self.nc] += 1  # false positives
-            return
         if detections is None:
-            gt_classes = gt_cls.int()
-            for gc in gt_classes:
-                self.matrix[self.nc, gc] += 1  # background FN
-            return
-
-        detections = detections[detections[:, 4] > self.conf]
-        gt_classes = gt_cls.int()
-        detection_classes = detections[:, 5].int()
-        is_obb = detections.shape[1] == 7 and gt_bboxes.shape[1] == 5  # with additional `angle` dimension
-        iou = (
-            batch_probiou(gt_bboxes, torch.cat([detections[:, :4], detections[:, -1:]], dim=-1))
-            if is_obb
-            else box_iou(gt_bboxes, detections[:, :4])
-        )
+            detections = gt_bboxes.new_zeros((0, 6 + (gt_bboxes.shape[-1] == 5)))
+        self.process_batches([detections], [gt_bboxes], [gt_cls])
+
+    def process_batches(self, detections, gt_bboxes, gt_cls):
+        """
+        Update confusion matrix for object detection task with a batch of images, as process_batch() for each image.
 
-        x = torch.where(iou > self.iou_thres)
-        if x[0].shape[0]:
-            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()
-            if x[0].shape[0] > 1:
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+        The images are matched as one padded problem on the device of the inputs, each label with the highest-IoU
+        detection above the IoU threshold among those it is the best label of, and all cells are counted with a single
+        bincount, synchronizing once per batch instead of looping over labels and detections.
+
+        Args:
+            detections (List[torch.Tensor]): Per-image (N, 6) x1, y1, x2, y2, conf, class or (N, 7) with angle.
+            gt_bboxes (List[torch.Tensor]): Per-image (M, 4) xyxy or (M, 5) xywhr ground truth boxes.
+            gt_cls (List[torch.Tensor]): Per-image (M,) class labels.
+        """
+        pad, nc = torch.nn.utils.rnn.pad_sequence, self.nc
+        det = pad(detections, batch_first=True, padding_value=-1.0)  # (B, N, 6), padded rows below any conf
+        gc = pad(gt_cls, batch_first=True, padding_value=-1.0).long()  # (B, M), padded labels -1
+        (b, m), n, device = gc.shape, det.shape[1], det.device
+        if det.shape[-1] == 7 and gt_bboxes[0].shape[-1] == 5:  # obb with additional `angle` dimension
+            iou = torch.zeros((b, m, n), device=device)
+            for i, (d, g) in enumerate(zip(detections, gt_bboxes)):
+                if len(d) and len(g):
+                    iou[i, : len(g), : len(d)] = batch_probiou(g, torch.cat([d[:, :4], d[:, -1:]], dim=-1))
         else:
-            matches = np.zeros((0, 3))
-
-        n = matches.shape[0] > 0
-        m0, m1, _ = matches.transpose().astype(int)
-        for i, gc in enumerate(gt_classes):
-            j = m0 == i
-            if n and sum(j) == 1:
-                self.matrix[detection_classes[m1[j]], gc] += 1  # correct
-            else:
-                self.matrix[self.nc, gc] += 1  # true background
-
-        if n:
-            for i, dc in enumerate(detection_classes):
-                if not any(m1 == i):
-                    self.matrix[dc, self.nc] += 1  # predicted background
+            iou = box_iou(pad(gt_bboxes, batch_first=True), det[..., :4])  # (B, M, N)
+
+        dv, gv = det[..., 4] > self.conf, gc >= 0  # valid detections and labels
+        first = torch.full((b, m), n, device=device)  # matched detection of each label, n if none
+        if m and n:
+            iou = iou.masked_fill(~((iou > self.iou_thres) & dv[:, None] & gv[..., None]), 0)
+            best, label = iou.max(1)  # (B, N) highest-IoU label of each detection
+            top = torch.zeros((b, m), device=device).scatter_reduce_(1, label, best, "amax")
+            worse = (best == 0) | (best < top.gather(1, label))  # no label or not the best detection of its label
+            idx = torch.arange(n, device=device).expand(b, n).masked_fill(worse, n)
+            first.scatter_reduce_(1, label, idx, "amin")
+        matched = torch.zeros((b, n + 1), dtype=torch.bool, device=device).scatter_(1, first, True)[:, :n]
+        dc = det[..., 5].long()
+        rows = torch.cat((dc, torch.full((b, 1), nc, device=device)), 1).gather(1, first)  # background FN if unmatched
+        fp = dv & ~matched & ((first < n).any(1) | ~gv.any(1))[:, None]  # in images with matches or without labels
+        i = torch.cat((rows[gv] * (nc + 1) + gc[gv], dc[fp] * (nc + 1) + nc))
+        self.matrix += torch.bincount(i, minlength=(nc + 1) ** 2).view(nc + 1, nc + 1).cpu().numpy()
+
+    def merge(self, other):
+        """Adds the counts of another ConfusionMatrix of the same classes and task, e.g. of another data shard."""
+        self.matrix += other.matrix
+        return self
 
     def matrix(self):
         """Returns the confusion matrix."""
@@ -529,6 +531,36 @@ def compute_ap(recall, precision):
     return ap, mpre, mrec
 
 
+def interp_segments(x, xp, fp, lengths, left=None):
+    """
+    Evaluate np.interp(x, xp_k, fp_k) for K curves stored back to back, without a Python loop over the curves.
+
+    Args:
+        x (np.ndarray): Query points shared by all curves, shape (M,).
+        xp (np.ndarray): Concatenated non-decreasing x-coordinates of the K curves, shape (sum(lengths),).
+        fp (np.ndarray): Concatenated y-coordinates of the K curves, shape (sum(lengths),).
+        lengths (np.ndarray): Number of points of each curve, all >= 1, shape (K,).
+        left (float, optional): Value for queries below a curve's first point, its first fp value if None.
+
+    Returns:
+        (np.ndarray): Interpolated values, shape (K, M).
+    """
+    end = np.cumsum(lengths) - 1  # last point of each curve
+    start = (end - lengths + 1)[:, None]
+    end = end[:, None]
+    lo = min(x.min(), xp.min())
+    span = max(x.max(), xp.max()) - lo + 1  # offset keeping the shifted curves disjoint and globally sorted
+    offset = np.arange(len(lengths)) * span - lo
+    j = np.searchsorted(xp + np.repeat(offset, lengths), (x[None] + offset[:, None]).ravel(), side="right")
+    j = j.reshape(len(lengths), -1) - 1  # xp[j] <= x < xp[j + 1] within each curve
+    i, k = np.clip(j, start, end), np.clip(j + 1, start, end)
+    dx = xp[k] - xp[i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.where(dx > 0, fp[i] + (x[None] - xp[i]) * (fp[k] - fp[i]) / dx, fp[i])
+    y = np.where(j >= end, fp[end], y)  # at or beyond the last point
+    return np.where(j < start, fp[start] if left is None else left, y)  # before the first point
+
+
 def ap_per_class(
     tp, conf, pred_cls, target_cls, plot=False, on_plot=None, save_dir=Path(), names=(), eps=1e-16, prefix=""
 ):
@@ -563,8 +595,9 @@ def ap_per_class(
             prec_values: Precision values at mAP@0.5 for each class. Shape: (nc, 1000).
     """
 
-    # Sort by objectness
+    # Sort by objectness, then group by class keeping the objectness order within each class
     i = np.argsort(-conf)
+    i = i[np.argsort(pred_cls[i], kind="stable")]
     tp, conf, pred_cls = tp[i], conf[i], pred_cls[i]
 
     # Find unique classes
@@ -572,37 +605,67 @@ def ap_per_class(
     nc = unique_classes.shape[0]  # number of classes, number of detections
 
     # Create Precision-Recall curve and compute AP for each class
-    x, prec_values = np.linspace(0, 1, 1000), []
+    x, prec_values = np.linspace(0, 1, 1000), np.zeros((0, 1000))
 
     # Average precision, precision and recall curves
     ap, p_curve, r_curve = np.zeros((nc, tp.shape[1])), np.zeros((nc, 1000)), np.zeros((nc, 1000))
-    for ci, c in enumerate(unique_classes):
-        i = pred_cls == c
-        n_l = nt[ci]  # number of labels
-        n_p = i.sum()  # number of predictions
-        if n_p == 0 or n_l == 0:
-            continue
-
-        # Accumulate FPs and TPs
-        fpc = (1 - tp[i]).cumsum(0)
-        tpc = tp[i].cumsum(0)
-
-        # Recall
-        recall = tpc / (n_l + eps)  # recall curve
-        r_curve[ci] = np.interp(-x, -conf[i], recall[:, 0], left=0)  # negative x, xp because xp decreases
-
-        # Precision
-        precision = tpc / (tpc + fpc)  # precision curve
-        p_curve[ci] = np.interp(-x, -conf[i], precision[:, 0], left=1)  # p at pr_score
-
-        # AP from recall-precision curve
-        for j in range(tp.shape[1]):
-            ap[ci, j], mpre, mrec = compute_ap(recall[:, j], precision[:, j])
-            if plot and j == 0:
-                prec_values.append(np.interp(x, mrec, mpre))  # precision at mAP@0.5
-
-    prec_values = np.array(prec_values)  # (nc, 1000)
-
+    i = np.isin(pred_cls, unique_classes)  # predictions of classes without labels never count
+    tp, conf, pred_cls = tp[i], conf[i], pred_cls[i]
+    ci, n_p = np.unique(np.searchsorted(unique_classes, pred_cls), return_counts=True)  # classes with predictions
+    if len(ci):
+        k, nl = len(ci), nt[ci]  # classes with predictions, their label counts
+        start = np.cumsum(n_p) - n_p  # first prediction of each class segment
+        seg = np.repeat(np.arange(k), n_p)
+
+        # Recall and precision curves at IoU 0.5 for every class at once, restarting at each class segment
+        tpc = tp[:, 0].cumsum(dtype=np.float64)
+        tpc -= np.concatenate(([0.0], tpc))[start[seg]]
+        recall = tpc / (nl[seg] + eps)  # recall curve
+        r_curve[ci] = interp_segments(-x, -conf, recall, n_p, left=0)  # negative x, xp because xp decreases
+        precision = tpc / (np.arange(len(tp)) - start[seg] + 1)  # precision curve
+        p_curve[ci] = interp_segments(-x, -conf, precision, n_p, left=1)  # p at pr_score
+
+        # AP from recall-precision curves, see compute_ap(). Between two TPs a run of FPs only adds a point with the
+        # recall of the earlier TP and the envelope of the later one, so curves are built from TPs alone as one
+        # group g per IoU threshold j and class s: (0, 1) sentinel, TPs (with their FP-run points), the segment end
+        # and the (1, 0) sentinel, which interpolates exactly like the full curve.
+        j, i = np.nonzero(tp.T)  # IoU threshold and sorted prediction index of every TP
+        s = seg[i]
+        g = j * k + s
+        rank = i - start[s] + 1  # 1-based position within the class segment
+        gstart = np.flatnonzero(np.diff(g, prepend=-1))  # first TP of each non-empty group
+        n = np.arange(len(g)) - np.repeat(gstart, np.diff(np.append(gstart, len(g)))) + 1  # TP count so far
+        gap = rank > np.where(n > 1, np.roll(rank, 1), 0) + 1  # FPs before this TP
+        prec = n / rank
+        offset = 2.0 * (k * tp.shape[1] - 1 - g)  # grows along the reversed order
+        env = np.flip(np.maximum.accumulate(np.flip(prec + offset))) - offset  # precision envelopes
+
+        m = np.bincount(g, minlength=k * tp.shape[1])  # TPs per group
+        lengths = 3 + m + np.bincount(g, weights=gap, minlength=len(m)).astype(int)
+        first = np.cumsum(lengths) - lengths
+        mrec, mpre = np.zeros(lengths.sum()), np.zeros(lengths.sum())
+        mpre[first] = 1.0  # (0, 1) sentinels
+        pos = first[g] + np.cumsum(gap) - np.concatenate(([0], np.cumsum(gap)))[np.repeat(gstart, m[m > 0])] + n
+        mrec[pos], mpre[pos] = n / (nl[s] + eps), env
+        mrec[pos[gap] - 1], mpre[pos[gap] - 1] = (n[gap] - 1) / (nl[s[gap]] + eps), env[gap]
+        gs = np.arange(len(m)) % k  # class segment of each group
+        mrec[first + lengths - 2], mpre[first + lengths - 2] = m / (nl[gs] + eps), m / n_p[gs]  # segment end
+        mrec[first + lengths - 1] = 1.0  # (1, 0) sentinels
+
+        # 101-point interp (COCO) of every class and IoU threshold
+        xi = np.linspace(0, 1, 101)
+        ap[ci] = np.trapz(interp_segments(xi, mrec, mpre, lengths), xi).reshape(tp.shape[1], k).T  # integrate
+        if plot:
+            e = first[k] if tp.shape[1] > 1 else len(mrec)  # IoU 0.5 groups come first
+            prec_values = interp_segments(x, mrec[:e], mpre[:e], lengths[:k])  # precision at mAP@0.5
+
+    return _pr_results(
+        ap, p_curve, r_curve, x, prec_values, unique_classes, nt, plot, on_plot, save_dir, names, eps, prefix
+    )
+
+
+def _pr_results(ap, p_curve, r_curve, x, prec_values, unique_classes, nt, plot, on_plot, save_dir, names, eps, prefix):
+    """Computes the max-F1 operating point of the P/R curves, plots them and returns the ap_per_class() results."""
     # Compute F1 (harmonic mean of precision and recall)
     f1_curve = 2 * p_curve * r_curve / (p_curve + r_curve + eps)
     names = [v for k, v in names.items() if k in unique_classes]  # list: only classes that have data
@@ -620,6 +683,517 @@ def ap_per_class(
     return tp, fp, p, r, f1, ap, unique_classes.astype(int), p_curve, r_curve, f1_curve, x, prec_values
 
 
+class ConfHistogram:
+    """
+    Constant-memory accumulator of detection statistics over fixed confidence bins.
+
+    Instead of keeping every prediction until the end of validation, each batch is reduced on-device to per-class
+    counts of predictions and TPs (at every IoU threshold) per confidence bin. Memory no longer grows with the number of
+    images, and AP and P/R curves are computed from the histogram alone, resolving confidences to 1 / bins.
+
+    Attributes:
+        bins (int): Number of confidence bins over [0, 1].
+        tp (torch.Tensor): TP counts of shape (nc, bins, niou).
+        n (torch.Tensor): Prediction counts of shape (nc, bins).
+        nt (torch.Tensor): Label counts of shape (nc,).
+    """
+
+    def __init__(self, nc, niou=10, bins=1000, device=None):
+        """Initialize empty histograms for nc classes, niou IoU thresholds and the given number of confidence bins."""
+        self.nc, self.bins = nc, bins
+        self.tp = torch.zeros((nc, bins, niou), dtype=torch.long, device=device)
+        self.n = torch.zeros((nc, bins), dtype=torch.long, device=device)
+        self.nt = torch.zeros(nc, dtype=torch.long, device=device)
+
+    def update(self, tp, conf, pred_cls, target_cls):
+        """Adds a batch of per-prediction tp (N, niou), conf (N,), pred_cls (N,) and per-label target_cls (M,)."""
+        i = pred_cls.long() * self.bins + (conf * self.bins).long().clamp_(0, self.bins - 1)
+        self.n.view(-1).index_add_(0, i, torch.ones_like(i))
+        self.tp.view(-1, self.tp.shape[-1]).index_add_(0, i, tp.long())
+        self.nt += torch.bincount(target_cls.long(), minlength=self.nc)
+
+    def merge(self, other):
+        """Adds the counts of another ConfHistogram with the same classes and bins, e.g. of another data shard."""
+        for k in "tp", "n", "nt":
+            getattr(self, k).add_(getattr(other, k).to(getattr(self, k).device))
+        return self
+
+    def ap_per_class(self, plot=False, on_plot=None, save_dir=Path(), names=(), eps=1e-16, prefix=""):
+        """Computes ap_per_class() results from the histograms, see ap_per_class() for arguments and returns."""
+        tp, n, nt = (x.cpu().numpy() for x in (self.tp, self.n, self.nt))
+        unique_classes = np.flatnonzero(nt)
+        ci = np.flatnonzero(n[unique_classes].any(1))  # classes with labels and predictions
+        c, k, niou = unique_classes[ci], len(ci), tp.shape[-1]
+        x = np.linspace(0, 1, 1000)
+        ap, p_curve, r_curve = np.zeros((len(nt), niou)), np.zeros((len(nt), 1000)), np.zeros((len(nt), 1000))
+        xi, prec_values = np.linspace(0, 1, 101), np.zeros((0, 1000))
+        if k:
+            # Cumulative counts from the highest confidence bin down, empty bins repeat the previous point
+            tpc, npc = np.flip(tp[c], 1).cumsum(1), np.flip(n[c], 1).cumsum(1)
+            recall = tpc / (nt[c, None, None] + eps)  # (k, bins, niou)
+            precision = np.where(npc[..., None] > 0, tpc / np.maximum(npc, 1)[..., None], 1.0)
+            edges = -np.tile(np.flip(np.arange(self.bins)) / self.bins, k)  # negative lower edges of each bin
+            r_curve[c] = interp_segments(-x, edges, recall[..., 0].ravel(), np.full(k, self.bins), left=0)
+            p_curve[c] = interp_segments(-x, edges, precision[..., 0].ravel(), np.full(k, self.bins), left=1)
+
+            # AP from recall-precision curves with (0, 1) and (1, 0) sentinels, see compute_ap()
+            ones, zeros = np.ones((k, 1, niou)), np.zeros((k, 1, niou))
+            mrec = np.concatenate((zeros, recall, ones), 1)
+            mpre = np.flip(np.maximum.accumulate(np.flip(np.concatenate((ones, precision, zeros), 1), 1), 1), 1)
+            mrec, mpre = mrec.transpose(2, 0, 1).ravel(), mpre.transpose(2, 0, 1).ravel()  # (niou, k, bins + 2)
+            y = interp_segments(xi, mrec, mpre, np.full(k * niou, self.bins + 2))
+            ap[c] = np.trapz(y, xi).reshape(niou, k).T  # integrate
+            if plot:
+                e = k * (self.bins + 2)  # IoU 0.5 curves come first
+                prec_values = interp_segments(x, mrec[:e], mpre[:e], np.full(k, self.bins + 2))
+        i = unique_classes
+        return _pr_results(
+            ap[i], p_curve[i], r_curve[i], x, prec_values, i, nt[i], plot, on_plot, save_dir, names, eps, prefix
+        )
+
+
+def operating_points(conf, target, target_recall=0.99, plot=False, on_plot=None, save_dir=Path(), names=()):
+    """
+    Finds per-class image-level alarm thresholds, the highest confidence at which a target share of images is flagged.
+
+    An image is flagged for a class when any of its detections of that class scores at or above the threshold, as on an
+    edge device raising alarms per image. The highest threshold flagging 'target_recall' of the images with labels of a
+    class flags the fewest images without them, i.e. raises the fewest false alarms. Thresholds round down to 1e-4.
+
+    Args:
+        conf (np.ndarray): (N, nc) highest detection confidence of each class in each image, 0 without detections.
+        target (np.ndarray): (N, nc) whether each image has labels of each class.
+        target_recall (float): Share of the images with labels of a class that must be flagged.
+        plot (bool): Plot image-level recall and false alarm rate over confidence.
+        on_plot (func, optional): A callback to pass plots path and data when they are rendered.
+        save_dir (Path): Directory to save the plots.
+        names (dict): Class names.
+
+    Returns:
+        (dict): Per class index with labels, the alarm 'conf' with its image-level 'recall', 'precision' and
+            'false_alarm_rate', the share of images without labels of the class that are flagged.
+    """
+    target = target.astype(bool)
+    conf = np.where(conf > 0, conf, -1.0)  # images without detections are never flagged
+    x, points = np.linspace(0, 1, 1000), {}
+    recall_curve, fa_curve = np.zeros((0, 1000)), np.zeros((0, 1000))
+    for c in np.flatnonzero(target.any(0)):
+        pos, neg = np.sort(conf[target[:, c], c]), np.sort(conf[~target[:, c], c])
+        k = math.ceil(target_recall * len(pos))
+        t = pos[-k] if k and pos[-k] > 0 else pos[pos > 0].min(initial=1.0)  # lowest detection if target unreachable
+        t = math.floor(t * 1e4) / 1e4
+        tp, fp = (pos >= t).sum(), (neg >= t).sum()
+        points[int(c)] = dict(
+            conf=t,
+            recall=float(tp / len(pos)),
+            precision=float(tp / max(tp + fp, 1)),
+            false_alarm_rate=float(fp / max(len(neg), 1)),
+        )
+        if tp < k:
+            name = names[c] if names else c
+            LOGGER.warning(
+                f"WARNING ⚠️ image-level recall {target_recall} not reachable for class {name}, "
+                f"flagging {tp}/{len(pos)} images at its lowest detection confidence"
+            )
+        recall_curve = np.vstack((recall_curve, (len(pos) - np.searchsorted(pos, x)) / len(pos)))
+        fa_curve = np.vstack((fa_curve, (len(neg) - np.searchsorted(neg, x)) / max(len(neg), 1)))
+
+    if plot and points:
+        names = [names[c] for c in points] if names else list(points)
+        plot_mc_curve(x, recall_curve, save_dir / "image_recall_curve.png", names, ylabel="Recall", on_plot=on_plot)
+        plot_mc_curve(x, fa_curve, save_dir / "false_alarm_curve.png", names, ylabel="False Alarm", on_plot=on_plot)
+    return points
+
+
+class COCOEval:
+    """
+    Vectorized COCO bbox evaluation of in-memory detections, reproducing the 12 summary metrics of pycocotools COCOeval.
+
+    Detections and labels are added per image as arrays instead of per-box dicts written to and parsed back from JSON.
+    Detections are matched greedily by score as in COCOeval.evaluateImg(), one detection rank at a time for all image
+    and category groups, IoU thresholds and area ranges at once, in padded chunks of groups of similar size. Matches are
+    then accumulated into precision at 101 recall thresholds and recall per category, area range and detection limit.
+
+    Attributes:
+        ids (list): Image ids in order of addition.
+        dets (list): Per-image (N, 6) detections of category, top-left xywh box and score, rounded as in COCO JSON.
+        gts (list): Per-image (M, 7) labels of category, top-left xywh box, area and crowd flag.
+        stats (np.ndarray): The 12 summary metrics of the last evaluate(), -1 where undefined.
+    """
+
+    iou_thrs = np.linspace(0.5, 0.95, 10)
+    rec_thrs = np.linspace(0.0, 1.0, 101)
+    max_dets = (1, 10, 100)
+    area_rngs = np.array([[0, 1e10], [0, 32**2], [32**2, 96**2], [96**2, 1e10]])  # all, small, medium, large
+
+    def __init__(self):
+        """Initialize an empty evaluator."""
+        self.ids, self.dets, self.gts = [], [], []
+        self.stats = None
+
+    def add(self, image_id, det, gt_boxes, gt_cls):
+        """Adds an image with (N, 6) xyxy, score, category detections and (M, 4) xyxy labels of (M,) categories."""
+        box = np.array(det[:, :4], dtype=np.float64)
+        box[:, 2:] -= box[:, :2]
+        gt = np.array(gt_boxes, dtype=np.float64).reshape(-1, 4)
+        gt[:, 2:] -= gt[:, :2]
+        self.ids.append(image_id)
+        self.dets.append(np.column_stack((det[:, 5], box.round(3), np.round(det[:, 4], 5))).astype(np.float64))
+        self.gts.append(np.column_stack((gt_cls, gt, gt[:, 2] * gt[:, 3], np.zeros(len(gt)))).astype(np.float64))
+
+    def merge(self, other):
+        """Appends the images of another COCOEval, e.g. of another data shard."""
+        self.ids += other.ids
+        self.dets += other.dets
+        self.gts += other.gts
+        return self
+
+    def load_annotations(self, file):
+        """Replaces the labels of the added images with those of a COCO annotations JSON file, with crowd boxes."""
+        with open(file) as f:
+            anns = json.load(f)["annotations"]
+        rows = {k: [] for k in self.ids}
+        for a in anns:
+            if a["image_id"] in rows:
+                rows[a["image_id"]].append((a["category_id"], *a["bbox"], a["area"], a.get("iscrowd", 0)))
+        self.gts = [np.array(rows[k], dtype=np.float64).reshape(-1, 7) for k in self.ids]
+
+    def results(self):
+        """Yields the detections as COCO results dicts, image by image."""
+        for image_id, det in zip(self.ids, self.dets):
+            for c, *box, score in det.tolist():
+                yield {"image_id": image_id, "category_id": int(c), "bbox": box, "score": score}
+
+    def save_json(self, file):
+        """Streams the detections to a COCO results JSON file without building the full list of dicts in memory."""
+        with open(file, "w") as f:
+            f.write("[")
+            for i, x in enumerate(self.results()):
+                f.write(", " * bool(i) + json.dumps(x))
+            f.write("]")
+
+    def evaluate(self, chunk=2**22):
+        """
+        Matches and accumulates all added images and returns the 12 COCO summary metrics.
+
+        Args:
+            chunk (int): Bound on groups x labels x (ranks + area ranges x IoU thresholds) of a padded matching chunk.
+
+        Returns:
+            (np.ndarray): AP@[.5:.95], AP@.5, AP@.75, AP small, medium, large, AR@1, AR@10, AR@100 and AR small, medium,
+                large at 100 detections, -1 where undefined.
+        """
+        n = len(self.ids)
+        dets = np.concatenate([np.zeros((0, 6))] + self.dets)
+        gts = np.concatenate([np.zeros((0, 7))] + self.gts)
+        dimg = np.repeat(np.arange(n), [len(x) for x in self.dets])
+        gimg = np.repeat(np.arange(n), [len(x) for x in self.gts])
+        cats = np.unique(gts[:, 0])  # categories without labels are undefined and never evaluated
+        keep = np.isin(dets[:, 0], cats)
+        dets, dimg = dets[keep], dimg[keep]
+        nc, A, T = len(cats), len(self.area_rngs), len(self.iou_thrs)
+
+        # Detections by image and category group and descending score, ties in insertion order, top 100 per group
+        dg = dimg * nc + np.searchsorted(cats, dets[:, 0])
+        i = np.lexsort((-dets[:, 5], dg))
+        dets, dg = dets[i], dg[i]
+        rank = np.arange(len(dg)) - np.searchsorted(dg, dg)
+        keep = rank < self.max_dets[-1]
+        dets, dg, rank = dets[keep], dg[keep], rank[keep]
+        gg = gimg * nc + np.searchsorted(cats, gts[:, 0])
+        i = np.argsort(gg, kind="stable")
+        gts, gg = gts[i], gg[i]
+
+        lo, hi = self.area_rngs.T
+        darea = dets[:, 3] * dets[:, 4]
+        gt_ig = (gts[:, 6:7] > 0) | (gts[:, 5:6] < lo) | (gts[:, 5:6] > hi)  # (M, A) crowd or out of area range
+        det_ig = np.repeat(((darea[:, None] < lo) | (darea[:, None] > hi))[:, :, None], T, 2)  # (N, A, T) unmatched
+        det_m = np.zeros((len(dets), A, T), dtype=bool)
+
+        # Greedy matching of groups with detections and labels, chunks of groups sorted by size to limit padding
+        groups, d0, nd = np.unique(dg, return_index=True, return_counts=True)
+        g0, ng = np.searchsorted(gg, groups), np.searchsorted(gg, groups, side="right")
+        ng -= g0
+        i = np.flatnonzero(ng)
+        groups, d0, nd, g0, ng = groups[i], d0[i], nd[i], g0[i], ng[i]
+        i = np.lexsort((ng, nd))
+        d0, nd, g0, ng = d0[i], nd[i], g0[i], ng[i]
+        start, AT = 0, A * T
+        while start < len(d0):
+            end, mx = start + 1, ng[start]
+            while end < len(d0) and (end + 1 - start) * max(mx, ng[end]) * (nd[end] + AT) <= chunk:
+                mx = max(mx, ng[end])
+                end += 1
+            s = slice(start, end)
+            self._match(dets, gts, gt_ig, det_m, det_ig, d0[s], nd[s], g0[s], ng[s])
+            start = end
+
+        # Accumulate per category over images in order, as COCOeval.accumulate()
+        npig = np.stack([np.bincount(gg[~gt_ig[:, a]] % nc, minlength=nc) for a in range(A)], 1)  # (nc, A)
+        precision = -np.ones((T, len(self.rec_thrs), nc, A, len(self.max_dets)))
+        recall = -np.ones((T, nc, A, len(self.max_dets)))
+        i = np.lexsort((rank, dg // nc, dg % nc))  # by category, image and rank
+        dets, dg, rank, det_m, det_ig = dets[i], dg[i], rank[i], det_m[i], det_ig[i]
+        bounds = np.searchsorted(dg % nc, np.arange(nc + 1))
+        for k in range(nc):
+            sl = slice(bounds[k], bounds[k + 1])
+            order = np.argsort(-dets[sl, 5], kind="mergesort")
+            for mi, md in enumerate(self.max_dets):
+                o = order[rank[sl][order] < md]
+                m, ig = det_m[sl][o], det_ig[sl][o]
+                tp = np.cumsum(m & ~ig, 0, dtype=np.float64)  # (n, A, T)
+                fp = np.cumsum(~m & ~ig, 0, dtype=np.float64)
+                for a in np.flatnonzero(npig[k]):
+                    if not len(o):
+                        recall[:, k, a, mi] = precision[:, :, k, a, mi] = 0
+                        continue
+                    rc = tp[:, a] / npig[k, a]
+                    pr = tp[:, a] / (fp[:, a] + tp[:, a] + np.spacing(1))
+                    pr = np.flip(np.maximum.accumulate(np.flip(pr, 0), 0), 0)  # precision envelope
+                    recall[:, k, a, mi] = rc[-1]
+                    for t in range(T):
+                        j = np.searchsorted(rc[:, t], self.rec_thrs, side="left")
+                        precision[t, :, k, a, mi] = np.where(j < len(o), pr[np.minimum(j, len(o) - 1), t], 0)
+
+        def mean(x):
+            """Mean of the defined entries, -1 if none."""
+            x = x[x > -1]
+            return x.mean() if x.size else -1.0
+
+        self.stats = np.array(
+            [
+                mean(precision[..., 0, 2]),
+                mean(precision[0, ..., 0, 2]),
+                mean(precision[5, ..., 0, 2]),
+                *(mean(precision[..., a, 2]) for a in (1, 2, 3)),
+                *(mean(recall[..., 0, m]) for m in (0, 1, 2)),
+                *(mean(recall[..., a, 2]) for a in (1, 2, 3)),
+            ]
+        )
+        return self.stats
+
+    def _match(self, dets, gts, gt_ig, det_m, det_ig, d0, nd, g0, ng):
+        """Greedily matches a chunk of groups of detections at d0 (nd) and labels at g0 (ng) into det_m and det_ig."""
+        D, M = nd.max(), ng.max()
+        di = d0[:, None] + np.arange(D)
+        di = np.where(np.arange(D) < nd[:, None], di, d0[:, None])
+        gi = g0[:, None] + np.arange(M)
+        gv = np.arange(M) < ng[:, None]  # (G, M) valid
+        gi = np.where(gv, gi, g0[:, None])
+
+        # IoU of top-left xywh boxes, crowd labels by detection area as in pycocotools
+        d, g = dets[di, 1:5][:, :, None], gts[gi, 1:5][:, None]  # (G, D, 1, 4), (G, 1, M, 4)
+        w = (np.minimum(d[..., 0] + d[..., 2], g[..., 0] + g[..., 2]) - np.maximum(d[..., 0], g[..., 0])).clip(0)
+        h = (np.minimum(d[..., 1] + d[..., 3], g[..., 1] + g[..., 3]) - np.maximum(d[..., 1], g[..., 1])).clip(0)
+        inter, da, crowd = w * h, d[..., 2] * d[..., 3], gts[gi, 6] > 0  # crowd (G, M)
+        union = np.where(crowd[:, None], da, da + g[..., 2] * g[..., 3] - inter)
+        iou = np.where(gv[:, None], inter / np.maximum(union, np.finfo(float).tiny), -1.0)  # (G, D, M)
+
+        ig = gt_ig[gi].transpose(0, 2, 1)  # (G, A, M)
+        matched = np.zeros((len(d0), *gt_ig.shape[1:], len(self.iou_thrs), M), dtype=bool)  # (G, A, T, M)
+        thr = self.iou_thrs[:, None]
+        for r in range(D):
+            # Best available label at or above each threshold, non-ignored before ignored (shifted below -1) and the
+            # last of equal IoUs as in pycocotools, for the groups with a detection at this rank (sorted by count)
+            a = np.searchsorted(nd, r, side="right")
+            x = iou[a:, None, None, r]  # (G, 1, 1, M)
+            s = np.where((x >= thr) & (~matched[a:] | crowd[a:, None, None]), x, -3.0)
+            s = np.where(ig[a:, :, None] & (s > -3), s - 2, s)
+            m = M - 1 - s[..., ::-1].argmax(-1)  # (G, A, T)
+            hit = np.take_along_axis(s, m[..., None], -1)[..., 0] > -3
+            i = np.nonzero(hit)
+            matched[a:][(*i, m[i])] = True
+            j = di[a:, r]
+            det_m[j] = hit
+            det_ig[j] = np.where(hit, np.take_along_axis(ig[a:], m, -1), det_ig[j])
+
+    def summary(self):
+        """Returns the 12 summary metrics as lines formatted as by COCOeval.summarize()."""
+        lines = []
+        for i, x in enumerate(self.stats):
+            ap = i < 6
+            iou = ("0.50:0.95", "0.50", "0.75")[i] if i < 3 else "0.50:0.95"
+            area = ("all", "small", "medium", "large")[i - 2 if ap and i > 2 else i - 8 if i > 8 else 0]
+            md = self.max_dets[i - 6] if 6 <= i < 9 else 100
+            lines.append(
+                f" {'Average Precision' if ap else 'Average Recall':<18} ({'AP' if ap else 'AR'}) @[ IoU={iou:<9} | "
+                f"area={area:>6s} | maxDets={md:>3d} ] = {x:0.3f}"
+            )
+        return "\n".join(lines)
+
+
+class ErrorIndex:
+    """
+    Columnar per-object index of the detection errors of a validation run, for mining hard examples.
+
+    Holds one row per detection (image, class, confidence, size bucket, TP at each IoU threshold, highest IoU with a
+    label of its class and that label) and one row per label (image, class, size bucket). Per-image TP, FP and FN
+    counts, the worst IoU of matched detections and the most confident FP are aggregated on query with bincounts, for
+    any confidence and IoU threshold, classes and size buckets, without running the model again.
+
+    Attributes:
+        iouv (np.ndarray): IoU thresholds of the TP columns.
+        files (list): Image files, indexed by the 'image' columns.
+        det (dict): Detection columns, lists of per-batch arrays.
+        label (dict): Label columns, lists of per-batch arrays.
+
+    Example:
+        ```python
+        from ultralytics.utils.metrics import ErrorIndex
+
+        worst = ErrorIndex.load('runs/detect/val/error_index.npz').worst(20, by='fn', cls=1, size='small')
+        ```
+    """
+
+    sizes = ("small", "medium", "large")  # COCO area buckets of native-space boxes, split at 32^2 and 96^2 pixels
+
+    def __init__(self, iouv=np.linspace(0.5, 0.95, 10)):
+        """Initialize an empty index with TP columns at the given IoU thresholds."""
+        self.iouv = np.asarray(iouv)
+        self.files = []
+        self.det = {k: [] for k in ("image", "cls", "conf", "size", "tp", "iou", "label")}
+        self.label = {k: [] for k in ("image", "cls", "size")}
+
+    @staticmethod
+    def size(boxes):
+        """Returns the size bucket of (..., 4) xyxy boxes."""
+        area = (boxes[..., 2] - boxes[..., 0]) * (boxes[..., 3] - boxes[..., 1])
+        return (area >= 32**2).astype(np.uint8) + (area >= 96**2)
+
+    def update(self, files, detections, gt_bboxes, gt_cls, tp):
+        """
+        Adds the images of a batch.
+
+        Args:
+            files (List[str]): Image files.
+            detections (List[torch.Tensor]): Per-image native-space (N, 6) x1, y1, x2, y2, conf, class detections.
+            gt_bboxes (List[torch.Tensor]): Per-image native-space (M, 4) x1, y1, x2, y2 labels.
+            gt_cls (List[torch.Tensor]): Per-image (M,) label classes.
+            tp (torch.Tensor): TP matrix of the detections of shape (sum(N), len(iouv)).
+        """
+        pad = torch.nn.utils.rnn.pad_sequence
+        det = pad(detections, batch_first=True, padding_value=-2.0)  # (B, N, 6)
+        gc = pad(gt_cls, batch_first=True, padding_value=-1.0)  # (B, M)
+        iou = box_iou(pad(gt_bboxes, batch_first=True), det[..., :4]) * (gc[..., None] == det[..., None, :, 5])
+        if iou.shape[1]:
+            best, label = iou.max(1)  # (B, N) highest IoU with a label of the same class
+        else:
+            best, label = torch.zeros(det.shape[:2], device=det.device), det.new_zeros(det.shape[:2], dtype=torch.long)
+        nd = torch.tensor([len(x) for x in detections], device=det.device)
+        valid = torch.arange(det.shape[1], device=det.device) < nd[:, None]
+        nl = np.array([len(x) for x in gt_cls])
+        offset = sum(len(x) for x in self.label["cls"]) + np.cumsum(nl) - nl  # first label row of each image
+        det, best, label = det[valid].cpu().numpy(), best[valid].cpu().numpy(), label[valid].cpu().numpy()
+        image = np.repeat(np.arange(len(files)), [len(x) for x in detections])
+        n = len(self.files)
+        self.files.extend(files)
+        self.det["image"].append((n + image).astype(np.int32))
+        self.det["cls"].append(det[:, 5].astype(np.int16))
+        self.det["conf"].append(det[:, 4].astype(np.float32))
+        self.det["size"].append(self.size(det[:, :4]))
+        self.det["tp"].append(tp.cpu().numpy().astype(bool))
+        self.det["iou"].append(best.astype(np.float32))
+        self.det["label"].append(np.where(best > 0, offset[image] + label, -1).astype(np.int64))
+        boxes = torch.cat(gt_bboxes).cpu().numpy().reshape(-1, 4)
+        self.label["image"].append((n + np.repeat(np.arange(len(files)), nl)).astype(np.int32))
+        self.label["cls"].append(torch.cat(gt_cls).cpu().numpy().astype(np.int16))
+        self.label["size"].append(self.size(boxes))
+
+    def merge(self, other):
+        """Appends the images of another ErrorIndex with the same IoU thresholds, e.g. of another data shard."""
+        n, m = len(self.files), sum(len(x) for x in self.label["cls"])
+        self.files.extend(other.files)
+        for k, v in other.det.items():
+            self.det[k].extend(x + n if k == "image" else np.where(x >= 0, x + m, x) if k == "label" else x for x in v)
+        for k, v in other.label.items():
+            self.label[k].extend(x + n if k == "image" else x for x in v)
+        return self
+
+    def columns(self):
+        """Returns the detection and label columns as concatenated arrays."""
+        return ({k: np.concatenate(v) for k, v in x.items()} for x in (self.det, self.label))
+
+    def save(self, file):
+        """Saves the index to a compressed .npz file."""
+        det, label = self.columns()
+        np.savez_compressed(
+            file,
+            iouv=self.iouv,
+            files=np.array(self.files),
+            **{f"det_{k}": v for k, v in det.items()},
+            **{f"label_{k}": v for k, v in label.items()},
+        )
+
+    @classmethod
+    def load(cls, file):
+        """Loads an index saved by save()."""
+        x = np.load(file)
+        index = cls(x["iouv"])
+        index.files = x["files"].tolist()
+        index.det = {k: [x[f"det_{k}"]] for k in index.det}
+        index.label = {k: [x[f"label_{k}"]] for k in index.label}
+        return index
+
+    def images(self, conf=0.25, iou=0.5, cls=None, size=None):
+        """
+        Aggregates the errors of each image.
+
+        Args:
+            conf (float): Confidence threshold of the detections.
+            iou (float): IoU threshold of TPs, the nearest of 'iouv' is used.
+            cls (int | List[int], optional): Only count detections and labels of these classes.
+            size (str | List[str], optional): Only count detections and labels of these size buckets, see 'sizes'.
+
+        Returns:
+            (dict): Per-image arrays 'file', 'tp', 'fp' and 'fn' counts, 'iou' the lowest IoU of matched detections (1
+                without) and 'fp_conf' the highest confidence of FPs (0 without).
+        """
+        det, label = self.columns()
+        t = np.abs(self.iouv - iou).argmin()
+        ds, ls = det["conf"] >= conf, np.ones(len(label["cls"]), dtype=bool)
+        if cls is not None:
+            ds &= np.isin(det["cls"], cls)
+            ls &= np.isin(label["cls"], cls)
+        if size is not None:
+            s = [self.sizes.index(x) for x in ([size] if isinstance(size, str) else size)]
+            ds &= np.isin(det["size"], s)
+            ls &= np.isin(label["size"], s)
+        n = len(self.files)
+        tp, fp = ds & det["tp"][:, t], ds & ~det["tp"][:, t]
+        matched = np.zeros(len(ls), dtype=bool)
+        matched[det["label"][tp]] = True
+        x = dict(
+            file=np.array(self.files),
+            tp=np.bincount(det["image"][tp], minlength=n),
+            fp=np.bincount(det["image"][fp], minlength=n),
+            fn=np.bincount(label["image"][ls & ~matched], minlength=n),
+            iou=np.ones(n, dtype=np.float32),
+            fp_conf=np.zeros(n, dtype=np.float32),
+        )
+        np.minimum.at(x["iou"], det["image"][tp], det["iou"][tp])
+        np.maximum.at(x["fp_conf"], det["image"][fp], det["conf"][fp])
+        return x
+
+    def worst(self, k=20, by="fn", **kwargs):
+        """
+        Returns the k images with the largest errors, largest first, skipping images without errors.
+
+        Args:
+            k (int): Number of images.
+            by (str): 'fn' missed labels, 'fp' false alarms, 'errors' both, 'iou' the worst localization of matched
+                detections or 'fp_conf' the most confident false alarm.
+            **kwargs (Any): Arguments of images().
+
+        Returns:
+            (dict): images() arrays of the selected images.
+        """
+        x = self.images(**kwargs)
+        key = x["fn"] + x["fp"] if by == "errors" else 1 - x["iou"] if by == "iou" else x[by]
+        i = np.argsort(-key, kind="stable")[:k]
+        i = i[key[i] > 0]
+        return {k: v[i] for k, v in x.items()}
+
+
 class Metric(SimpleClass):
     """
     Class for computing evaluation metrics for YOLOv8 model.
@@ -813,6 +1387,7 @@ class DetMetrics(SimpleClass):
 
     Methods:
         process(tp, conf, pred_cls, target_cls): Updates the metric results with the latest batch of predictions.
+        process_hist(hist): Updates the metric results from a ConfHistogram of binned predictions.
         keys: Returns a list of keys for accessing the computed detection metrics.
         mean_results: Returns a list of mean values for the computed detection metrics.
         class_result(i): Returns a list of values for the computed detection metrics for a specific class.
@@ -849,6 +1424,12 @@ class DetMetrics(SimpleClass):
         self.box.nc = len(self.names)
         self.box.update(results)
 
+    def process_hist(self, hist):
+        """Process a ConfHistogram of binned detection statistics and update metrics."""
+        results = hist.ap_per_class(plot=self.plot, save_dir=self.save_dir, names=self.names, on_plot=self.on_plot)[2:]
+        self.box.nc = len(self.names)
+        self.box.update(results)
+
     @property
     def keys(self):
         """Returns a list of keys for accessing specific metrics."""
@@ -849,16 +849,79 @@ def clean_str(s):
     return re.sub(pattern="[|@#!¡·$€%&()=?¿^*;:,¨´><+]", repl="_", string=s)
 
 def v10postprocess(preds, max_det, nc=80):
-    assert(4 + nc == preds.shape[-1])
+    """
+    Selects the top 'max_det' one-to-one detections per image with static output shapes, i.e. for export.
+
+    Args:
+        preds (torch.Tensor): (B, A, 4 + nc) xywh boxes and class scores.
+        max_det (int): Number of detections per image.
+        nc (int): Number of classes.
+
+    Returns:
+        (tuple): (B, max_det, 4) xywh boxes, (B, max_det) scores and (B, max_det) class labels.
+    """
+    assert 4 + nc == preds.shape[-1]
+    boxes, scores = preds.split([4, nc], dim=-1)
+    index = torch.topk(scores.amax(dim=-1), max_det, dim=-1)[1]
+    scores = scores.gather(dim=1, index=index.unsqueeze(-1).expand(-1, -1, nc))
+    scores, i = torch.topk(scores.flatten(1), max_det, dim=-1)
+    labels = i % nc
+    index = index.gather(dim=1, index=i // nc)
+    boxes = boxes.gather(dim=1, index=index.unsqueeze(-1).expand(-1, -1, 4))
+    return boxes, scores, labels
+
+
+def pack_detections(det, conf=0.0, classes=None):
+    """
+    Filters (B, N, 6) detections by confidence and class and packs them into a ragged result.
+
+    Args:
+        det (torch.Tensor): (B, N, 6) xyxy, score, class detections.
+        conf (float): Confidence threshold, detections must score above it.
+        classes (list, optional): Class indices to keep.
+
+    Returns:
+        det (torch.Tensor): (M, 6) detections of all images, image after image.
+        offsets (torch.Tensor): (B + 1,) offsets, the detections of image i are det[offsets[i]:offsets[i + 1]].
+    """
+    mask = det[..., 4] > conf
+    if classes is not None:
+        mask &= (det[..., 5:6] == torch.tensor(classes, device=det.device)).any(-1)
+    offsets = torch.zeros(det.shape[0] + 1, dtype=torch.long, device=det.device)
+    offsets[1:] = mask.sum(1).cumsum(0)
+    return det[mask], offsets
+
+
+def v10postprocess_packed(preds, max_det, nc=80, conf=0.0, classes=None):
+    """
+    Selects one-to-one detections above a confidence threshold per image and packs them into a ragged result.
+
+    Unlike v10postprocess(), candidates are thresholded by 'conf' before each top-k, so only surviving scores are sorted
+    and only their boxes are gathered and converted. Scores of classes outside 'classes' are zeroed before selection.
+
+    Args:
+        preds (torch.Tensor): (B, A, 4 + nc) xywh boxes and class scores.
+        max_det (int): Maximum detections per image.
+        nc (int): Number of classes.
+        conf (float): Confidence threshold, detections must score above it.
+        classes (list, optional): Class indices to keep.
+
+    Returns:
+        det (torch.Tensor): (M, 6) xyxy, score, class detections of all images, image after image.
+        offsets (torch.Tensor): (B + 1,) offsets, the detections of image i are det[offsets[i]:offsets[i + 1]].
+    """
+    assert 4 + nc == preds.shape[-1]
     boxes, scores = preds.split([4, nc], dim=-1)
+    if classes is not None:
+        keep = torch.zeros(nc, dtype=scores.dtype, device=scores.device)
+        keep[classes] = 1.0
+        scores = scores * keep
     max_scores = scores.amax(dim=-1)
-    max_scores, index = torch.topk(max_scores, max_det, dim=-1)
-    index = index.unsqueeze(-1)
-    boxes = torch.gather(boxes, dim=1, index=index.repeat(1, 1, boxes.shape[-1]))
-    scores = torch.gather(scores, dim=1, index=index.repeat(1, 1, scores.shape[-1]))
-
-    scores, index = torch.topk(scores.flatten(1), max_det, dim=-1)
-    labels = index % nc
-    index = index // nc
-    boxes = boxes.gather(dim=1, index=index.unsqueeze(-1).repeat(1, 1, boxes.shape[-1]))
-    return boxes, scores, labels
\ No newline at end of file
+    k = min(max_det, int((max_scores > conf).sum(1).max()))  # candidates that can pass the threshold
+    index = torch.topk(max_scores, k, dim=-1)[1]
+    scores = scores.gather(dim=1, index=index.unsqueeze(-1).expand(-1, -1, nc)).flatten(1)
+    k = min(max_det, int((scores > conf).sum(1).max()))
+    scores, i = torch.topk(scores, k, dim=-1)
+    index = index.gather(dim=1, index=i // nc)
+    boxes = xywh2xyxy(boxes.gather(dim=1, index=index.unsqueeze(-1).expand(-1, -1, 4)))
+    return pack_detections(torch.cat((boxes, scores.unsqueeze(-1), (i % nc).unsqueeze(-1).to(boxes.dtype)), -1), conf)